@@ -3,21 +3,54 @@ from django.contrib import admin
 from django.urls import reverse, path
 from django.utils.html import format_html
 from django.contrib.auth.views import PasswordChangeView, PasswordChangeDoneView
-from django.http import JsonResponse, HttpResponseForbidden, HttpResponseRedirect
+from django.http import JsonResponse, HttpResponseForbidden, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from .models import (
     User, Vehicle, Membership, Promotion, Feedback,
-    ContactMessage, JobPosition, AdminLogEntry, ParkingConfig, AdminActionLogger
+    ContactMessage, JobPosition, ParkingConfig, AdminActionLogger,
+    ParkingLot, ParkingZone, ParkingSpot
 )
 from datetime import timedelta
 from django.utils import timezone
 import logging
-from django.db.models.functions import ExtractHour, TruncDate, TruncMonth
-from django.db.models import Sum, Q
+from django.db.models import Q, Count
 from django.contrib.contenttypes.models import ContentType
+from .promotion_index import invalidate_promotion_index
+from .layout import invalidate_spot_template
+from .analytics import income_report, parse_reference_date, parse_record_limit
+from .income_rollup import period_bounds, PERIODS as INCOME_PERIODS
+from .pagination import keyset_page, iter_keyset, decode_cursor, parse_limit, MAX_LIMIT as MAX_PAGE_LIMIT
+from .json_stream import streaming_json_response
+from .parking_records import parse_record_query, record_row, PAGE_SIZE as RECORD_PAGE_SIZE
+from .occupancy_history import occupancy_series
+from .session_histogram import distribution_summary
+from .dashboard import get_dashboard_snapshot
+from .admin_log_records import parse_log_query, log_row, PAGE_SIZE as LOG_PAGE_SIZE, ORDERING as LOG_ORDERING
+from .session_export import stream_sessions, parse_filters as parse_export_filters, \
+    FORMATS as EXPORT_FORMATS, CONTENT_TYPES as EXPORT_CONTENT_TYPES
 
 logger = logging.getLogger(__name__)
 
+
+def parking_row(row):
+    """车辆数据接口的一行(values() 字典)，时间格式为 YYYY-MM-DD HH:MM"""
+    entry_time, exit_time = row['entry_time'], row['exit_time']
+    if exit_time is None:
+        duration = None
+    elif entry_time is None:
+        duration = 0
+    else:
+        duration = round((exit_time - entry_time).total_seconds() / 60, 2)  # 同 Vehicle.parking_duration_minutes
+    return {
+        'license_plate': row['license_plate'],
+        'spot_number': row['spot_number'] or '未知',
+        'entry_time': str(entry_time)[:16] if entry_time else None,  # 比 strftime 快，格式相同
+        'exit_time': str(exit_time)[:16] if exit_time else None,
+        'duration': duration,
+        'status': '已出库' if exit_time else '未出库'
+    }
+
+
 class CustomAdminSite(admin.AdminSite):
     site_header = format_html('<span style="color: #4ac1f7;">凉心科技后台管理系统</span>')
     site_title = '凉心科技'
@@ -42,7 +75,10 @@ class CustomAdminSite(admin.AdminSite):
                     {'name': '用户反馈', 'object_name': 'Feedback', 'admin_url': '/admin/parking_app/feedback/'},
                     {'name': '职位发布', 'object_name': 'JobPosition', 'admin_url': '/admin/parking_app/jobposition/'},
                     {'name': '车辆', 'object_name': 'Vehicle', 'admin_url': '/admin/parking_app/vehicle/'},
-                    {'name': '停车系统配置', 'object_name': 'ParkingConfig', 'admin_url': '/admin/parking_app/parkingconfig/'}
+                    {'name': '停车系统配置', 'object_name': 'ParkingConfig', 'admin_url': '/admin/parking_app/parkingconfig/'},
+                    {'name': '停车场', 'object_name': 'ParkingLot', 'admin_url': '/admin/parking_app/parkinglot/'},
+                    {'name': '停车分区', 'object_name': 'ParkingZone', 'admin_url': '/admin/parking_app/parkingzone/'},
+                    {'name': '车位', 'object_name': 'ParkingSpot', 'admin_url': '/admin/parking_app/parkingspot/'}
                 ]
                 break
 
@@ -62,10 +98,15 @@ class CustomAdminSite(admin.AdminSite):
         urls = super().get_urls()
         custom_urls = [
             path('parking_app/', self.admin_view(self.redirect_to_main_site), name='parking_app_redirect'),
+            path('dashboard/data/', self.admin_view(self.get_dashboard_data), name='dashboard_data'),
             path('parking_analysis/', self.admin_view(self.parking_analysis_view), name='parking_analysis'),
             path('parking_analysis/data/', self.admin_view(self.get_parking_data), name='parking_data'),
+            path('parking_analysis/export/', self.admin_view(self.export_parking_data), name='parking_export'),
+            path('parking_analysis/records/', self.admin_view(self.get_parking_records), name='parking_records'),
+            path('parking_analysis/occupancy/', self.admin_view(self.get_occupancy_data), name='occupancy_data'),
             path('income_analysis/', self.admin_view(self.income_analysis_view), name='income_analysis'),
             path('income_analysis/data/', self.admin_view(self.get_income_data), name='income_data'),
+            path('income_analysis/distribution/', self.admin_view(self.get_income_distribution), name='income_distribution'),
             path('admin_logs/', self.admin_view(self.admin_logs_view), name='admin_logs'),
             path('admin_logs/data/', self.admin_view(self.get_admin_logs), name='admin_logs_data'),
             path('user/<int:user_id>/password/', self.admin_view(PasswordChangeView.as_view(
@@ -95,6 +136,24 @@ class CustomAdminSite(admin.AdminSite):
             self.log_action(request, 'delete', obj)
         super().delete_queryset(request, queryset)
 
+    def index(self, request, extra_context=None):
+        # 首页统计读取预先生成的快照(一次缓存读取)
+        extra_context = extra_context or {}
+        try:
+            extra_context['dashboard'] = get_dashboard_snapshot()
+        except Exception as e:
+            logger.error(f"读取首页快照时出错: {str(e)}", exc_info=True)
+        return super().index(request, extra_context)
+
+    def get_dashboard_data(self, request):
+        if not (request.user.is_superuser or request.user.is_staff):
+            return JsonResponse({'success': False, 'error': '没有访问权限'}, status=403)
+        try:
+            return JsonResponse({'success': True, 'dashboard': get_dashboard_snapshot()})
+        except Exception as e:
+            logger.error(f"读取首页快照时出错: {str(e)}", exc_info=True)
+            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
     def redirect_to_main_site(self, request):
         return redirect('/')
 
@@ -103,10 +162,60 @@ class CustomAdminSite(admin.AdminSite):
         if not (request.user.is_superuser or request.user.is_staff):
             logger.warning(f'非授权用户尝试访问车辆数据分析: {request.user}')
             return HttpResponseForbidden("没有访问权限")
-        vehicles = Vehicle.objects.all().order_by('-entry_time')
-        context = {'vehicles': vehicles}
+        # 只渲染停车记录表格的第一页，后续翻页、排序与筛选由 get_parking_records 接口返回
+        records, ordering = parse_record_query({})
+        page = keyset_page(records, None, RECORD_PAGE_SIZE, ordering=ordering)
+        context = {
+            'records': [record_row(row) for row in page['items']],
+            'next_cursor': page['next_cursor'] or ''
+        }
         return render(request, 'admin/parking_analysis.html', context)
 
+    def get_parking_records(self, request):
+        """
+        停车记录表格数据：?plate=&spot=&status=&start=&end= 筛选，?sort= 排序，
+        ?cursor= 翻页，?total=1 返回符合条件的总数
+        """
+        if not (request.user.is_superuser or request.user.is_staff):
+            return JsonResponse({'success': False, 'error': '没有访问权限'}, status=403)
+
+        try:
+            records, ordering = parse_record_query(request.GET)
+            limit = parse_limit(request.GET.get('limit'), default=RECORD_PAGE_SIZE)
+            page = keyset_page(records, request.GET.get('cursor') or None, limit,
+                               with_total=request.GET.get('total') == '1', ordering=ordering)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+        head = {'success': True, 'total': page['total'],
+                'next_cursor': page['next_cursor'], 'prev_cursor': page['prev_cursor']}
+        return streaming_json_response(head, 'records', map(record_row, page['items']))
+
+    def get_occupancy_data(self, request):
+        """
+        各分区的车位占用时间序列：?start=&end= 为本地日期 YYYY-MM-DD(end 含当天，默认今天)，
+        ?step= 为采样间隔分钟数(1/5/15/60，默认 5)
+        """
+        if not (request.user.is_superuser or request.user.is_staff):
+            return JsonResponse({'success': False, 'error': '没有访问权限'}, status=403)
+
+        try:
+            now = timezone.now()
+            start = parse_reference_date(request.GET.get('start')) or now
+            end = parse_reference_date(request.GET.get('end')) or max(start, now)
+            if end < start:
+                raise ValueError("结束日期不能早于开始日期")
+            # end 当天也包含在内，occupancy_series 会把时间对齐到本地零点
+            series = occupancy_series(start, end + timedelta(microseconds=1), int(request.GET.get('step') or 5), now)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        except Exception as e:
+            logger.error(f"获取车位占用数据时出错: {str(e)}")
+            return JsonResponse({'success': False, 'error': '获取车位占用数据失败'}, status=500)
+
+        series['start'] = timezone.localtime(series['start']).strftime('%Y-%m-%d %H:%M')
+        return JsonResponse({'success': True, **series})
+
     def income_analysis_view(self, request):
         self.log_action(request, 'view', message="访问收入分析页面")
         if not (request.user.is_superuser or request.user.is_staff):
@@ -126,70 +235,55 @@ class CustomAdminSite(admin.AdminSite):
         if not (request.user.is_superuser or request.user.is_staff):
             return JsonResponse({'success': False, 'error': '没有访问权限'}, status=403)
 
+        # 按入场时间倒序：指定 ?limit=每页数量(最多500) 或 ?cursor=上一次返回的 next_cursor 时游标分页，
+        # ?total=1 返回总数；都不指定时流式输出时间范围内的全部记录
+        try:
+            paginate = bool(request.GET.get('limit') or request.GET.get('cursor'))
+            limit = parse_limit(request.GET.get('limit'), default=MAX_PAGE_LIMIT)
+            cursor = request.GET.get('cursor') or None
+            if cursor:
+                decode_cursor(cursor)
+        except ValueError:
+            return JsonResponse({'success': False, 'error': '无效的分页参数'}, status=400)
+
         period = request.GET.get('period', 'today')
-        now = timezone.now()
+        vehicles = Vehicle.objects.all()
+        if period in INCOME_PERIODS:
+            # 本地日历的今日/本周/本月/本季度/本年，其他值返回全部记录
+            start_date, end_date, _ = period_bounds(period)
+            vehicles = vehicles.filter(entry_time__gte=start_date, entry_time__lt=end_date)
+
+        vehicles = vehicles.values('id', 'license_plate', 'spot_number', 'entry_time', 'exit_time')
+        with_total = request.GET.get('total') == '1'
+        if not paginate:
+            head = {'success': True, 'total': vehicles.count() if with_total else None,
+                    'next_cursor': None, 'prev_cursor': None}
+            return streaming_json_response(head, 'vehicles', map(parking_row, iter_keyset(vehicles)))
+
+        page = keyset_page(vehicles, cursor, limit, with_total=with_total)
+        head = {'success': True, 'total': page['total'],
+                'next_cursor': page['next_cursor'], 'prev_cursor': page['prev_cursor']}
+        return streaming_json_response(head, 'vehicles', map(parking_row, page['items']))
+
+    def export_parking_data(self, request):
+        """流式导出停车记录：?format=csv|ndjson，支持 start/end/plate/paid/type 筛选"""
+        self.log_action(request, 'view', message="导出停车记录")
+        if not (request.user.is_superuser or request.user.is_staff):
+            return JsonResponse({'success': False, 'error': '没有访问权限'}, status=403)
 
-        if period == 'today':
-            start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = now.replace(hour=23, minute=59, second=59, microsecond=999999)
-            vehicles = Vehicle.objects.filter(
-                entry_time__gte=start_date,
-                entry_time__lte=end_date
-            ).order_by('-entry_time')
-        elif period == 'week':
-            start_date = now - timedelta(days=now.weekday())
-            start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = start_date + timedelta(days=6)
-            end_date = end_date.replace(hour=23, minute=59, second=59, microsecond=999999)
-            vehicles = Vehicle.objects.filter(
-                entry_time__gte=start_date,
-                entry_time__lte=end_date
-            ).order_by('-entry_time')
-        elif period == 'month':
-            start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            end_date = start_date + timedelta(days=32)
-            end_date = end_date.replace(day=1) - timedelta(days=1)
-            end_date = end_date.replace(hour=23, minute=59, second=59, microsecond=999999)
-            vehicles = Vehicle.objects.filter(
-                entry_time__gte=start_date,
-                entry_time__lte=end_date
-            ).order_by('-entry_time')
-        elif period == 'quarter':
-            current_quarter = (now.month - 1) // 3 + 1
-            start_date = now.replace(month=(current_quarter - 1) * 3 + 1, day=1,
-                                     hour=0, minute=0, second=0, microsecond=0)
-            end_date = start_date + timedelta(days=93)
-            end_date = end_date.replace(day=1) - timedelta(days=1)
-            end_date = end_date.replace(hour=23, minute=59, second=59, microsecond=999999)
-            vehicles = Vehicle.objects.filter(
-                entry_time__gte=start_date,
-                entry_time__lte=end_date
-            ).order_by('-entry_time')
-        elif period == 'year':
-            start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-            end_date = now.replace(month=12, day=31, hour=23, minute=59, second=59, microsecond=999999)
-            vehicles = Vehicle.objects.filter(
-                entry_time__gte=start_date,
-                entry_time__lte=end_date
-            ).order_by('-entry_time')
-        else:
-            vehicles = Vehicle.objects.all().order_by('-entry_time')
-
-        data = {
-            'success': True,
-            'vehicles': [
-                {
-                    'license_plate': v.license_plate,
-                    'spot_number': v.spot_number or '未知',
-                    'entry_time': v.entry_time.strftime('%Y-%m-%d %H:%M'),
-                    'exit_time': v.exit_time.strftime('%Y-%m-%d %H:%M') if v.exit_time else None,
-                    'duration': v.parking_duration_minutes if v.exit_time else None,
-                    'status': '已出库' if v.exit_time else '未出库'
-                }
-                for v in vehicles
-            ]
-        }
-        return JsonResponse(data)
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return JsonResponse({'success': False, 'error': '无效的导出格式'}, status=400)
+        try:
+            filters = parse_export_filters(request.GET)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+        response = StreamingHttpResponse(stream_sessions(export_format, filters),
+                                         content_type=EXPORT_CONTENT_TYPES[export_format])
+        filename = f"parking_sessions_{timezone.localtime().strftime('%Y%m%d%H%M%S')}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
     def get_income_data(self, request):
         self.log_action(request, 'view', message="获取收入数据")
@@ -198,158 +292,76 @@ class CustomAdminSite(admin.AdminSite):
                 return JsonResponse({'success': False, 'error': '没有访问权限'}, status=403)
 
             period = request.GET.get('period', 'today')
-            now = timezone.now()
-            query = Vehicle.objects.filter(paid=True, exit_time__isnull=False)
-
-            # 时间范围处理
-            if period == 'today':
-                start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                query = query.filter(exit_time__gte=start_date)
-
-                # 按小时统计（修复版）
-                hours = {h: 0.0 for h in range(24)}
-                for v in query:
-                    if v.exit_time:  # 确保exit_time不为None
-                        local_hour = timezone.localtime(v.exit_time).hour
-                        hours[local_hour] += float(v.fee or 0)
-
-                trend_data = {
-                    'labels': [f"{h:02d}:00" for h in range(24)],
-                    'amounts': [hours[h] for h in range(24)]
-                }
-
-            elif period == 'week':
-                start_date = now - timedelta(days=now.weekday())
-                start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_date = start_date + timedelta(days=6)
-                query = query.filter(exit_time__range=[start_date, end_date])
-
-                # 按天统计
-                days = {}
-                for v in query:
-                    if v.exit_time:
-                        local_date = timezone.localtime(v.exit_time).strftime('%m-%d')
-                        days[local_date] = days.get(local_date, 0) + float(v.fee or 0)
-
-                trend_data = {
-                    'labels': sorted(days.keys()),
-                    'amounts': [days.get(k, 0) for k in sorted(days.keys())]
-                }
-
-            elif period == 'month':
-                start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                end_date = start_date + timedelta(days=32)
-                end_date = end_date.replace(day=1) - timedelta(days=1)
-                query = query.filter(exit_time__range=[start_date, end_date])
-
-                # 按天统计
-                days = {}
-                for v in query:
-                    if v.exit_time:
-                        local_date = timezone.localtime(v.exit_time).strftime('%m-%d')
-                        days[local_date] = days.get(local_date, 0) + float(v.fee or 0)
-
-                trend_data = {
-                    'labels': sorted(days.keys()),
-                    'amounts': [days.get(k, 0) for k in sorted(days.keys())]
-                }
-
-            elif period == 'quarter':
-                current_quarter = (now.month - 1) // 3 + 1
-                start_date = now.replace(month=(current_quarter - 1) * 3 + 1, day=1,
-                                         hour=0, minute=0, second=0, microsecond=0)
-                end_date = start_date + timedelta(days=93)
-                end_date = end_date.replace(day=1) - timedelta(days=1)
-                query = query.filter(exit_time__range=[start_date, end_date])
-
-                # 按月统计
-                months = {}
-                for v in query:
-                    if v.exit_time:
-                        local_month = timezone.localtime(v.exit_time).strftime('%Y-%m')
-                        months[local_month] = months.get(local_month, 0) + float(v.fee or 0)
-
-                trend_data = {
-                    'labels': sorted(months.keys()),
-                    'amounts': [months[k] for k in sorted(months.keys())]
-                }
-
-            elif period == 'year':
-                start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-                end_date = now.replace(month=12, day=31, hour=23, minute=59, second=59, microsecond=999999)
-                query = query.filter(exit_time__range=[start_date, end_date])
-
-                # 按月统计
-                months = {}
-                for v in query:
-                    if v.exit_time:
-                        local_month = timezone.localtime(v.exit_time).strftime('%Y-%m')
-                        months[local_month] = months.get(local_month, 0) + float(v.fee or 0)
-
-                trend_data = {
-                    'labels': sorted(months.keys()),
-                    'amounts': [months[k] for k in sorted(months.keys())]
-                }
-
-            else:
+            if period not in INCOME_PERIODS:
                 return JsonResponse({'success': False, 'error': '无效的时间周期'}, status=400)
+            lot_code = request.GET.get('lot') or None
+            try:
+                reference = parse_reference_date(request.GET.get('date'))  # 查询历史周期
+                record_limit = parse_record_limit(request.GET.get('records'))
+            except ValueError:
+                return JsonResponse({'success': False, 'error': '无效的查询参数'}, status=400)
+
+            # 趋势与统计数据读取收入汇总表(带缓存)；
+            # ?source=live 时直接在数据库中按时间分组统计停车记录，?source=archive 时读取列式归档(用于核对汇总表)
+            source = request.GET.get('source') if request.GET.get('source') in ('live', 'archive') else 'rollup'
+            report = income_report(period, reference, lot_code=lot_code, source=source, record_limit=record_limit)
+            head = {'success': True, 'stats': report['stats'], 'trend': report['trend']}
+            return streaming_json_response(head, 'records', report['records'])
+
+        except Exception as e:
+            logger.error(f"获取收入数据时出错: {str(e)}", exc_info=True)
+            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+    def get_income_distribution(self, request):
+        """停车时长与费用的 p50/p90/p99：?period= 与 ?date= 同收入数据接口，按车辆类型分别统计"""
+        if not (request.user.is_superuser or request.user.is_staff):
+            return JsonResponse({'success': False, 'error': '没有访问权限'}, status=403)
 
-            # 记录列表
-            records = []
-            for v in query.order_by('-exit_time')[:20]:
-                if v.exit_time:  # 确保exit_time不为None
-                    records.append({
-                        'date': timezone.localtime(v.exit_time).strftime('%Y-%m-%d %H:%M'),
-                        'license_plate': v.license_plate,
-                        'duration': v.parking_duration_minutes,
-                        'amount': float(v.fee or 0),
-                        'is_member': hasattr(v.user, 'membership') and v.user.membership.is_active()
-                    })
-
-            # 统计数据
-            total_income = query.aggregate(total=Sum('fee'))['total'] or 0
-            parking_count = query.count()
+        period = request.GET.get('period', 'today')
+        if period not in INCOME_PERIODS:
+            return JsonResponse({'success': False, 'error': '无效的时间周期'}, status=400)
+        try:
+            reference = parse_reference_date(request.GET.get('date'))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': '无效的查询参数'}, status=400)
 
+        try:
+            start, end, _ = period_bounds(period, reference)
+            start_day, end_day = timezone.localdate(start), timezone.localdate(end)
+            types = {vehicle_type: distribution_summary(start_day, end_day, vehicle_type)
+                     for vehicle_type, _ in Vehicle.VEHICLE_TYPE_CHOICES}
             return JsonResponse({
                 'success': True,
-                'stats': {
-                    'total_income': float(total_income),
-                    'avg_daily_income': float(total_income / (7 if period == 'week' else 1)),
-                    'max_daily_income': max(trend_data['amounts']) if trend_data['amounts'] else 0,
-                    'parking_count': parking_count
-                },
-                'trend': trend_data,
-                'records': records
+                'all': distribution_summary(start_day, end_day),
+                'types': types,
+                'type_names': dict(Vehicle.VEHICLE_TYPE_CHOICES)
             })
-
         except Exception as e:
-            logger.error(f"获取收入数据时出错: {str(e)}", exc_info=True)
+            logger.error(f"获取时长/费用分布时出错: {str(e)}", exc_info=True)
             return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
     def get_admin_logs(self, request):
+        """
+        管理员日志(按时间倒序)：?user=&action=&model=&start=&end= 筛选，
+        ?cursor= 翻页，?limit= 每页数量，?total=1 返回符合条件的总数
+        """
         self.log_action(request, 'view', message="查询管理员日志")
         if not (request.user.is_superuser or request.user.is_staff):
             return JsonResponse({'success': False, 'error': '没有访问权限'}, status=403)
 
         try:
-            logs = AdminLogEntry.objects.all().order_by('-timestamp')[:100]
-            log_list = []
-
-            for log in logs:
-                shanghai_time = log.timestamp + timedelta(hours=8)
-                formatted_time = shanghai_time.strftime('%Y-%m-%d %H:%M:%S')
-
-                log_list.append({
-                    'timestamp': formatted_time,
-                    'username': log.user.username if log.user else '系统',
-                    'action': log.get_action_display(),
-                    'content_type': log.content_type.model if log.content_type else None,
-                    'object_id': log.object_id,
-                    'message': log.message
-                })
-
-            return JsonResponse({'success': True, 'logs': log_list})
+            logs = parse_log_query(request.GET)
+            limit = parse_limit(request.GET.get('limit'), default=LOG_PAGE_SIZE)
+            page = keyset_page(logs, request.GET.get('cursor') or None, limit,
+                               with_total=request.GET.get('total') == '1', ordering=LOG_ORDERING)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
+        try:
+            tz = timezone.get_current_timezone()
+            head = {'success': True, 'total': page['total'],
+                    'next_cursor': page['next_cursor'], 'prev_cursor': page['prev_cursor']}
+            return streaming_json_response(head, 'logs', (log_row(row, tz) for row in page['items']))
         except Exception as e:
             logger.error(f"查询管理员日志时出错: {str(e)}", exc_info=True)
             return JsonResponse({'success': False, 'error': str(e)}, status=500)
@@ -392,6 +404,8 @@ class PromotionAdmin(admin.ModelAdmin):
             message = f'批量删除促销活动: {obj.name}'
             AdminActionLogger.log(request, 'delete', obj, message)
         super().delete_queryset(request, queryset)
+        # 批量删除不会调用 Promotion.delete()，需要手动通知重建索引
+        invalidate_promotion_index()
 
     def discount_info(self, obj):
         if obj.discount_type == 'percent':
@@ -647,6 +661,78 @@ class ParkingConfigAdmin(admin.ModelAdmin):
         self.message_user(request, f"已重置{updated}个配置的默认值")
     reset_to_default.short_description = "重置选中项为默认值"
 
+# ==================== 车位布局管理 ====================
+class LayoutAdminMixin:
+    """布局模型后台的公共行为：记录操作日志，批量删除后重建车位模板"""
+    layout_label = ''
+
+    def save_model(self, request, obj, form, change):
+        action = '修改' if change else '创建'
+        message = f'{action}{self.layout_label}: {obj}'
+        AdminActionLogger.log(request, 'update' if change else 'create', obj, message)
+        super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        message = f'删除{self.layout_label}: {obj}'
+        AdminActionLogger.log(request, 'delete', obj, message)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            message = f'批量删除{self.layout_label}: {obj}'
+            AdminActionLogger.log(request, 'delete', obj, message)
+        super().delete_queryset(request, queryset)
+        # 批量删除不会调用模型的 delete()，需要手动通知重建车位模板
+        invalidate_spot_template()
+
+    def has_module_permission(self, request):
+        return request.user.is_active and request.user.is_superuser
+
+
+class ParkingZoneInline(admin.TabularInline):
+    model = ParkingZone
+    fields = ('code', 'name', 'sort_order')
+    extra = 0
+
+
+class ParkingSpotInline(admin.TabularInline):
+    model = ParkingSpot
+    fields = ('spot_number', 'sort_order', 'supports_ev', 'supports_truck', 'gate_distance', 'is_active')
+    extra = 0
+
+
+@admin.register(ParkingLot, site=custom_admin_site)
+class ParkingLotAdmin(LayoutAdminMixin, admin.ModelAdmin):
+    layout_label = '停车场'
+    list_display = ('code', 'name', 'sort_order', 'is_active')
+    list_editable = ('sort_order', 'is_active')
+    inlines = [ParkingZoneInline]
+
+
+@admin.register(ParkingZone, site=custom_admin_site)
+class ParkingZoneAdmin(LayoutAdminMixin, admin.ModelAdmin):
+    layout_label = '停车分区'
+    list_display = ('code', 'name', 'lot', 'sort_order', 'spot_count')
+    list_filter = ('lot',)
+    list_editable = ('sort_order',)
+    inlines = [ParkingSpotInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(spot_total=Count('spots'))
+
+    def spot_count(self, obj):
+        return obj.spot_total
+    spot_count.short_description = '车位数量'
+
+
+@admin.register(ParkingSpot, site=custom_admin_site)
+class ParkingSpotAdmin(LayoutAdminMixin, admin.ModelAdmin):
+    layout_label = '车位'
+    list_display = ('spot_number', 'zone', 'sort_order', 'supports_ev', 'supports_truck', 'gate_distance', 'is_active')
+    list_filter = ('zone__lot', 'zone', 'supports_ev', 'supports_truck', 'is_active')
+    list_editable = ('sort_order', 'supports_ev', 'supports_truck', 'gate_distance', 'is_active')
+    search_fields = ('spot_number',)
+
 # ==================== 初始化配置 ====================
 def initialize_default_configs():
     default_configs = [
@@ -0,0 +1,84 @@
+# admin_log_records.py
+"""
+管理员日志查询接口
+
+按时间倒序游标分页(pagination.keyset_page)，筛选条件都有对应的组合索引：
+(timestamp, id)、(user, timestamp, id)、(action, timestamp, id)。
+翻页条件为 timestamp <= 值 AND (timestamp < 值 OR id < 边界id)，任意深度的页面都直接在索引上定位；
+用户名、对象类型先换算成 user_id / content_type_id，查询日志表时不需要 JOIN 过滤。
+操作人与对象类型通过 values() 的关联字段在同一条查询中 JOIN 读取，
+时间按 settings.TIME_ZONE 转换为本地时间。
+"""
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+PAGE_SIZE = 100
+ORDERING = '-timestamp'
+
+LOG_FIELDS = ('id', 'timestamp', 'action', 'object_id', 'message',
+              'user__username', 'content_type__model')
+
+
+def _parse_moment(value, end=False):
+    """解析 YYYY-MM-DD 或 YYYY-MM-DDTHH:MM(本地时间)；只有日期的结束时间包含当天"""
+    try:
+        return timezone.make_aware(datetime.strptime(value, '%Y-%m-%dT%H:%M'))
+    except ValueError:
+        day = timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+        return day + timedelta(days=1) if end else day
+
+
+def parse_log_query(params):
+    """
+    按请求参数构建查询
+
+    参数:
+        params: 支持 user(用户名)、action(操作类型)、model(对象类型，如 vehicle)、
+                start / end(本地日期或时间)
+
+    返回:
+        values() 查询集，参数无效时抛出 ValueError
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from .models import AdminLogEntry, User
+
+    logs = AdminLogEntry.objects.all()
+
+    username = (params.get('user') or '').strip()
+    if username:
+        user_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+        logs = logs.filter(user_id=user_id) if user_id is not None else logs.none()
+
+    action = params.get('action') or ''
+    if action:
+        if action not in AdminLogEntry.ACTION_DISPLAY:
+            raise ValueError(f"无效的操作类型: {action}")
+        logs = logs.filter(action=action)
+
+    model = (params.get('model') or '').strip().lower()
+    if model:
+        logs = logs.filter(content_type_id__in=list(
+            ContentType.objects.filter(model=model).values_list('id', flat=True)))
+
+    if params.get('start'):
+        logs = logs.filter(timestamp__gte=_parse_moment(params['start']))
+    if params.get('end'):
+        logs = logs.filter(timestamp__lt=_parse_moment(params['end'], end=True))
+    return logs.values(*LOG_FIELDS)
+
+
+def log_row(row, tz=None):
+    """接口中的一条日志(values() 字典)，时间为本地时间"""
+    from .models import AdminLogEntry
+
+    tz = tz or timezone.get_current_timezone()
+    return {
+        'id': row['id'],
+        'timestamp': row['timestamp'].astimezone(tz).strftime('%Y-%m-%d %H:%M:%S'),
+        'username': row['user__username'] or '系统',
+        'action': AdminLogEntry.ACTION_DISPLAY.get(row['action'], row['action']),
+        'content_type': row['content_type__model'],
+        'object_id': row['object_id'],
+        'message': row['message']
+    }
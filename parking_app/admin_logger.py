@@ -1,18 +1,188 @@
 # admin_logger.py
-from django.contrib.contenttypes.models import ContentType
-from .models import AdminLogEntry
-
-class AdminActionLogger:
-    @staticmethod
-    def log(request, action, obj=None, message=""):
-        try:
-            content_type = ContentType.objects.get_for_model(obj) if obj else None
-            AdminLogEntry.objects.create(
-                user=request.user,
-                action=action,
-                content_type=content_type,
-                object_id=obj.pk if obj else None,
-                message=message or f"{action} {obj.__class__.__name__} #{obj.pk}"
-            )
-        except Exception as e:
-            logger.error(f"记录管理员日志失败: {str(e)}", exc_info=True)
\ No newline at end of file
+"""
+管理员日志的异步批量写入
+
+AdminActionLogger.log 只把日志条目放入进程内队列，由后台线程每 FLUSH_INTERVAL 秒
+或积累 BATCH_SIZE 条时用 bulk_create 一次写入，请求处理过程中不再写数据库
+(SQLite 下每次写入都要占用数据库写锁)。
+
+- 队列最多 MAX_PENDING 条，写满时由调用方同步写入队列中的条目，内存占用有上限且不丢日志
+- 写入失败时：数据库暂时不可用(如 SQLite 的 database is locked)整批放回队列，后台线程退避后重试；
+  其他错误改为逐条写入，只丢弃本身有问题的条目并记录错误日志
+- 请求线程中写入(同步模式、队列写满)使用保存点，不会影响请求所在的事务，也不关闭数据库连接
+- 进程正常退出(包括 uWSGI 平滑重启 worker)时停止后台线程并写入剩余条目
+- uWSGI 在加载应用后 fork worker，后台线程在各 worker 第一次记录日志时才启动
+- settings.ADMIN_LOG_ASYNC = False 时同步写入(管理命令、调试时使用)
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction, OperationalError
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 1.0  # 秒
+MAX_PENDING = 10000
+SHUTDOWN_TIMEOUT = 5.0  # 退出时等待后台线程结束的时间(秒)
+MAX_BACKOFF = 30.0  # 写入失败后重试的最长间隔(秒)
+
+
+class AdminLogWriter:
+    """进程内的日志队列与后台写入线程"""
+
+    def __init__(self, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.queue = queue.Queue(maxsize=self.max_pending)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _ensure_started(self):
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        with self._start_lock:
+            if self.pid != os.getpid():
+                # fork 后的子进程：父进程的线程与队列不可用
+                self._reset()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='admin-log-writer', daemon=True)
+                self.thread.start()
+
+    def enqueue(self, entry):
+        """放入一条未保存的 AdminLogEntry"""
+        if not getattr(settings, 'ADMIN_LOG_ASYNC', True):
+            if self._write([entry]):
+                logger.error(f"写入管理员日志失败，已丢弃: {entry.message}")
+            return
+        self._ensure_started()
+        while True:
+            try:
+                self.queue.put_nowait(entry)
+                return
+            except queue.Full:
+                # 后台写入跟不上时由调用方写入一批，腾出空间
+                if self.flush(limit=self.batch_size):
+                    continue
+                # 数据库暂时无法写入：等待后台线程腾出空间，仍然写满时只能丢弃
+                try:
+                    self.queue.put(entry, timeout=SHUTDOWN_TIMEOUT)
+                except queue.Full:
+                    logger.error(f"管理员日志队列已满且无法写入数据库，已丢弃: {entry.message}")
+                return
+
+    def _drain(self, limit=None):
+        entries = []
+        while limit is None or len(entries) < limit:
+            try:
+                entries.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return entries
+
+    def _write(self, entries):
+        """
+        写入一批条目，返回需要稍后重试的条目(数据库暂时不可用)
+
+        每次写入都在保存点中进行，在请求的事务中调用时失败也只回滚这一次写入。
+        """
+        from .models import AdminLogEntry
+
+        if not entries:
+            return []
+        with self._write_lock:
+            try:
+                with transaction.atomic():
+                    AdminLogEntry.objects.bulk_create(entries, batch_size=self.batch_size)
+                return []
+            except OperationalError as e:
+                logger.warning(f"批量写入管理员日志失败({len(entries)} 条)，稍后重试: {str(e)}")
+                return entries
+            except Exception as e:
+                logger.error(f"批量写入管理员日志失败({len(entries)} 条)，改为逐条写入: {str(e)}", exc_info=True)
+
+            retry = []
+            for entry in entries:
+                try:
+                    with transaction.atomic():
+                        entry.save()
+                except OperationalError:
+                    retry.append(entry)
+                except Exception as e:
+                    logger.error(f"写入管理员日志失败，已丢弃: {entry.message} ({str(e)})", exc_info=True)
+            return retry
+
+    def _requeue(self, entries):
+        """把写入失败的条目放回队列(队列已满时只能丢弃并记录)"""
+        for index, entry in enumerate(entries):
+            try:
+                self.queue.put_nowait(entry)
+            except queue.Full:
+                logger.error(f"管理员日志队列已满，丢弃 {len(entries) - index} 条写入失败的日志")
+                return
+
+    def flush(self, limit=None):
+        """
+        写入队列中的条目(limit 为空时写入调用时已在队列中的全部条目)
+
+        返回:
+            成功写入的条数；写入失败的条目放回队列
+        """
+        limit = self.queue.qsize() if limit is None else limit
+        written = 0
+        while written < limit:
+            entries = self._drain(min(self.batch_size, limit - written))
+            if not entries:
+                break
+            retry = self._write(entries)
+            if retry:
+                self._requeue(retry)
+                return written + len(entries) - len(retry)
+            written += len(entries)
+        return written
+
+    def _run(self):
+        backoff = 0
+        while not self.stop_event.is_set():
+            try:
+                entry = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            # 等待 flush_interval 积累一批，队列达到 batch_size 时提前写入
+            self.stop_event.wait(self.flush_interval if self.queue.qsize() < self.batch_size - 1 else 0)
+            close_old_connections()
+            retry = self._write([entry] + self._drain(self.batch_size - 1))
+            if retry:
+                # 数据库暂时不可用：放回队列，按指数退避后重试
+                self._requeue(retry)
+                backoff = min(MAX_BACKOFF, backoff * 2 if backoff else self.flush_interval)
+                self.stop_event.wait(backoff)
+            else:
+                backoff = 0
+        close_old_connections()
+
+    def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """停止后台线程并写入剩余条目"""
+        if self.pid != os.getpid():
+            return
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        self.flush()
+        if not self.queue.empty():
+            logger.error(f"进程退出时仍有 {self.queue.qsize()} 条管理员日志未能写入")
+
+
+admin_log_writer = AdminLogWriter()
+atexit.register(admin_log_writer.shutdown)
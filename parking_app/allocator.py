@@ -0,0 +1,182 @@
+# allocator.py
+"""
+车位推荐与自动分配
+
+每个 worker 按车位模板为每种车型、每个分区维护一个空闲车位小顶堆，
+排序键为 (车型匹配惩罚, 距入口距离, 显示顺序)：
+- 货车只能停货车车位(布局中没有货车车位时不限制)
+- 新能源车优先充电车位
+- 小型汽车优先普通车位，把充电/货车车位留给需要的车辆
+选择分区时再加上分区占用率的均衡项，避免车辆集中在入口附近的分区。
+
+堆采用惰性删除：车位被占用后不立即从堆中移除，取堆顶时再丢弃。
+各 worker 通过共享位图的变更日志增量同步(见 occupancy.changes_since)，
+分配时在位图上原子地比较并交换，多个入口同时分配也不会拿到同一个车位。
+只有位图中标记为空闲的车位参与分配，已过期但尚未清理的预订不会被分配。
+"""
+import heapq
+import threading
+
+from .occupancy import get_occupancy_map, FREE, OCCUPIED
+
+VEHICLE_CLASSES = ('car', 'ev', 'truck')
+BALANCE_WEIGHT = 50  # 分区占满时相当于距离增加 50 米
+MAX_CLAIM_ATTEMPTS = 5  # 位图比较并交换失败(被其他进程抢先)时的重试次数
+
+
+class SpotAllocator:
+    """单个车位模板上的分配器(调用方需持有锁)"""
+
+    def __init__(self, template):
+        self.template = template
+        self.version = None
+        self.zones = []
+        zone_index = {}
+        self.spot_zone = []
+        for spot_id, lot, zone, ev, truck, distance in template.spots:
+            key = (lot, zone)
+            if key not in zone_index:
+                zone_index[key] = len(self.zones)
+                self.zones.append(zone)
+            self.spot_zone.append(zone_index[key])
+        self.zone_size = [0] * len(self.zones)
+        for zone in self.spot_zone:
+            self.zone_size[zone] += 1
+
+        has_truck_spots = any(spot[4] for spot in template.spots)
+        # ranks[车型][车位下标] 为排序键，None 表示该车型不能使用此车位
+        self.ranks = {}
+        for vehicle_class in VEHICLE_CLASSES:
+            ranks = []
+            for position, (spot_id, lot, zone, ev, truck, distance) in enumerate(template.spots):
+                if vehicle_class == 'truck':
+                    rank = (0, distance, position) if truck or not has_truck_spots else None
+                elif vehicle_class == 'ev':
+                    rank = (0 if ev else 1, distance, position)
+                else:
+                    rank = (1 if ev or truck else 0, distance, position)
+                ranks.append(rank)
+            self.ranks[vehicle_class] = ranks
+        self._reload([OCCUPIED] * len(template.spots))
+
+    def _reload(self, statuses):
+        """按完整的状态列表重建所有堆"""
+        self.statuses = list(statuses)
+        self.zone_used = [0] * len(self.zones)
+        self.heaps = {vehicle_class: [[] for _ in self.zones] for vehicle_class in VEHICLE_CLASSES}
+        for position, status in enumerate(self.statuses):
+            if status != FREE:
+                self.zone_used[self.spot_zone[position]] += 1
+        for vehicle_class, ranks in self.ranks.items():
+            heaps = self.heaps[vehicle_class]
+            for position, status in enumerate(self.statuses):
+                if status == FREE and ranks[position] is not None:
+                    heaps[self.spot_zone[position]].append(ranks[position])
+            for heap in heaps:
+                heapq.heapify(heap)
+
+    def _update(self, position, status):
+        """同步单个车位的最新状态"""
+        old = self.statuses[position]
+        if old == status:
+            return
+        self.statuses[position] = status
+        zone = self.spot_zone[position]
+        if status == FREE:
+            self.zone_used[zone] -= 1
+            for vehicle_class, ranks in self.ranks.items():
+                if ranks[position] is not None:
+                    heap = self.heaps[vehicle_class][zone]
+                    heapq.heappush(heap, ranks[position])
+                    if len(heap) > 2 * self.zone_size[zone]:
+                        # 重复条目过多时压缩
+                        heap[:] = list({rank for rank in heap if self.statuses[rank[2]] == FREE})
+                        heapq.heapify(heap)
+        elif old == FREE:
+            self.zone_used[zone] += 1
+
+    def sync(self, occupancy_map):
+        """通过位图变更日志增量同步，日志不连续时全量重建"""
+        version = occupancy_map.version
+        if version == self.version:
+            return
+        positions = occupancy_map.changes_since(self.version) if self.version is not None else None
+        if positions is None:
+            self._reload(occupancy_map.raw_statuses())
+        else:
+            for position in positions:
+                self._update(position, occupancy_map.raw_status(position))
+        self.version = version
+
+    def best(self, vehicle_type):
+        """返回最优空闲车位的下标，没有可用车位返回 None"""
+        vehicle_class = vehicle_type if vehicle_type in VEHICLE_CLASSES else 'car'
+        best_key = best_position = None
+        for zone, heap in enumerate(self.heaps[vehicle_class]):
+            while heap and self.statuses[heap[0][2]] != FREE:
+                heapq.heappop(heap)
+            if not heap:
+                continue
+            penalty, distance, position = heap[0]
+            balance = BALANCE_WEIGHT * self.zone_used[zone] / self.zone_size[zone]
+            key = (penalty, distance + balance, position)
+            if best_key is None or key < best_key:
+                best_key, best_position = key, position
+        return best_position
+
+    def claim(self, occupancy_map, vehicle_type):
+        """选出最优车位并在位图上原子地占用，返回车位下标或 None"""
+        for _ in range(MAX_CLAIM_ATTEMPTS):
+            self.sync(occupancy_map)
+            position = self.best(vehicle_type)
+            if position is None:
+                return None
+            if occupancy_map.claim(position) is not None:
+                self._update(position, OCCUPIED)
+                return position
+            # 其他进程已抢先占用，同步后重新选择
+            self._update(position, occupancy_map.raw_status(position))
+        return None
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def _get_allocator(occupancy_map):
+    global _allocator
+    if _allocator is None or _allocator.template is not occupancy_map.template:
+        _allocator = SpotAllocator(occupancy_map.template)
+    return _allocator
+
+
+def recommend_spot(vehicle_type):
+    """
+    推荐最优空闲车位(不占用)
+
+    返回:
+        车位号，没有可用车位返回 None
+    """
+    occupancy_map = get_occupancy_map()
+    with _allocator_lock:
+        allocator = _get_allocator(occupancy_map)
+        allocator.sync(occupancy_map)
+        position = allocator.best(vehicle_type)
+    return occupancy_map.spot_ids[position] if position is not None else None
+
+
+def claim_spot(vehicle_type):
+    """
+    分配并立即占用最优空闲车位(入场时使用)
+
+    位图中的状态立即更新，入场记录保存失败时调用方需按数据库恢复车位状态
+    (occupancy.refresh_spots_on_commit)。
+
+    返回:
+        车位号，没有可用车位返回 None
+    """
+    occupancy_map = get_occupancy_map()
+    with _allocator_lock:
+        allocator = _get_allocator(occupancy_map)
+        position = allocator.claim(occupancy_map, vehicle_type)
+    return occupancy_map.spot_ids[position] if position is not None else None
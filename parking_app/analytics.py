@@ -0,0 +1,131 @@
+# analytics.py
+"""
+收入统计服务(前台 income_data 与后台 get_income_data 共用)
+
+统计金额统一使用支付时保存的 fee，不再按当前费率重新计算。
+趋势与汇总数据按 (统计周期, 停车场, 时间段边界) 缓存在 Django 缓存中：
+- 已结束的周期(如上个月)结果不会再变化，缓存 CLOSED_PERIOD_TIMEOUT 秒；
+  重建收入汇总或重复支付修改了历史记录时更新历史版本戳，使其全部失效
+- 当前周期只缓存 CURRENT_PERIOD_TIMEOUT 秒，支付成功(事务提交)后立即失效
+缓存键中带有对应的共享版本戳，失效时只需更新版本戳，不需要逐个删除缓存键；
+版本戳被缓存淘汰时生成新的版本戳(versioning.current_version)，不会重新命中失效前的结果。
+"""
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .income_rollup import income_summary, period_bounds, day_start, PERIODS
+from .membership_status import prefetch_member_status
+from .versioning import current_version, bump_version
+
+CURRENT_VERSION_NAME = 'income_current'  # 当前周期的缓存版本
+HISTORY_VERSION_NAME = 'income_history'  # 已结束周期的缓存版本
+CURRENT_PERIOD_TIMEOUT = 60  # 当前周期的缓存时间(秒)
+CLOSED_PERIOD_TIMEOUT = 7 * 24 * 3600  # 已结束周期的缓存时间(秒)，不永久占用缓存
+CACHE_KEY_PREFIX = 'parking_app:income:'
+RECORD_LIMIT = 20  # 默认返回的最近记录数
+MAX_RECORD_LIMIT = 500
+
+
+def _cache_key(period, lot_code, start, end, version):
+    return (f'{CACHE_KEY_PREFIX}{period}:{lot_code or "all"}:'
+            f'{int(start.timestamp())}:{int(end.timestamp())}:{version}')
+
+
+def cached_income_summary(period, reference=None, lot_code=None, now=None):
+    """
+    带缓存的 income_summary()(读取收入汇总表)
+
+    参数:
+        reference: 统计周期所包含的时间点，默认当前时间(即当前周期)
+    """
+    now = now or timezone.now()
+    reference = reference or now
+    start, end, _ = period_bounds(period, reference)
+    closed = end <= now
+    version = current_version(HISTORY_VERSION_NAME if closed else CURRENT_VERSION_NAME)
+    key = _cache_key(period, lot_code, start, end, version)
+
+    summary = cache.get(key)
+    if summary is None:
+        summary = income_summary(period, now=reference, lot_code=lot_code)
+        cache.set(key, summary, CLOSED_PERIOD_TIMEOUT if closed else CURRENT_PERIOD_TIMEOUT)
+    return summary
+
+
+def income_records(start, end, limit=RECORD_LIMIT):
+    """
+    [start, end) 内最近的已支付记录(不缓存，会员状态按当前时间判断)
+
+    返回生成器，第一次迭代时才查询数据库，可以直接交给流式 JSON 响应逐条输出。
+    """
+    from .models import Vehicle
+
+    query = Vehicle.objects.filter(paid=True, exit_time__gte=start, exit_time__lt=end)
+    for v in prefetch_member_status(query.order_by('-exit_time')[:min(limit, MAX_RECORD_LIMIT)]):
+        yield {
+            'date': timezone.localtime(v.exit_time).strftime('%Y-%m-%d %H:%M'),
+            'license_plate': v.license_plate,
+            'duration': v.parking_duration_minutes,
+            'amount': float(v.fee or 0),
+            'is_member': v.user_is_member()
+        }
+
+
+def parse_record_limit(value):
+    """解析接口的 ?records= 参数(最近记录数)，格式错误抛出 ValueError"""
+    if not value:
+        return RECORD_LIMIT
+    return max(1, min(int(value), MAX_RECORD_LIMIT))
+
+
+def parse_reference_date(value):
+    """解析接口的 ?date=YYYY-MM-DD 参数(本地日期)，为空时返回 None，格式错误抛出 ValueError"""
+    if not value:
+        return None
+    return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+
+
+def income_report(period, reference=None, lot_code=None, source='rollup', record_limit=RECORD_LIMIT):
+    """
+    收入统计接口的完整数据
+
+    参数:
+        period: 'today' / 'week' / 'month' / 'quarter' / 'year'
+        reference: 统计周期所包含的时间点，默认当前时间
+        source: 'rollup' 读取汇总表(带缓存)；'live' 直接统计停车记录、'archive' 读取列式归档
+                (都不缓存，用于核对汇总表)
+        record_limit: 返回的最近记录数(最多 MAX_RECORD_LIMIT)
+
+    返回:
+        {'stats': {...}, 'trend': {...}, 'records': 记录生成器}
+    """
+    if period not in PERIODS:
+        raise ValueError(f"无效的时间周期: {period}")
+    if source in ('live', 'archive'):
+        summary = income_summary(period, now=reference, lot_code=lot_code, source=source)
+    else:
+        summary = cached_income_summary(period, reference, lot_code)
+    start, end, _ = period_bounds(period, reference)
+    return {'stats': summary['stats'], 'trend': summary['trend'], 'records': income_records(start, end, record_limit)}
+
+
+def invalidate_income_cache(history=False):
+    """使当前周期(以及 history=True 时已结束周期)的统计缓存失效"""
+    bump_version(CURRENT_VERSION_NAME)
+    if history:
+        bump_version(HISTORY_VERSION_NAME)
+
+
+def notify_income_changed(*exit_times):
+    """
+    收入汇总变更后调用(事务提交后生效)
+
+    参数:
+        exit_times: 被修改记录的出场时间，早于今天的记录可能属于已结束的周期
+    """
+    today = day_start(timezone.now())
+    history = any(exit_time is not None and exit_time < today for exit_time in exit_times)
+    transaction.on_commit(lambda: invalidate_income_cache(history))
@@ -0,0 +1,104 @@
+# dashboard.py
+"""
+管理后台首页的数据快照
+
+快照包含：当前车位占用、今日入场/出场/收入、有效预订数、当前促销活动、最近的停车记录。
+整个快照保存在共享缓存的一个键中，首页与 dashboard/data/ 接口只读取这个键，
+打开首页的管理员再多也不会增加数据库查询。
+
+刷新时机：
+- 车位位图版本号变化(入场、支付、预订、促销活动变更都会递增)时
+- 距离上次生成超过 REFRESH_INTERVAL 秒时(今日统计随时间变化)
+需要刷新时只有取得锁的请求重新生成，其他请求继续使用旧快照。
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from .income_rollup import day_start, DAY
+from .occupancy import get_occupancy_map, FREE, OCCUPIED, RESERVED
+from .parking_records import record_row, RECORD_FIELDS
+from .promotion_index import get_promotion_index, promotion_payload
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = 'parking_app:dashboard:snapshot'
+LOCK_KEY = 'parking_app:dashboard:lock'
+REFRESH_INTERVAL = 30  # 快照的最长使用时间(秒)
+LOCK_TIMEOUT = 30  # 生成快照的锁超时(秒)，防止进程异常退出后无法刷新
+RECENT_LIMIT = 10
+
+
+def build_snapshot(now=None):
+    """从位图与数据库生成快照"""
+    from .models import IncomeRollup, Vehicle
+
+    now = now or timezone.now()
+    occupancy_map = get_occupancy_map()
+    version = occupancy_map.version
+    statuses = occupancy_map.statuses()
+
+    today = day_start(now)
+    tomorrow = day_start(today + timedelta(hours=36))
+    income = IncomeRollup.objects.filter(granularity=DAY, bucket_start=today).aggregate(
+        revenue=Sum('revenue'), sessions=Sum('session_count'))
+    recent = Vehicle.objects.values(*RECORD_FIELDS).order_by('-entry_time', '-id')[:RECENT_LIMIT]
+
+    return {
+        'version': version,
+        'built_at': time.time(),
+        'generated_at': timezone.localtime(now).strftime('%Y-%m-%d %H:%M:%S'),
+        'occupancy': {
+            'total': len(statuses),
+            'free': statuses.count(FREE),
+            'occupied': statuses.count(OCCUPIED),
+            'reserved': statuses.count(RESERVED),
+        },
+        'today': {
+            'entries': Vehicle.objects.filter(reserved=False, entry_time__gte=today, entry_time__lt=tomorrow).count(),
+            'exits': Vehicle.objects.filter(exit_time__gte=today, exit_time__lt=tomorrow).count(),
+            'revenue': float(income['revenue'] or 0),
+            'paid_sessions': income['sessions'] or 0,
+        },
+        'active_reservations': Vehicle.objects.filter(
+            reserved=True, exit_time__isnull=True, reservation_expiry_time__gt=now).count(),
+        'active_promotion': promotion_payload(get_promotion_index().active_at(now)),
+        'recent_sessions': [record_row(row) for row in recent],
+    }
+
+
+def refresh_snapshot():
+    """重新生成并写入快照"""
+    snapshot = build_snapshot()
+    cache.set(SNAPSHOT_KEY, snapshot, None)
+    return snapshot
+
+
+def get_dashboard_snapshot():
+    """
+    读取首页快照(需要刷新时由一个请求重新生成)
+
+    返回:
+        快照字典，字段见 build_snapshot
+    """
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is not None and time.time() - snapshot['built_at'] < REFRESH_INTERVAL \
+            and snapshot['version'] == get_occupancy_map().version:
+        return snapshot
+
+    if not cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+        # 其他请求正在生成，先使用旧快照
+        return snapshot if snapshot is not None else build_snapshot()
+    try:
+        return refresh_snapshot()
+    except Exception as e:
+        logger.error(f"生成首页快照失败: {str(e)}", exc_info=True)
+        if snapshot is None:
+            raise
+        return snapshot
+    finally:
+        cache.delete(LOCK_KEY)
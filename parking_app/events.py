@@ -0,0 +1,127 @@
+# events.py
+"""
+车位状态实时推送(Server-Sent Events)
+
+客户端连接 /parking_lot/events/ 后：
+- 首先收到 snapshot 事件(全部车位)和 promotion 事件(当前促销活动)
+- 之后只在车位状态变化时收到 spots 事件(仅包含变化的车位)，促销活动变化时收到 promotion 事件
+- 每 HEARTBEAT_INTERVAL 秒没有数据时发送一条注释作为心跳，防止代理断开空闲连接
+
+事件 id 为共享位图的版本号，浏览器断线重连时会通过 Last-Event-ID 带回，
+服务端据此从位图的变更日志中只补发缺失的车位；超出日志范围时改为发送全量快照。
+
+长连接只能在 ASGI 服务下运行(见 parking_system/asgi.py)；
+通过 uWSGI 等 WSGI 服务访问时返回 204，前端会退回到定时轮询 /parking_lot/data/。
+"""
+import asyncio
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .occupancy import get_occupancy_map
+from .promotion_index import get_promotion_index, promotion_payload
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 1  # 检查位图变化的间隔(秒)
+HEARTBEAT_INTERVAL = 15  # 心跳间隔(秒)
+MAX_STREAM_SECONDS = 600  # 单个连接的最长时间，到期后由浏览器携带 Last-Event-ID 自动重连
+RETRY_MILLISECONDS = 3000  # 建议浏览器的重连间隔
+
+
+def _format_event(event, data, event_id=None):
+    """按 SSE 格式编码一条事件"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def _read_state():
+    """读取当前车位模板、位图版本号、车位状态与促销活动(同步代码，需在线程中调用)"""
+    occupancy_map = get_occupancy_map()
+    version = occupancy_map.version
+    statuses = occupancy_map.statuses()
+    promotion = promotion_payload(get_promotion_index().active_at(timezone.now()))
+    return occupancy_map, version, statuses, promotion
+
+
+def _resume_positions(occupancy_map, last_event_id):
+    """根据 Last-Event-ID 计算断线期间可能变化的车位，无法增量补发时返回 None"""
+    try:
+        since_version = int(last_event_id)
+    except (TypeError, ValueError):
+        return None
+    return occupancy_map.delta_since(since_version)
+
+
+async def _event_stream(last_event_id):
+    occupancy_map, version, statuses, promotion = await sync_to_async(_read_state)()
+    template = occupancy_map.template
+
+    yield f"retry: {RETRY_MILLISECONDS}\n\n"
+    positions = await sync_to_async(_resume_positions)(occupancy_map, last_event_id) if last_event_id else None
+    if positions is None:
+        yield _format_event('snapshot', {"version": version, "spots": template.render(statuses)}, version)
+    else:
+        yield _format_event('spots', {"version": version, "spots": template.render_positions(statuses, positions)}, version)
+    yield _format_event('promotion', {"active_promotion": promotion})
+
+    started = last_sent = time.monotonic()
+    while time.monotonic() - started < MAX_STREAM_SECONDS:
+        await asyncio.sleep(POLL_INTERVAL)
+        try:
+            occupancy_map, new_version, new_statuses, new_promotion = await sync_to_async(_read_state)()
+        except Exception as e:
+            logger.error(f"读取车位状态失败: {str(e)}")
+            return
+
+        if occupancy_map.template is not template:
+            # 车位布局已变化，发送新的全量快照
+            template = occupancy_map.template
+            yield _format_event('snapshot', {"version": new_version, "spots": template.render(new_statuses)}, new_version)
+            last_sent = time.monotonic()
+        elif new_statuses != statuses:
+            changed = [i for i, (old, new) in enumerate(zip(statuses, new_statuses)) if old != new]
+            data = {"version": new_version, "spots": template.render_positions(new_statuses, changed)}
+            yield _format_event('spots', data, new_version)
+            last_sent = time.monotonic()
+        statuses, version = new_statuses, new_version
+
+        if new_promotion != promotion:
+            promotion = new_promotion
+            yield _format_event('promotion', {"active_promotion": promotion})
+            last_sent = time.monotonic()
+
+        if time.monotonic() - last_sent >= HEARTBEAT_INTERVAL:
+            yield ": heartbeat\n\n"
+            last_sent = time.monotonic()
+
+
+def _is_authenticated(request):
+    # request.user 是惰性对象，首次访问时读取会话与用户表，需要在同步线程中执行
+    return request.user.is_authenticated
+
+
+async def parking_lot_events(request):
+    """车位状态实时推送接口(需要登录，未登录返回 401，浏览器收到后不再重连)"""
+    if not await sync_to_async(_is_authenticated)(request):
+        return HttpResponse(status=401)
+    if not isinstance(request, ASGIRequest):
+        # WSGI 下长连接会一直占用工作线程，返回 204 让浏览器停止重连并改用轮询
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(
+        _event_stream(request.headers.get('Last-Event-ID')),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # 关闭 Nginx 缓冲，事件立即下发
+    return response
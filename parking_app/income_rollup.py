@@ -0,0 +1,260 @@
+# income_rollup.py
+"""
+收入汇总表(IncomeRollup)的维护与查询
+
+- 小时汇总：bucket_start 为 UTC 整点，用于"今日"按小时的趋势
+- 天汇总：bucket_start 为本地时区(settings.TIME_ZONE)的零点，用于周/月/季度/年的趋势
+每条汇总行按停车场(ParkingLot.code)区分，车位号通过车位模板映射到停车场。
+
+支付时在同一事务中累加对应的两条汇总行；修改了历史记录或费率回填后，
+用 rebuild_income_rollups 命令按时间范围重建。两种情况都会使 analytics 中的统计缓存失效。
+统计接口最多读取一年的天汇总(约 365 行/停车场)，不再扫描停车记录。
+
+重建汇总与实时统计(source='live')都在数据库中按时间段 GROUP BY，
+时区转换由数据库完成(TruncHour/TruncDay 的 tzinfo 参数)：
+SQLite 由 Django 注册的函数处理；MySQL 需要先加载时区表(mysql_tzinfo_to_sql)。
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import transaction, IntegrityError
+from django.db.models import F, Q, Sum, Count
+from django.db.models.functions import TruncHour, TruncDay
+from django.utils import timezone
+
+from .layout import get_spot_template, DEFAULT_LOT
+
+HOUR, DAY = 'hour', 'day'
+PERIODS = ('today', 'week', 'month', 'quarter', 'year')
+
+
+def hour_start(moment):
+    """所在小时的起点(UTC 整点)"""
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(moment):
+    """所在本地日期的零点(带时区)"""
+    local = timezone.localtime(moment)
+    return timezone.make_aware(datetime(local.year, local.month, local.day))
+
+
+def lot_code_of(spot_number, template=None):
+    """车位所属停车场编号，不在当前布局中的车位归入默认停车场"""
+    template = template or get_spot_template()
+    position = template.positions.get(spot_number)
+    return template.spots[position][1] if position is not None else DEFAULT_LOT[0]
+
+
+def _truncate(granularity):
+    """出场时间在数据库中截断到汇总时间段起点的表达式"""
+    if granularity == HOUR:
+        return TruncHour('exit_time', tzinfo=dt_timezone.utc)
+    return TruncDay('exit_time', tzinfo=timezone.get_current_timezone())
+
+
+def _grouped_sessions(queryset, granularity, *fields):
+    """在数据库中按时间段(以及 fields)分组统计已支付记录的费用与数量"""
+    return queryset.annotate(bucket=_truncate(granularity)).values(*fields, 'bucket').annotate(
+        total_revenue=Sum('fee'),
+        total_sessions=Count('id')
+    ).order_by('bucket').values_list(*fields, 'bucket', 'total_revenue', 'total_sessions')
+
+
+def _add(granularity, lot_code, bucket_start, amount, count=1):
+    from .models import IncomeRollup
+
+    rows = IncomeRollup.objects.filter(granularity=granularity, lot_code=lot_code, bucket_start=bucket_start)
+    changes = {'revenue': F('revenue') + amount, 'session_count': F('session_count') + count}
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            IncomeRollup.objects.create(
+                granularity=granularity, lot_code=lot_code, bucket_start=bucket_start,
+                revenue=amount, session_count=count
+            )
+    except IntegrityError:
+        # 其他请求同时创建了同一条汇总行
+        rows.update(**changes)
+
+
+def record_payment(vehicle, previous=None):
+    """
+    支付成功后累加收入汇总(需在支付的事务中调用)
+
+    参数:
+        previous: (可选)重复支付时上一次记录的 (车位号, 出场时间, 费用)，会先扣除
+    """
+    from .analytics import notify_income_changed
+
+    notify_income_changed(vehicle.exit_time, previous[1] if previous is not None else None)
+    if previous is not None:
+        spot_number, exit_time, fee = previous
+        lot_code = lot_code_of(spot_number)
+        amount = Decimal(fee or 0)
+        _add(HOUR, lot_code, hour_start(exit_time), -amount, -1)
+        _add(DAY, lot_code, day_start(exit_time), -amount, -1)
+    if not vehicle.exit_time:
+        return
+    amount = Decimal(vehicle.fee or 0)
+    lot_code = lot_code_of(vehicle.spot_number)
+    _add(HOUR, lot_code, hour_start(vehicle.exit_time), amount)
+    _add(DAY, lot_code, day_start(vehicle.exit_time), amount)
+
+
+def rebuild_rollups(start=None, end=None, chunk_size=5000):
+    """
+    按停车记录重建 [start, end) 范围内的收入汇总
+
+    start/end 会对齐到本地日期的零点；不指定时重建全部数据。
+    分组统计在数据库中完成，Python 只处理 车位数 × 时间段数 行。
+
+    返回:
+        写入的汇总行数
+    """
+    from .analytics import invalidate_income_cache
+    from .models import IncomeRollup, Vehicle
+
+    paid = Vehicle.objects.filter(paid=True, exit_time__isnull=False)
+    rollups = IncomeRollup.objects.all()
+    if start is not None:
+        start = day_start(start)
+        paid = paid.filter(exit_time__gte=start)
+        rollups = rollups.filter(bucket_start__gte=start)
+    if end is not None:
+        end = day_start(end - timedelta(microseconds=1)) + timedelta(days=1)
+        paid = paid.filter(exit_time__lt=end)
+        rollups = rollups.filter(bucket_start__lt=end)
+
+    template = get_spot_template()
+    totals = {}
+    for granularity in (HOUR, DAY):
+        rows = _grouped_sessions(paid, granularity, 'spot_number')
+        for spot_number, bucket_start, revenue, count in rows.iterator(chunk_size=chunk_size):
+            total = totals.setdefault((granularity, lot_code_of(spot_number, template), bucket_start), [Decimal('0'), 0])
+            total[0] += revenue or Decimal('0')
+            total[1] += count
+
+    with transaction.atomic():
+        rollups.delete()
+        IncomeRollup.objects.bulk_create([
+            IncomeRollup(granularity=granularity, lot_code=lot_code, bucket_start=bucket_start,
+                         revenue=revenue, session_count=count)
+            for (granularity, lot_code, bucket_start), (revenue, count) in totals.items()
+        ], batch_size=chunk_size)
+    invalidate_income_cache(history=True)
+    return len(totals)
+
+
+def period_bounds(period, now=None):
+    """
+    统计周期的本地时间范围
+
+    返回:
+        (开始时间, 结束时间(不含), 汇总粒度)
+    """
+    local = timezone.localtime(now or timezone.now())
+    if period == 'today':
+        start = timezone.make_aware(datetime(local.year, local.month, local.day))
+        return start, start + timedelta(days=1), HOUR
+    if period == 'week':
+        start = timezone.make_aware(datetime(local.year, local.month, local.day) - timedelta(days=local.weekday()))
+        return start, start + timedelta(days=7), DAY
+    if period == 'month':
+        first_month, months = local.month, 1
+    elif period == 'quarter':
+        first_month, months = (local.month - 1) // 3 * 3 + 1, 3
+    elif period == 'year':
+        first_month, months = 1, 12
+    else:
+        raise ValueError(f"无效的时间周期: {period}")
+    start = timezone.make_aware(datetime(local.year, first_month, 1))
+    end_year, end_month = divmod(first_month - 1 + months, 12)
+    end = timezone.make_aware(datetime(local.year + end_year, end_month + 1, 1))
+    return start, end, DAY
+
+
+def rollup_series(granularity, start, end, lot_code=None):
+    """
+    读取 [start, end) 内的汇总行(多个停车场合并)
+
+    返回:
+        按时间排序的 (bucket_start, 收入, 停车次数) 列表
+    """
+    from .models import IncomeRollup
+
+    rows = IncomeRollup.objects.filter(granularity=granularity, bucket_start__gte=start, bucket_start__lt=end)
+    if lot_code:
+        rows = rows.filter(lot_code=lot_code)
+    return list(rows.values('bucket_start').annotate(
+        total_revenue=Sum('revenue'),
+        total_sessions=Sum('session_count')
+    ).order_by('bucket_start').values_list('bucket_start', 'total_revenue', 'total_sessions'))
+
+
+def live_series(granularity, start, end, lot_code=None):
+    """
+    直接在数据库中统计 [start, end) 内已支付记录(不读取汇总表)
+
+    返回:
+        与 rollup_series() 相同格式的列表
+    """
+    from .models import Vehicle
+
+    paid = Vehicle.objects.filter(paid=True, exit_time__gte=start, exit_time__lt=end)
+    if lot_code:
+        template = get_spot_template()
+        condition = Q(spot_number__in=[spot[0] for spot in template.spots if spot[1] == lot_code])
+        if lot_code == DEFAULT_LOT[0]:
+            # 与汇总表一致：不在当前布局中的车位归入默认停车场
+            condition |= ~Q(spot_number__in=template.spot_ids) | Q(spot_number__isnull=True)
+        paid = paid.filter(condition)
+    return list(_grouped_sessions(paid, granularity))
+
+
+def income_summary(period, now=None, lot_code=None, source='rollup'):
+    """
+    收入统计的趋势与汇总数据
+
+    参数:
+        source: 'rollup' 读取汇总表；'live' 直接在数据库中分组统计停车记录；
+                'archive' 已归档部分读取列式归档(session_archive)，其余部分在数据库中统计
+
+    返回:
+        {'stats': {...}, 'trend': {'labels': [...], 'amounts': [...]}}
+    """
+    start, end, granularity = period_bounds(period, now)
+    if source == 'archive':
+        from .session_archive import archive_series
+        series = archive_series(granularity, start, end, lot_code)
+    else:
+        series = (live_series if source == 'live' else rollup_series)(granularity, start, end, lot_code)
+
+    if period == 'today':
+        # 按小时统计
+        hours = [0.0] * 24
+        for bucket_start, revenue, _ in series:
+            hours[timezone.localtime(bucket_start).hour] += float(revenue)
+        trend = {'labels': [f"{h:02d}:00" for h in range(24)], 'amounts': hours}
+    else:
+        # 周/月按天统计，季度/年按月统计(只包含有记录的时间段)
+        label_format = '%m-%d' if period in ('week', 'month') else '%Y-%m'
+        buckets = {}
+        for bucket_start, revenue, sessions in series:
+            if sessions:
+                label = timezone.localtime(bucket_start).strftime(label_format)
+                buckets[label] = buckets.get(label, 0.0) + float(revenue)
+        labels = sorted(buckets)
+        trend = {'labels': labels, 'amounts': [buckets[label] for label in labels]}
+
+    total_income = float(sum((revenue for _, revenue, _ in series), Decimal('0')))
+    return {
+        'stats': {
+            'total_income': total_income,
+            'avg_daily_income': total_income / (7 if period == 'week' else 1),
+            'max_daily_income': max(trend['amounts']) if trend['amounts'] else 0,
+            'parking_count': sum(sessions for _, _, sessions in series)
+        },
+        'trend': trend
+    }
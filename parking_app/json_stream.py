@@ -0,0 +1,61 @@
+# json_stream.py
+"""
+流式 JSON 响应
+
+把 {"head 字段"..., "数组字段": [元素...], "tail 字段"...} 逐段输出：
+先立即输出 head 部分(首字节时间与数据量无关)，数组元素边编码边输出，
+每累积 BUFFER_SIZE 个字符发送一次，内存占用与结果行数无关。
+tail 在数组输出完毕后才计算，可以放入需要遍历后才知道的值(如下一页游标)。
+输出格式与 JsonResponse(json.dumps 默认分隔符)一致。
+"""
+import logging
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = 64 * 1024
+
+
+def iter_json(head, array_key, items, tail=None, encoder=DjangoJSONEncoder, buffer_size=BUFFER_SIZE):
+    """
+    逐段生成 JSON 文本
+
+    参数:
+        head: 数组之前的字段(dict)
+        array_key: 数组字段名
+        items: 数组元素的可迭代对象(可以是生成器)
+        tail: (可选)返回数组之后字段(dict)的函数，在所有元素输出后调用
+    """
+    encode = encoder().encode
+    yield '{' + ''.join(f'{encode(key)}: {encode(value)}, ' for key, value in head.items()) + f'{encode(array_key)}: ['
+
+    try:
+        parts, size, separator = [], 0, ''
+        for item in items:
+            text = separator + encode(item)
+            separator = ', '
+            parts.append(text)
+            size += len(text)
+            if size >= buffer_size:
+                yield ''.join(parts)
+                parts, size = [], 0
+        parts.append(']')
+        if tail is not None:
+            parts.extend(f', {encode(key)}: {encode(value)}' for key, value in tail().items())
+        parts.append('}')
+        yield ''.join(parts)
+    except Exception as e:
+        # 响应头已经发出，无法再返回错误状态码，只能中断输出
+        logger.error(f"流式输出 JSON 时出错: {str(e)}", exc_info=True)
+        raise
+
+
+def streaming_json_response(head, array_key, items, tail=None, encoder=DjangoJSONEncoder, status=200):
+    """返回逐段输出的 JSON 响应(参数同 iter_json)"""
+    return StreamingHttpResponse(
+        iter_json(head, array_key, items, tail, encoder),
+        content_type='application/json',
+        status=status
+    )
@@ -0,0 +1,118 @@
+# layout.py
+"""
+车位布局模板
+
+停车场/分区/车位的布局保存在数据库中(ParkingLot / ParkingZone / ParkingSpot)，
+每个 worker 只加载一次并编译成不可变的 SpotTemplate：
+车位顺序、属性以及每种状态下的展示字典和 JSON 片段都预先生成，
+车位地图视图只需要把状态叠加到模板上，不再逐个构造车位字典。
+
+在后台修改布局后会更新共享版本戳，所有 worker 在下一次访问时重新编译，无需重启。
+"""
+import hashlib
+import json
+import logging
+
+from django.db import DatabaseError
+
+from .versioning import VersionedCache
+
+logger = logging.getLogger(__name__)
+
+LAYOUT_VERSION_NAME = 'spot_template'
+
+# 数据库中尚未配置车位时使用的默认布局(与原先硬编码的 A-E 区一致)
+DEFAULT_LOT = ('main', '凉心停车场')
+DEFAULT_ZONES = [('A', 15), ('B', 24), ('C', 23), ('D', 12), ('E', 11)]
+
+# 车位状态码与显示名称，顺序与 occupancy 模块中的状态码一致
+STATUS_NAMES = ('available', 'occupied', 'reserved')
+
+
+class SpotTemplate:
+    """编译后的车位模板(不可变)"""
+
+    def __init__(self, spots):
+        """
+        参数:
+            spots: 按显示顺序排列的 (车位号, 停车场编号, 分区编号, 支持新能源, 支持货车, 距入口距离) 序列
+        """
+        self.spots = tuple(spots)
+        self.spot_ids = tuple(spot[0] for spot in self.spots)
+        self.positions = {spot_id: i for i, spot_id in enumerate(self.spot_ids)}
+        digest = hashlib.sha1('\n'.join(self.spot_ids).encode('utf-8')).digest()
+        self.layout_hash = int.from_bytes(digest[:8], 'little')
+
+        # 每个车位在每种状态下的展示字典与 JSON 片段，模板视图只读使用
+        self._dicts = tuple(
+            tuple(
+                {"id": spot_id, "status": status, "lot": lot, "zone": zone, "ev": ev, "truck": truck}
+                for spot_id, lot, zone, ev, truck, _ in self.spots
+            )
+            for status in STATUS_NAMES
+        )
+        self._fragments = tuple(
+            tuple(json.dumps(spot, ensure_ascii=False) for spot in dicts)
+            for dicts in self._dicts
+        )
+
+    def __len__(self):
+        return len(self.spot_ids)
+
+    def render(self, statuses):
+        """把状态码列表叠加到模板上，返回车位字典列表(供模板渲染)"""
+        dicts = self._dicts
+        return [dicts[status][i] for i, status in enumerate(statuses)]
+
+    def render_positions(self, statuses, positions):
+        """只返回指定下标车位的展示字典(增量数据)"""
+        dicts = self._dicts
+        return [dicts[statuses[i]][i] for i in sorted(positions)]
+
+    def render_json(self, statuses):
+        """把状态码列表叠加到模板上，直接返回 JSON 数组字符串"""
+        fragments = self._fragments
+        return '[' + ', '.join(fragments[status][i] for i, status in enumerate(statuses)) + ']'
+
+
+def default_spots():
+    """默认布局的车位序列"""
+    lot_code = DEFAULT_LOT[0]
+    return [(f"{zone}{num}", lot_code, zone, False, False, 0)
+            for zone, size in DEFAULT_ZONES for num in range(1, size + 1)]
+
+
+def _load_spot_template():
+    from .models import ParkingSpot
+
+    try:
+        rows = list(ParkingSpot.objects.filter(
+            is_active=True,
+            zone__lot__is_active=True
+        ).order_by(
+            'zone__lot__sort_order', 'zone__lot__id', 'zone__sort_order', 'zone__id', 'sort_order', 'id'
+        ).values_list('spot_number', 'zone__lot__code', 'zone__code', 'supports_ev', 'supports_truck',
+                      'gate_distance'))
+    except DatabaseError as e:
+        # 布局表尚未迁移时退回默认布局
+        logger.warning(f"读取车位布局失败，使用默认布局: {str(e)}")
+        rows = []
+    return SpotTemplate(rows or default_spots())
+
+
+_spot_template = VersionedCache(LAYOUT_VERSION_NAME, _load_spot_template)
+
+
+def get_spot_template():
+    """返回当前 worker 的车位模板，布局变更后自动重新编译"""
+    return _spot_template.get()
+
+
+def refresh_spot_template():
+    """只让当前进程在下一次访问时重新加载模板(不通知其他进程)"""
+    _spot_template.refresh()
+
+
+def invalidate_spot_template():
+    """布局变更后调用，通知所有 worker 重新编译车位模板"""
+    _spot_template.invalidate()
@@ -0,0 +1,106 @@
+# benchmark_entry.py
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, DatabaseError, IntegrityError
+from django.utils import timezone
+
+from parking_app.models import User, Vehicle, OpenSessionConflict
+
+PLATE_PREFIX = 'BENCH'
+SPOT_PREFIX = 'BN'
+
+
+class Command(BaseCommand):
+    """
+    入场并发压测：多个线程模拟多个入口同时入场、随即出场
+
+    对比两种入场方式的吞吐量与冲突处理：
+    - legacy：先查车牌、再查车位、最后 INSERT(原实现，三次数据库往返)
+    - single：单条 INSERT，冲突由部分唯一约束判定(Vehicle.create_open_session)
+    压测数据使用 BENCH 前缀的车牌，结束后自动删除。
+    """
+
+    help = '入场接口并发压测(对比查询后插入与单条插入)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='并发线程数(模拟入口数)')
+        parser.add_argument('--entries', type=int, default=200, help='每个线程尝试入场的次数')
+        parser.add_argument('--spots', type=int, default=20, help='参与争抢的车位数量(越少冲突越多)')
+        parser.add_argument('--mode', choices=['legacy', 'single', 'both'], default='both', help='压测方式')
+
+    def legacy_entry(self, user, license_plate, spot_number):
+        open_sessions = Vehicle.objects.filter(exit_time__isnull=True)
+        if open_sessions.filter(license_plate=license_plate).exists():
+            return False
+        if open_sessions.filter(spot_number=spot_number).exists():
+            return False
+        Vehicle.objects.create(user=user, license_plate=license_plate, spot_number=spot_number)
+        return True
+
+    def single_entry(self, user, license_plate, spot_number):
+        try:
+            Vehicle.create_open_session(user=user, license_plate=license_plate, spot_number=spot_number)
+        except OpenSessionConflict:
+            return False
+        return True
+
+    def run_mode(self, mode, user, options):
+        entry = self.legacy_entry if mode == 'legacy' else self.single_entry
+        stats = {'success': 0, 'conflict': 0, 'error': 0}
+        lock = threading.Lock()
+
+        def worker(index):
+            rng = random.Random(index)
+            local = {'success': 0, 'conflict': 0, 'error': 0}
+            try:
+                for n in range(options['entries']):
+                    license_plate = f'{PLATE_PREFIX}{index:02d}{n:05d}'
+                    spot_number = f'{SPOT_PREFIX}{rng.randrange(options["spots"])}'
+                    try:
+                        if entry(user, license_plate, spot_number):
+                            local['success'] += 1
+                            # 立即出场，释放车位
+                            Vehicle.objects.filter(license_plate=license_plate, exit_time__isnull=True) \
+                                .update(exit_time=timezone.now())
+                        else:
+                            local['conflict'] += 1
+                    except IntegrityError:
+                        # 查询后插入方式在检查与插入之间被抢先，由唯一约束兜底
+                        local['conflict'] += 1
+                    except DatabaseError:
+                        local['error'] += 1  # 如 SQLite 的 database is locked
+            finally:
+                connection.close()
+                with lock:
+                    for key, value in local.items():
+                        stats[key] += value
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        attempts = options['threads'] * options['entries']
+        self.stdout.write(
+            f'{mode:>6}: {attempts} 次入场用时 {elapsed:.2f}s，{attempts / elapsed:.0f} 次/秒；'
+            f'成功 {stats["success"]}，冲突 {stats["conflict"]}，错误 {stats["error"]}'
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError('数据库中没有用户，无法创建压测记录')
+
+        modes = ['legacy', 'single'] if options['mode'] == 'both' else [options['mode']]
+        try:
+            for mode in modes:
+                self.run_mode(mode, user, options)
+        finally:
+            deleted, _ = Vehicle.objects.filter(license_plate__startswith=PLATE_PREFIX).delete()
+            self.stdout.write(self.style.SUCCESS(f'已清理 {deleted} 条压测记录'))
@@ -0,0 +1,121 @@
+# benchmark_income.py
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from parking_app.income_rollup import PERIODS, period_bounds, income_summary, rebuild_rollups
+from parking_app.models import User, Vehicle
+
+PLATE_PREFIX = 'BENCH'
+
+
+class Command(BaseCommand):
+    """
+    收入统计压测：在事务中生成大量已支付记录，对比三种统计方式的耗时并校验结果一致
+
+    - python：逐行读取记录、localtime 转换后在 Python 中累加(原实现)
+    - live：数据库按时区分组统计(income_summary(source='live'))
+    - rollup：读取收入汇总表(income_summary(source='rollup'))
+    压测数据在事务中生成，结束后整体回滚，不影响现有数据。
+    """
+
+    help = '收入统计压测(对比 Python 逐行统计、数据库分组统计与汇总表)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='生成的已支付记录数')
+        parser.add_argument('--batch-size', type=int, default=5000, help='每批写入的记录数')
+        parser.add_argument('--spots', type=int, default=200, help='记录分布的车位数量')
+
+    def legacy_summary(self, period, now):
+        """原 get_income_data 的统计方式(时间范围与新实现一致)"""
+        start, end, _ = period_bounds(period, now)
+        query = Vehicle.objects.filter(paid=True, exit_time__gte=start, exit_time__lt=end)
+        buckets = {}
+        count = 0
+        total_income = 0.0
+        for v in query:
+            local = timezone.localtime(v.exit_time)
+            if period == 'today':
+                label = f"{local.hour:02d}:00"
+            elif period in ('week', 'month'):
+                label = local.strftime('%m-%d')
+            else:
+                label = local.strftime('%Y-%m')
+            buckets[label] = buckets.get(label, 0.0) + float(v.fee or 0)
+            total_income += float(v.fee or 0)
+            count += 1
+        return buckets, total_income, count
+
+    def generate(self, user, options, now):
+        """在本年度内均匀生成已支付记录"""
+        year_start, _, _ = period_bounds('year', now)
+        span = int((now - year_start).total_seconds())
+        rng = random.Random(0)
+        batch = []
+        for n in range(options['rows']):
+            exit_time = year_start + timedelta(seconds=rng.randrange(span))
+            batch.append(Vehicle(
+                user=user,
+                license_plate=f'{PLATE_PREFIX}{n:07d}',
+                spot_number=f'A{rng.randrange(options["spots"]) + 1}',
+                entry_time=exit_time - timedelta(minutes=rng.randrange(10, 600)),
+                exit_time=exit_time,
+                paid=True,
+                fee=Decimal(rng.randrange(0, 20000)) / 100,
+                order_number=f'{PLATE_PREFIX}-{n:07d}'
+            ))
+            if len(batch) >= options['batch_size']:
+                Vehicle.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Vehicle.objects.bulk_create(batch)
+
+    def timed(self, func, *args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        return result, time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        user = User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError('数据库中没有用户，无法创建压测记录')
+
+        now = timezone.now()
+        with transaction.atomic():
+            _, elapsed = self.timed(self.generate, user, options, now)
+            self.stdout.write(f'生成 {options["rows"]} 条记录用时 {elapsed:.1f}s')
+            written, elapsed = self.timed(rebuild_rollups, *period_bounds('year', now)[:2],
+                                          chunk_size=options['batch_size'])
+            self.stdout.write(f'重建汇总 {written} 行用时 {elapsed:.1f}s')
+
+            mismatches = 0
+            for period in PERIODS:
+                (buckets, total_income, count), legacy_time = self.timed(self.legacy_summary, period, now)
+                live, live_time = self.timed(income_summary, period, now, source='live')
+                rollup, rollup_time = self.timed(income_summary, period, now, source='rollup')
+
+                expected = {label: round(amount, 2) for label, amount in buckets.items()}
+                for name, summary in (('live', live), ('rollup', rollup)):
+                    trend = summary['trend']
+                    actual = {label: round(amount, 2) for label, amount in zip(trend['labels'], trend['amounts'])
+                              if amount or label in expected}
+                    stats = summary['stats']
+                    if (actual != expected or round(stats['total_income'], 2) != round(total_income, 2)
+                            or stats['parking_count'] != count):
+                        mismatches += 1
+                        self.stdout.write(self.style.ERROR(f'{period:>7} {name}: 结果与逐行统计不一致'))
+
+                self.stdout.write(
+                    f'{period:>7}: {count} 条记录；python {legacy_time * 1000:.0f}ms，'
+                    f'live {live_time * 1000:.0f}ms，rollup {rollup_time * 1000:.0f}ms'
+                )
+            transaction.set_rollback(True)
+
+        if mismatches:
+            raise CommandError(f'{mismatches} 项统计结果不一致')
+        self.stdout.write(self.style.SUCCESS('统计结果一致，压测数据已回滚'))
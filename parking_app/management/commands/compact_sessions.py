@@ -0,0 +1,40 @@
+# compact_sessions.py
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from parking_app.session_archive import compact, rebuild_month, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    """
+    把已出场、已支付的停车记录追加到列式归档(按月分区)
+
+    每晚执行一次，例如 crontab：
+        10 0 * * * cd /path/to/parking_system && python manage.py compact_sessions
+    """
+
+    help = '归档已结束的停车记录(列式文件，按月分区)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until', help='归档出场时间早于该日期(YYYY-MM-DD)的记录，默认今天(晚于今天时按今天)')
+        parser.add_argument('--rebuild', metavar='YYYY-MM', help='按数据库重建指定月份的分区')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='每批读取的记录数')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            if options['rebuild']:
+                datetime.strptime(options['rebuild'], '%Y-%m')
+                rows = rebuild_month(options['rebuild'], batch_size=options['batch_size'])
+                message = f'{options["rebuild"]} 分区已重建，共 {rows} 条记录'
+            else:
+                until = timezone.make_aware(datetime.strptime(options['until'], '%Y-%m-%d')) \
+                    if options['until'] else None
+                rows = compact(until, batch_size=options['batch_size'])
+                message = f'已归档 {rows} 条记录'
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'{message}，用时 {time.perf_counter() - started:.1f}s'))
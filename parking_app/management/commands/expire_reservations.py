@@ -0,0 +1,30 @@
+# expire_reservations.py
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from parking_app.reservation_expiry import ReservationExpiryScheduler
+
+
+class Command(BaseCommand):
+    """运行预订过期调度器(常驻后台，只需启动一个实例)"""
+
+    help = '按过期时间批量清理过期预订'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='只清理一次当前已过期的预订后退出(用于定时任务)')
+
+    def handle(self, *args, **options):
+        scheduler = ReservationExpiryScheduler()
+        if options['once']:
+            expired = scheduler.run_once()
+            self.stdout.write(self.style.SUCCESS(f'已清理 {expired} 条过期预订'))
+            return
+
+        stop_event = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop_event.set())
+        self.stdout.write('预订过期调度器已启动')
+        scheduler.run_forever(stop_event)
+        self.stdout.write('预订过期调度器已停止')
@@ -0,0 +1,46 @@
+# export_sessions.py
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from parking_app.session_export import stream_sessions, parse_filters, FORMATS, CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    """流式导出停车记录(CSV / NDJSON)，内存占用与导出行数无关"""
+
+    help = '导出停车记录为 CSV 或 NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv', help='导出格式')
+        parser.add_argument('--output', '-o', help='输出文件，不指定则写到标准输出')
+        parser.add_argument('--start', help='入场日期起始(YYYY-MM-DD，含)')
+        parser.add_argument('--end', help='入场日期结束(YYYY-MM-DD，含)')
+        parser.add_argument('--plate', help='车牌号包含的内容')
+        parser.add_argument('--paid', choices=['1', '0'], help='1 只导出已支付，0 只导出未支付')
+        parser.add_argument('--type', choices=['car', 'truck', 'ev'], help='车辆类型')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='每批读取的记录数')
+
+    def handle(self, *args, **options):
+        try:
+            filters = parse_filters(options)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        lines = 0
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for line in stream_sessions(options['format'], filters, chunk_size=options['chunk_size']):
+                output.write(line)
+                lines += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        if options['output']:
+            rows = lines - 1 if options['format'] == 'csv' else lines  # CSV 第一行为表头
+            self.stderr.write(self.style.SUCCESS(
+                f'已导出 {rows} 条记录到 {options["output"]}，用时 {time.perf_counter() - started:.1f}s'
+            ))
@@ -0,0 +1,33 @@
+# rebuild_income_rollups.py
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from parking_app.income_rollup import rebuild_rollups
+from parking_app.session_histogram import rebuild_histograms
+
+
+class Command(BaseCommand):
+    """按停车记录重建收入汇总表与时长/费用分布(首次部署、修改历史记录或费用回填后执行)"""
+
+    help = '重建按小时/按天的收入汇总与时长/费用分布'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='出场日期起始(YYYY-MM-DD，含)，不指定则从最早记录开始')
+        parser.add_argument('--end', help='出场日期结束(YYYY-MM-DD，不含)，不指定则到最新记录')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='每批读取的记录数')
+
+    def parse_date(self, value):
+        try:
+            return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+        except ValueError:
+            raise CommandError(f'无效的日期: {value}')
+
+    def handle(self, *args, **options):
+        start = self.parse_date(options['start']) if options['start'] else None
+        end = self.parse_date(options['end']) if options['end'] else None
+        written = rebuild_rollups(start, end, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'收入汇总已重建，共写入 {written} 行'))
+        written = rebuild_histograms(start, end, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'时长/费用分布已重建，共写入 {written} 行'))
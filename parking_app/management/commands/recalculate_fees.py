@@ -0,0 +1,92 @@
+# recalculate_fees.py
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from parking_app.income_rollup import rebuild_rollups
+from parking_app.models import Vehicle
+from parking_app.session_archive import SessionArchive, month_bounds, month_key, rebuild_month
+from parking_app.session_histogram import rebuild_histograms
+from parking_app.tariff import calculate_queryset_fees
+
+
+class Command(BaseCommand):
+    """
+    使用批量计费引擎重新计算已出场记录的停车费用(用于费率调整后的数据回填)
+
+    写入后按被修改记录的出场日期范围重建收入汇总与时长/费用分布(同时使已结束周期的统计缓存失效)，
+    并重建包含被修改记录的已归档月份分区。
+    """
+
+    help = '批量重新计算已出场车辆的停车费用'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='出场时间起始日期(YYYY-MM-DD，含)')
+        parser.add_argument('--end', help='出场时间结束日期(YYYY-MM-DD，不含)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='每批处理的记录数')
+        parser.add_argument('--dry-run', action='store_true', help='只统计变化，不写入数据库')
+
+    def parse_date(self, value):
+        try:
+            return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+        except ValueError:
+            raise CommandError(f'无效的日期: {value}')
+
+    def handle(self, *args, **options):
+        queryset = Vehicle.objects.filter(exit_time__isnull=False)
+        if options['start']:
+            queryset = queryset.filter(exit_time__gte=self.parse_date(options['start']))
+        if options['end']:
+            queryset = queryset.filter(exit_time__lt=self.parse_date(options['end']))
+
+        batch_size = options['batch_size']
+        last_id = 0
+        scanned = changed = 0
+        exit_times = []  # 被修改记录的出场时间(每批只保留最早与最晚)
+        months = set()
+        while True:
+            batch = queryset.filter(id__gt=last_id).order_by('id')[:batch_size]
+            fees = calculate_queryset_fees(batch)
+            if not fees:
+                break
+            last_id = max(fees)
+            scanned += len(fees)
+
+            stale = []
+            stale_exits = []
+            for vehicle_id, fee, exit_time in Vehicle.objects.filter(
+                    id__in=list(fees)).values_list('id', 'fee', 'exit_time'):
+                if fee != fees[vehicle_id]:
+                    stale.append(Vehicle(id=vehicle_id, fee=fees[vehicle_id]))
+                    stale_exits.append(exit_time)
+            changed += len(stale)
+            if stale:
+                exit_times += [min(stale_exits), max(stale_exits)]
+                months.update(month_key(exit_time) for exit_time in stale_exits)
+            if stale and not options['dry_run']:
+                Vehicle.objects.bulk_update(stale, ['fee'], batch_size=batch_size)
+
+        action = '需要更新' if options['dry_run'] else '已更新'
+        self.stdout.write(self.style.SUCCESS(f'共检查 {scanned} 条记录，{action} {changed} 条'))
+        if not changed:
+            return
+        if options['dry_run']:
+            self.stdout.write(f'写入后将重建 {timezone.localdate(min(exit_times))} ~ '
+                              f'{timezone.localdate(max(exit_times))} 的收入汇总与时长/费用分布')
+            return
+        self.rebuild(min(exit_times), max(exit_times) + timedelta(microseconds=1), months, batch_size)
+
+    def rebuild(self, start, end, months, batch_size):
+        """重建费用变化涉及的汇总数据与归档分区"""
+        written = rebuild_rollups(start, end, chunk_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'收入汇总已重建，共写入 {written} 行'))
+        written = rebuild_histograms(start, end, chunk_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'时长/费用分布已重建，共写入 {written} 行'))
+
+        archived_until = SessionArchive().archived_until()
+        for month in sorted(months):
+            if archived_until is None or month_bounds(month)[0] >= archived_until:
+                continue  # 尚未归档的月份在下一次归档时按新费用写入
+            rows = rebuild_month(month, batch_size=batch_size)
+            self.stdout.write(self.style.SUCCESS(f'{month} 归档分区已重建，共 {rows} 条记录'))
@@ -0,0 +1,14 @@
+# reconcile_occupancy.py
+from django.core.management.base import BaseCommand
+
+from parking_app.occupancy import get_occupancy_map
+
+
+class Command(BaseCommand):
+    """从数据库重建车位占用共享位图(部署启动时或发现状态不一致时执行)"""
+
+    help = '从数据库重建车位占用状态位图'
+
+    def handle(self, *args, **options):
+        occupied, reserved = get_occupancy_map().reconcile()
+        self.stdout.write(self.style.SUCCESS(f'车位状态已重建：占用 {occupied} 个，预订 {reserved} 个'))
@@ -0,0 +1,79 @@
+# membership_status.py
+"""
+会员状态解析
+
+原来每条车辆记录都通过 vehicle.user.membership 判断会员资格，
+会依次懒加载用户和会员两条记录。这里改为按 user_id 批量查询，
+并在一次请求内缓存每个用户的结果，同一用户只查询一次。
+"""
+from contextvars import ContextVar
+
+from django.utils import timezone
+
+_current_resolver = ContextVar('membership_resolver', default=None)
+
+
+class MembershipResolver:
+    """按用户ID解析会员资格是否有效，结果缓存在实例内"""
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+        self.memo = {}
+
+    def prefetch(self, user_ids):
+        """一次查询解析多个用户的会员状态，已缓存的用户不会重复查询"""
+        from .models import Membership
+
+        missing = {user_id for user_id in user_ids if user_id is not None and user_id not in self.memo}
+        if missing:
+            active = set(Membership.objects.filter(
+                user_id__in=missing,
+                end_date__gte=self.now
+            ).values_list('user_id', flat=True))
+            for user_id in missing:
+                self.memo[user_id] = user_id in active
+        return self.memo
+
+    def is_member(self, user_id):
+        """返回指定用户当前是否为有效会员"""
+        if user_id is None:
+            return False
+        if user_id not in self.memo:
+            self.prefetch([user_id])
+        return self.memo[user_id]
+
+    def member_user_ids(self, user_ids):
+        """返回 user_ids 中会员资格有效的用户ID集合"""
+        memo = self.prefetch(user_ids)
+        return {user_id for user_id in user_ids if memo.get(user_id)}
+
+
+def get_membership_resolver():
+    """返回当前请求的解析器；不在请求上下文中时返回一个新的解析器"""
+    resolver = _current_resolver.get()
+    return resolver if resolver is not None else MembershipResolver()
+
+
+def activate_resolver():
+    """为当前上下文创建解析器，返回用于恢复的令牌"""
+    return _current_resolver.set(MembershipResolver())
+
+
+def deactivate_resolver(token):
+    """恢复进入 activate_resolver() 之前的解析器"""
+    _current_resolver.reset(token)
+
+
+def prefetch_member_status(vehicles, resolver=None):
+    """
+    为一组车辆记录预取会员状态
+
+    结果写入每条记录的 _member_status 属性，之后调用
+    vehicle.user_is_member() 不再产生查询。
+    """
+    vehicles = list(vehicles)
+    resolver = resolver or get_membership_resolver()
+    memo = resolver.prefetch(vehicle.user_id for vehicle in vehicles)
+    for vehicle in vehicles:
+        vehicle._member_status = memo.get(vehicle.user_id, False)
+    return vehicles
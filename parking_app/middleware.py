@@ -0,0 +1,16 @@
+# middleware.py
+from .membership_status import activate_resolver, deactivate_resolver
+
+
+class MembershipResolverMiddleware:
+    """为每个请求提供独立的会员状态缓存，同一请求内每个用户只解析一次"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = activate_resolver()
+        try:
+            return self.get_response(request)
+        finally:
+            deactivate_resolver(token)
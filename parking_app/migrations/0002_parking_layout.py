@@ -0,0 +1,82 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+DEFAULT_ZONES = [('A', 15), ('B', 24), ('C', 23), ('D', 12), ('E', 11)]
+
+
+def create_default_layout(apps, schema_editor):
+    """按原先硬编码的 A-E 区生成默认车位布局"""
+    ParkingLot = apps.get_model('parking_app', 'ParkingLot')
+    ParkingZone = apps.get_model('parking_app', 'ParkingZone')
+    ParkingSpot = apps.get_model('parking_app', 'ParkingSpot')
+
+    lot, _ = ParkingLot.objects.get_or_create(code='main', defaults={'name': '凉心停车场'})
+    for zone_order, (zone_code, size) in enumerate(DEFAULT_ZONES):
+        zone, _ = ParkingZone.objects.get_or_create(
+            lot=lot, code=zone_code,
+            defaults={'name': f'{zone_code}区', 'sort_order': zone_order}
+        )
+        ParkingSpot.objects.bulk_create([
+            ParkingSpot(zone=zone, spot_number=f'{zone_code}{num}', sort_order=num)
+            for num in range(1, size + 1)
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParkingLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=20, unique=True, verbose_name='停车场编号')),
+                ('name', models.CharField(max_length=50, verbose_name='停车场名称')),
+                ('sort_order', models.PositiveIntegerField(default=0, verbose_name='排序')),
+                ('is_active', models.BooleanField(default=True, verbose_name='是否启用')),
+            ],
+            options={
+                'verbose_name': '停车场',
+                'verbose_name_plural': '停车场',
+                'ordering': ['sort_order', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ParkingZone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=10, verbose_name='分区编号')),
+                ('name', models.CharField(blank=True, max_length=50, verbose_name='分区名称')),
+                ('sort_order', models.PositiveIntegerField(default=0, verbose_name='排序')),
+                ('lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='zones', to='parking_app.parkinglot', verbose_name='所属停车场')),
+            ],
+            options={
+                'verbose_name': '停车分区',
+                'verbose_name_plural': '停车分区',
+                'ordering': ['lot', 'sort_order', 'id'],
+                'unique_together': {('lot', 'code')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ParkingSpot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spot_number', models.CharField(max_length=10, unique=True, verbose_name='车位号')),
+                ('sort_order', models.PositiveIntegerField(default=0, verbose_name='排序')),
+                ('supports_ev', models.BooleanField(default=False, verbose_name='新能源充电车位')),
+                ('supports_truck', models.BooleanField(default=False, verbose_name='货车车位')),
+                ('is_active', models.BooleanField(default=True, verbose_name='是否启用')),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spots', to='parking_app.parkingzone', verbose_name='所属分区')),
+            ],
+            options={
+                'verbose_name': '车位',
+                'verbose_name_plural': '车位',
+                'ordering': ['zone', 'sort_order', 'id'],
+            },
+        ),
+        migrations.RunPython(create_default_layout, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0002_parking_layout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkingspot',
+            name='gate_distance',
+            field=models.PositiveIntegerField(default=0, verbose_name='距入口距离(米)'),
+        ),
+    ]
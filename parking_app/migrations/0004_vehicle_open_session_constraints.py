@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0003_parkingspot_gate_distance'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='vehicle',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('exit_time__isnull', True)),
+                fields=('license_plate',),
+                name='open_session_license_plate'
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='vehicle',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('exit_time__isnull', True)),
+                fields=('spot_number',),
+                name='open_session_spot_number'
+            ),
+        ),
+    ]
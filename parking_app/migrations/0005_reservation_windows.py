@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0004_vehicle_open_session_constraints'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='vehicle',
+            name='open_session_spot_number',
+        ),
+        migrations.AddConstraint(
+            model_name='vehicle',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('exit_time__isnull', True), ('reserved', False)),
+                fields=('spot_number',),
+                name='open_session_spot_number'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(
+                condition=models.Q(('exit_time__isnull', True), ('reserved', True)),
+                fields=['reservation_expiry_time'],
+                name='pending_reservation_expiry'
+            ),
+        ),
+    ]
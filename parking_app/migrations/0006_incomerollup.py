@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0005_reservation_windows'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IncomeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lot_code', models.CharField(max_length=20, verbose_name='停车场编号')),
+                ('granularity', models.CharField(choices=[('hour', '小时'), ('day', '天')], max_length=10, verbose_name='汇总粒度')),
+                ('bucket_start', models.DateTimeField(verbose_name='时间段开始')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='收入')),
+                ('session_count', models.PositiveIntegerField(default=0, verbose_name='停车次数')),
+            ],
+            options={
+                'verbose_name': '收入汇总',
+                'verbose_name_plural': '收入汇总',
+                'indexes': [models.Index(fields=['granularity', 'bucket_start'], name='income_rollup_bucket')],
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'lot_code', 'bucket_start'), name='unique_income_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0008_vehicle_analysis_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionHistogram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='日期')),
+                ('vehicle_type', models.CharField(max_length=20, verbose_name='车辆类型')),
+                ('metric', models.CharField(choices=[('duration', '停车时长'), ('fee', '费用')], max_length=10, verbose_name='统计指标')),
+                ('bucket', models.PositiveSmallIntegerField(verbose_name='分桶')),
+                ('count', models.IntegerField(default=0, verbose_name='次数')),
+            ],
+            options={
+                'verbose_name': '时长/费用分布',
+                'verbose_name_plural': '时长/费用分布',
+                'constraints': [models.UniqueConstraint(fields=('day', 'vehicle_type', 'metric', 'bucket'), name='unique_session_histogram')],
+            },
+        ),
+    ]
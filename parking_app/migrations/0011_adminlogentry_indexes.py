@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0010_adminlogentry_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='adminlogentry',
+            index=models.Index(fields=['-timestamp', '-id'], name='adminlog_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='adminlogentry',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='adminlog_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='adminlogentry',
+            index=models.Index(fields=['action', '-timestamp', '-id'], name='adminlog_action_time_idx'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_app', '0011_adminlogentry_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='incomerollup',
+            name='session_count',
+            field=models.IntegerField(default=0, verbose_name='停车次数'),
+        ),
+    ]
@@ -1,15 +1,20 @@
 from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, connection, transaction, IntegrityError
 from django.utils import timezone
 import logging
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 import uuid
-from datetime import timedelta
 from django.utils import timezone
+from .versioning import VersionedCache
+from .promotion_index import get_promotion_index, invalidate_promotion_index
+from .membership_status import get_membership_resolver
+from .occupancy import refresh_spots_on_commit
+from .reservation_index import notify_reservations_changed
+from .layout import invalidate_spot_template
 # 获取当前模块的日志记录器
 logger = logging.getLogger(__name__)
 
@@ -19,6 +24,20 @@ def generate_order_number():
     return f"PARK-{uuid.uuid4().hex[:8].upper()}"
 
 
+# 未结束记录(在场车辆或预订)冲突时的提示信息
+PLATE_CONFLICT_MESSAGE = "该车辆已在停车场内"
+SPOT_CONFLICT_MESSAGE = "该车位已被占用或预订"
+RESERVATION_CONFLICT_MESSAGE = "该时间段车位已被预订"
+
+
+class OpenSessionConflict(Exception):
+    """车牌或车位已有未结束的停车/预订记录"""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
 class ParkingConfig(models.Model):
     """停车系统配置模型"""
     CONFIG_CHOICES = [
@@ -55,14 +74,38 @@ class ParkingConfig(models.Model):
     def __str__(self):
         return f"{self.get_config_type_display()}: {self.value}"
 
+    def save(self, *args, **kwargs):
+        """保存配置后通知所有进程刷新配置缓存"""
+        super().save(*args, **kwargs)
+        self.invalidate_cache()
+
+    def delete(self, *args, **kwargs):
+        """删除配置后通知所有进程刷新配置缓存"""
+        result = super().delete(*args, **kwargs)
+        self.invalidate_cache()
+        return result
+
+    @classmethod
+    def invalidate_cache(cls):
+        """更新共享版本戳，使所有 worker 的配置缓存失效"""
+        _config_cache.invalidate()
+
     @classmethod
     def get_config(cls, config_type, default=0):
-        """获取配置值"""
-        try:
-            config = cls.objects.get(config_type=config_type)
-            return config.value
-        except cls.DoesNotExist:
-            return Decimal(default)
+        """获取配置值(优先读取进程内缓存)"""
+        values = _config_cache.get()
+        if config_type in values:
+            return values[config_type]
+        return Decimal(default)
+
+
+def _load_parking_configs():
+    """一次性加载全部配置行，返回 {config_type: value} 字典"""
+    return dict(ParkingConfig.objects.values_list('config_type', 'value'))
+
+
+# 进程内配置缓存，通过共享版本戳在所有 worker 之间失效
+_config_cache = VersionedCache('parking_config', _load_parking_configs)
 
 
 class Feedback(models.Model):
@@ -90,7 +133,7 @@ class Feedback(models.Model):
 
 
 class AdminActionLogger:
-    """管理员操作日志记录器，用于记录管理员的各种操作"""
+    """管理员操作日志记录器，用于记录管理员的各种操作(由 admin_logger 异步批量写入)"""
 
     @staticmethod
     def log(request, action, obj=None, message=""):
@@ -118,14 +161,16 @@ class AdminActionLogger:
                 model_name = content_type.model if content_type else '未知模型'
                 message = f"{AdminLogEntry.ACTION_DISPLAY.get(action, action)} {model_name}: {str(obj)}"
 
-            # 创建管理员日志条目
-            AdminLogEntry.objects.create(
-                user=request.user,
+            # 创建管理员日志条目，放入写入队列(时间戳在此时确定)
+            from .admin_logger import admin_log_writer
+            admin_log_writer.enqueue(AdminLogEntry(
+                user_id=request.user.pk if request.user.is_authenticated else None,
                 action=action,
                 content_type=content_type,
                 object_id=object_id,
-                message=message
-            )
+                message=message,
+                timestamp=timezone.now()
+            ))
         except Exception as e:
             # 记录错误日志
             logger.error(f"记录管理员操作时出错: {str(e)}", exc_info=True)
@@ -150,6 +195,17 @@ class Promotion(models.Model):
     is_active = models.BooleanField(default=True, verbose_name='是否生效')  # 是否激活
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')  # 创建时间
 
+    def save(self, *args, **kwargs):
+        """保存促销活动后通知所有进程重建促销索引"""
+        super().save(*args, **kwargs)
+        invalidate_promotion_index()
+
+    def delete(self, *args, **kwargs):
+        """删除促销活动后通知所有进程重建促销索引"""
+        result = super().delete(*args, **kwargs)
+        invalidate_promotion_index()
+        return result
+
     def is_valid(self):
         """检查促销活动当前是否有效"""
         now = timezone.now()
@@ -172,6 +228,83 @@ class Promotion(models.Model):
         return f"{self.name} ({self.start_time.date()} 至 {self.end_time.date()})"
 
 
+class LayoutChangeMixin:
+    """车位布局模型的公共行为：保存或删除后通知所有进程重建车位模板"""
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_spot_template()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_spot_template()
+        return result
+
+
+class ParkingLot(LayoutChangeMixin, models.Model):
+    """停车场模型"""
+
+    # 模型字段定义
+    code = models.CharField(max_length=20, unique=True, verbose_name='停车场编号')  # 停车场编号
+    name = models.CharField(max_length=50, verbose_name='停车场名称')  # 停车场名称
+    sort_order = models.PositiveIntegerField(default=0, verbose_name='排序')  # 显示顺序
+    is_active = models.BooleanField(default=True, verbose_name='是否启用')  # 是否启用
+
+    class Meta:
+        # 元数据配置
+        verbose_name = '停车场'  # 单数名称
+        verbose_name_plural = '停车场'  # 复数名称
+        ordering = ['sort_order', 'id']
+
+    def __str__(self):
+        """对象字符串表示"""
+        return self.name
+
+
+class ParkingZone(LayoutChangeMixin, models.Model):
+    """停车分区模型(如 A 区、B 区)"""
+
+    # 模型字段定义
+    lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='zones', verbose_name='所属停车场')
+    code = models.CharField(max_length=10, verbose_name='分区编号')  # 分区编号，同时作为车位号前缀
+    name = models.CharField(max_length=50, blank=True, verbose_name='分区名称')  # 分区名称
+    sort_order = models.PositiveIntegerField(default=0, verbose_name='排序')  # 显示顺序
+
+    class Meta:
+        # 元数据配置
+        verbose_name = '停车分区'  # 单数名称
+        verbose_name_plural = '停车分区'  # 复数名称
+        ordering = ['lot', 'sort_order', 'id']
+        unique_together = [('lot', 'code')]
+
+    def __str__(self):
+        """对象字符串表示"""
+        return f"{self.lot.name} - {self.name or self.code}"
+
+
+class ParkingSpot(LayoutChangeMixin, models.Model):
+    """车位模型"""
+
+    # 模型字段定义
+    zone = models.ForeignKey(ParkingZone, on_delete=models.CASCADE, related_name='spots', verbose_name='所属分区')
+    spot_number = models.CharField(max_length=10, unique=True, verbose_name='车位号')  # 与 Vehicle.spot_number 对应
+    sort_order = models.PositiveIntegerField(default=0, verbose_name='排序')  # 分区内显示顺序
+    supports_ev = models.BooleanField(default=False, verbose_name='新能源充电车位')  # 是否带充电桩
+    supports_truck = models.BooleanField(default=False, verbose_name='货车车位')  # 是否可停货车
+    gate_distance = models.PositiveIntegerField(default=0, verbose_name='距入口距离(米)')  # 用于推荐车位
+    is_active = models.BooleanField(default=True, verbose_name='是否启用')  # 是否启用
+
+    class Meta:
+        # 元数据配置
+        verbose_name = '车位'  # 单数名称
+        verbose_name_plural = '车位'  # 复数名称
+        ordering = ['zone', 'sort_order', 'id']
+
+    def __str__(self):
+        """对象字符串表示"""
+        return self.spot_number
+
+
 class Vehicle(models.Model):
     """车辆模型，用于管理停车场中的车辆信息"""
 
@@ -248,6 +381,14 @@ class Vehicle(models.Model):
         """获取车辆类型的显示名称"""
         return dict(self.VEHICLE_TYPE_CHOICES).get(self.vehicle_type, '未知类型')
 
+    def user_is_member(self):
+        """车辆所属用户当前是否为有效会员(优先使用预取结果，不加载用户对象)"""
+        status = getattr(self, '_member_status', None)
+        if status is None:
+            status = get_membership_resolver().is_member(self.user_id)
+            self._member_status = status
+        return status
+
     @property
     def vehicle_type_chinese(self):
         """返回中文车辆类型(属性方式访问)"""
@@ -300,7 +441,7 @@ class Vehicle(models.Model):
             Decimal类型的费用金额
         """
         # 如果是会员且会员有效，费用为0
-        if hasattr(self.user, 'membership') and self.user.membership.is_active():
+        if self.user_is_member():
             return Decimal('0.00')
 
         if not self.entry_time:
@@ -322,7 +463,7 @@ class Vehicle(models.Model):
     def calculate_fee(self):
         """计算实际停车费用(考虑会员和促销活动)"""
         # 如果是会员且会员有效，费用为0
-        if hasattr(self.user, 'membership') and self.user.membership.is_active():
+        if self.user_is_member():
             self.payment_amount = Decimal('0.00')
             return self.payment_amount
 
@@ -342,19 +483,14 @@ class Vehicle(models.Model):
         now = timezone.now()
         exit_time = self.exit_time if self.exit_time else now
 
-        # 查询有效促销活动(当前时间在活动时间范围内)
-        valid_promotions = Promotion.objects.filter(
-            is_active=True,
-            start_time__lte=exit_time,
-            end_time__gte=self.entry_time
-        )
+        # 查询有效促销活动(与停车时间段重叠的活动，读取进程内索引)
+        promotion = get_promotion_index().lookup(self.entry_time, exit_time)
 
         # 如果没有促销活动，直接返回原价
-        if not valid_promotions.exists():
+        if promotion is None:
             return fee.quantize(Decimal('0.00'), rounding=ROUND_HALF_UP)
 
         # 应用促销折扣
-        promotion = valid_promotions.first()
         try:
             if promotion.discount_type == 'percent':
                 # 百分比折扣
@@ -373,26 +509,171 @@ class Vehicle(models.Model):
         self.payment_amount = fee.quantize(Decimal('0.00'), rounding=ROUND_HALF_UP)
         return self.payment_amount
 
+    @classmethod
+    def create_open_session(cls, **fields):
+        """
+        以单条 INSERT 创建未出场记录(入场或预订)
+
+        同一车牌只能有一条未出场记录、同一车位只能有一辆在场车辆，由数据库的部分唯一约束保证，
+        冲突时抛出 OpenSessionConflict(同一车位的多个预订按时间窗口由 reservation_index 判断)。
+        数据库不支持部分索引(MySQL)时约束不会创建，退回到插入前查询检查。
+        """
+        if not connection.features.supports_partial_indexes:
+            open_rows = cls.objects.filter(exit_time__isnull=True)
+            if open_rows.filter(license_plate=fields.get('license_plate')).exists():
+                raise OpenSessionConflict(PLATE_CONFLICT_MESSAGE)
+            if not fields.get('reserved') and \
+                    open_rows.filter(spot_number=fields.get('spot_number'), reserved=False).exists():
+                raise OpenSessionConflict(SPOT_CONFLICT_MESSAGE)
+        try:
+            with transaction.atomic():
+                return cls.objects.create(**fields)
+        except IntegrityError as e:
+            # SQLite 报告列名，其他数据库报告约束名，两者都包含字段名
+            error = str(e)
+            if 'license_plate' in error:
+                raise OpenSessionConflict(PLATE_CONFLICT_MESSAGE) from e
+            if 'spot_number' in error:
+                raise OpenSessionConflict(SPOT_CONFLICT_MESSAGE) from e
+            raise
+
     @staticmethod
-    def clean_expired_reservations():
-        """清理过期的车辆预订"""
-        expiry_minutes = Vehicle.get_reservation_expiry_minutes()
-        expiry_time = timezone.now() - timedelta(minutes=expiry_minutes)
-        Vehicle.objects.filter(
+    def clean_expired_reservations(now=None, ids=None):
+        """
+        批量删除已到过期时间的车辆预订，并释放车位
+
+        参数:
+            now: (可选)当前时间
+            ids: (可选)只检查这些预订(由过期调度器传入)，已使用或取消的会被跳过
+
+        返回:
+            删除的预订数量
+        """
+        now = now or timezone.now()
+        expired = Vehicle.objects.filter(
             reserved=True,
-            reservation_expiry_time__lt=expiry_time
-        ).delete()
+            exit_time__isnull=True,
+            reservation_expiry_time__lte=now
+        )
+        if ids is not None:
+            expired = expired.filter(id__in=ids)
+        with transaction.atomic():
+            spot_numbers = list(expired.select_for_update().values_list('spot_number', flat=True))
+            if spot_numbers:
+                expired.delete()
+                # 同一车位可能还有后续预订，按数据库重新计算车位状态
+                refresh_spots_on_commit(set(spot_numbers))
+                notify_reservations_changed()
+        return len(spot_numbers)
 
     class Meta:
         # 元数据配置
         verbose_name = '车辆'  # 单数名称
         verbose_name_plural = '车辆'  # 复数名称
+        constraints = [
+            # 同一车牌最多只有一条未出场记录(在场或预订中)
+            models.UniqueConstraint(
+                fields=['license_plate'],
+                condition=models.Q(exit_time__isnull=True),
+                name='open_session_license_plate'
+            ),
+            # 同一车位最多只有一辆在场车辆(预订按时间窗口判断，可以有多个)
+            models.UniqueConstraint(
+                fields=['spot_number'],
+                condition=models.Q(exit_time__isnull=True, reserved=False),
+                name='open_session_spot_number'
+            ),
+        ]
+        indexes = [
+            # 未结束的预订(预订索引与过期调度器加载)
+            models.Index(
+                fields=['reservation_expiry_time'],
+                condition=models.Q(reserved=True, exit_time__isnull=True),
+                name='pending_reservation_expiry'
+            ),
+            # 停车记录按 (入场时间, id) 倒序游标分页(全部记录 / 单个用户)
+            models.Index(fields=['-entry_time', '-id'], name='vehicle_entry_keyset'),
+            models.Index(fields=['user', '-entry_time', '-id'], name='vehicle_user_entry_keyset'),
+            # 车辆数据分析表格的筛选与排序(车牌前缀、车位、出场时间/状态)
+            models.Index(fields=['license_plate', 'id'], name='vehicle_plate_idx'),
+            models.Index(fields=['spot_number', '-entry_time'], name='vehicle_spot_entry_idx'),
+            models.Index(fields=['-exit_time', '-id'], name='vehicle_exit_keyset'),
+        ]
 
     def __str__(self):
         """对象字符串表示"""
         return self.license_plate
 
 
+class IncomeRollup(models.Model):
+    """
+    收入汇总(按停车场、按小时/按天)
+
+    支付时在同一事务中累加，收入统计接口只读取汇总行；
+    历史数据可通过 rebuild_income_rollups 命令重建。
+    """
+
+    GRANULARITY_CHOICES = [
+        ('hour', '小时'),  # bucket_start 为整点
+        ('day', '天'),  # bucket_start 为本地时区的零点
+    ]
+
+    # 模型字段定义
+    lot_code = models.CharField(max_length=20, verbose_name='停车场编号')  # 与 ParkingLot.code 对应
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES, verbose_name='汇总粒度')
+    bucket_start = models.DateTimeField(verbose_name='时间段开始')  # 时间段起点
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='收入')  # 已支付记录的费用合计
+    session_count = models.IntegerField(default=0, verbose_name='停车次数')  # 已支付记录数(重复支付先扣减，可能暂时为负)
+
+    class Meta:
+        # 元数据配置
+        verbose_name = '收入汇总'  # 单数名称
+        verbose_name_plural = '收入汇总'  # 复数名称
+        constraints = [
+            models.UniqueConstraint(fields=['granularity', 'lot_code', 'bucket_start'], name='unique_income_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'bucket_start'], name='income_rollup_bucket'),
+        ]
+
+    def __str__(self):
+        """对象字符串表示"""
+        return f"{self.lot_code} {self.get_granularity_display()} {self.bucket_start}"
+
+
+class SessionHistogram(models.Model):
+    """
+    停车时长/费用分布直方图(按本地日期、车辆类型)
+
+    每行是一个对数分桶的计数，分桶方式见 session_histogram；
+    支付时在同一事务中累加，多天的分布直接按分桶相加。
+    """
+
+    METRIC_CHOICES = [
+        ('duration', '停车时长'),  # 单位：分钟
+        ('fee', '费用'),  # 单位：元
+    ]
+
+    # 模型字段定义
+    day = models.DateField(verbose_name='日期')  # 出场时间的本地日期
+    vehicle_type = models.CharField(max_length=20, verbose_name='车辆类型')  # 与 Vehicle.vehicle_type 对应
+    metric = models.CharField(max_length=10, choices=METRIC_CHOICES, verbose_name='统计指标')
+    bucket = models.PositiveSmallIntegerField(verbose_name='分桶')  # 对数分桶序号
+    count = models.IntegerField(default=0, verbose_name='次数')  # 落在该分桶的已支付记录数
+
+    class Meta:
+        # 元数据配置
+        verbose_name = '时长/费用分布'  # 单数名称
+        verbose_name_plural = '时长/费用分布'  # 复数名称
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'vehicle_type', 'metric', 'bucket'], name='unique_session_histogram'),
+        ]
+
+    def __str__(self):
+        """对象字符串表示"""
+        return f"{self.day} {self.vehicle_type} {self.get_metric_display()} #{self.bucket}"
+
+
 def calculate_original_fee(parking_duration_hours, hourly_rate=Decimal('5')):
     """
     独立函数：计算原始停车费用
@@ -531,13 +812,19 @@ class AdminLogEntry(models.Model):
     content_type = models.ForeignKey(ContentType, on_delete=models.SET_NULL, null=True)  # 内容类型(关联模型)
     object_id = models.PositiveIntegerField(null=True, blank=True)  # 对象ID
     message = models.TextField()  # 日志消息
-    timestamp = models.DateTimeField(auto_now_add=True)  # 时间戳
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)  # 时间戳(记录时确定，不是写入数据库的时间)
 
     class Meta:
         # 元数据配置
         verbose_name = "管理员日志"  # 单数名称
         verbose_name_plural = "管理员日志"  # 复数名称
         ordering = ['-timestamp']  # 默认按时间戳降序排列
+        indexes = [
+            # 日志接口按 (timestamp, id) 倒序游标分页，按操作人/操作类型筛选时使用对应的组合索引
+            models.Index(fields=['-timestamp', '-id'], name='adminlog_time_idx'),
+            models.Index(fields=['user', '-timestamp', '-id'], name='adminlog_user_time_idx'),
+            models.Index(fields=['action', '-timestamp', '-id'], name='adminlog_action_time_idx'),
+        ]
 
     def __str__(self):
         """对象字符串表示"""
@@ -0,0 +1,356 @@
+# occupancy.py
+"""
+车位占用状态共享位图
+
+所有 uWSGI worker 通过 mmap 映射同一个文件，文件中保存：
+- 文件头：标识、版本号、车位数量、是否已从数据库初始化、布局指纹
+- 状态位图：每个车位 2 位(空闲/占用/预订)
+- 预订过期时间：每个车位一个 int64(Unix 秒)，过期的预订按空闲显示
+- 变更环形日志：最近 CHANGE_LOG_SIZE 次修改的 (版本号, 车位下标)，用于增量推送
+
+入场、支付、预订、使用预订、取消预订在数据库事务提交后更新位图，
+车位地图接口直接读取位图，不再访问数据库。
+进程启动后首次访问、或执行 reconcile_occupancy 命令时从数据库重建。
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+try:
+    import fcntl  # 仅 Linux/Unix 可用，用于跨进程加锁
+except ImportError:  # Windows 开发环境退化为进程内锁
+    fcntl = None
+
+from .layout import get_spot_template, refresh_spot_template
+
+# 车位状态(与 layout.STATUS_NAMES 的下标一致)
+FREE, OCCUPIED, RESERVED = 0, 1, 2
+
+MAGIC = b'PKOCC003'
+HEADER = struct.Struct('<8sQQQQ')  # 标识、版本号、车位数量、是否已初始化、布局指纹
+MAX_SPOTS = 4096  # 文件按最大容量一次性分配，避免扩容时其他进程的映射失效
+BITMAP_OFFSET = HEADER.size
+BITMAP_SIZE = MAX_SPOTS // 4
+EXPIRY_OFFSET = BITMAP_OFFSET + BITMAP_SIZE
+EXPIRY = struct.Struct('<q')
+CHANGE_LOG_OFFSET = EXPIRY_OFFSET + EXPIRY.size * MAX_SPOTS
+CHANGE = struct.Struct('<QI')  # 版本号、车位下标
+CHANGE_LOG_SIZE = 1024
+FULL_RESET = 0xFFFFFFFF  # 日志中表示"全部车位已重建"的车位下标
+NO_SPOT = 0xFFFFFFFE  # 日志中表示"车位未变化、仅版本号递增"(如促销活动变更)
+FILE_SIZE = CHANGE_LOG_OFFSET + CHANGE.size * CHANGE_LOG_SIZE
+
+
+class OccupancyMap:
+    """映射到共享文件的车位状态位图"""
+
+    def __init__(self, path, template):
+        self.path = Path(path)
+        self.template = template
+        self.spot_ids = template.spot_ids
+        self.positions = template.positions
+        self.layout_hash = template.layout_hash
+        self._thread_lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o664)
+        with self._locked():
+            if os.fstat(self._fd).st_size < FILE_SIZE:
+                os.ftruncate(self._fd, FILE_SIZE)
+            self._mm = mmap.mmap(self._fd, FILE_SIZE)
+            magic, version, _, _, layout_hash = HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or layout_hash != self.layout_hash:
+                # 新文件或车位布局已变化：清空并标记为未初始化(版本号继续递增)
+                version = version + 1 if magic == MAGIC else 0
+                self._mm[:FILE_SIZE] = bytes(FILE_SIZE)
+                HEADER.pack_into(self._mm, 0, MAGIC, version, len(self.spot_ids), 0, self.layout_hash)
+
+    def __del__(self):
+        # 旧映射可能仍被其他线程引用，只在没有引用时关闭文件描述符
+        fd = getattr(self, '_fd', None)
+        if fd is not None:
+            os.close(fd)
+
+    @contextmanager
+    def _locked(self, exclusive=True):
+        """跨进程文件锁(写入用排他锁，读取用共享锁)"""
+        with self._thread_lock:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    # ---------- 底层读写(调用方需持有锁) ----------
+
+    def _get(self, position):
+        byte = self._mm[BITMAP_OFFSET + position // 4]
+        return (byte >> ((position % 4) * 2)) & 0b11
+
+    def _set(self, position, status, expiry=0):
+        offset = BITMAP_OFFSET + position // 4
+        shift = (position % 4) * 2
+        self._mm[offset] = (self._mm[offset] & ~(0b11 << shift) & 0xFF) | (status << shift)
+        EXPIRY.pack_into(self._mm, EXPIRY_OFFSET + position * EXPIRY.size, int(expiry))
+
+    def _expiry(self, position):
+        return EXPIRY.unpack_from(self._mm, EXPIRY_OFFSET + position * EXPIRY.size)[0]
+
+    def _bump_version(self, position, initialized=None):
+        """递增版本号，并把本次修改的车位下标写入变更日志"""
+        magic, version, spot_count, was_initialized, layout_hash = HEADER.unpack_from(self._mm, 0)
+        if initialized is None:
+            initialized = was_initialized
+        version += 1
+        CHANGE.pack_into(self._mm, CHANGE_LOG_OFFSET + (version % CHANGE_LOG_SIZE) * CHANGE.size, version, position)
+        HEADER.pack_into(self._mm, 0, magic, version, spot_count, initialized, layout_hash)
+        return version
+
+    # ---------- 对外接口 ----------
+
+    @property
+    def initialized(self):
+        return bool(HEADER.unpack_from(self._mm, 0)[3])
+
+    @property
+    def stale(self):
+        """共享文件已被其他进程按新布局重建"""
+        return HEADER.unpack_from(self._mm, 0)[4] != self.layout_hash
+
+    @property
+    def version(self):
+        """位图版本号，每次修改都会递增"""
+        return HEADER.unpack_from(self._mm, 0)[1]
+
+    def set_status(self, spot_id, status, expiry_time=None):
+        """更新单个车位状态，未知车位号忽略"""
+        position = self.positions.get(spot_id)
+        if position is None:
+            return None
+        expiry = expiry_time.timestamp() if expiry_time is not None else 0
+        with self._locked():
+            self._set(position, status, expiry)
+            return self._bump_version(position)
+
+    def claim(self, position):
+        """
+        原子地占用一个空闲车位(跨进程的比较并交换)
+
+        返回:
+            成功返回新的版本号；车位已不是空闲状态返回 None
+        """
+        with self._locked():
+            if self._get(position) != FREE:
+                return None
+            self._set(position, OCCUPIED)
+            return self._bump_version(position)
+
+    def raw_status(self, position):
+        """返回位图中记录的状态码(不考虑预订是否过期)"""
+        with self._locked(exclusive=False):
+            return self._get(position)
+
+    def raw_status_of(self, spot_id):
+        """按车位号返回位图中记录的状态码，未知车位返回 None"""
+        position = self.positions.get(spot_id)
+        return self.raw_status(position) if position is not None else None
+
+    def raw_statuses(self):
+        """返回位图中记录的全部状态码(不考虑预订是否过期)"""
+        with self._locked(exclusive=False):
+            return [self._get(i) for i in range(len(self.spot_ids))]
+
+    def touch(self):
+        """只递增版本号(车位状态以外的展示数据变化时调用)"""
+        with self._locked():
+            return self._bump_version(NO_SPOT)
+
+    def changes_since(self, since_version):
+        """
+        返回 since_version 之后状态发生过变化的车位下标集合
+
+        版本号超出变更日志范围、或期间发生过整体重建时返回 None，
+        调用方应改为发送全量数据。
+        """
+        with self._locked(exclusive=False):
+            version = self.version
+            if since_version > version or version - since_version > CHANGE_LOG_SIZE:
+                return None
+            positions = set()
+            for expected in range(since_version + 1, version + 1):
+                logged_version, position = CHANGE.unpack_from(
+                    self._mm, CHANGE_LOG_OFFSET + (expected % CHANGE_LOG_SIZE) * CHANGE.size)
+                if logged_version != expected or position == FULL_RESET:
+                    return None
+                if position != NO_SPOT:
+                    positions.add(position)
+        return positions
+
+    def delta_since(self, since_version):
+        """
+        客户端持有 since_version 时的数据后，可能已变化的车位下标集合
+
+        预订过期不会递增版本号，因此所有标记为预订的车位也一并返回；
+        无法增量计算时返回 None。
+        """
+        positions = self.changes_since(since_version)
+        if positions is None:
+            return None
+        return positions | self.reserved_positions()
+
+    def reserved_positions(self):
+        """返回位图中标记为预订的车位下标(其中可能包含已过期但尚未清理的预订)"""
+        with self._locked(exclusive=False):
+            return {i for i in range(len(self.spot_ids)) if self._get(i) == RESERVED}
+
+    def statuses(self, now=None):
+        """返回按模板顺序排列的车位状态码列表，过期的预订按空闲处理"""
+        now = now if now is not None else time.time()
+        with self._locked(exclusive=False):
+            statuses = [self._get(i) for i in range(len(self.spot_ids))]
+            for i, status in enumerate(statuses):
+                if status == RESERVED and self._expiry(i) <= now:
+                    statuses[i] = FREE  # 预订已过期，按空闲显示
+        return statuses
+
+    def snapshot(self, now=None):
+        """
+        返回所有车位的当前状态列表
+
+        返回:
+            [{"id": 车位号, "status": available/occupied/reserved, ...}, ...]
+        """
+        return self.template.render(self.statuses(now))
+
+    def snapshot_json(self, now=None):
+        """返回所有车位当前状态的 JSON 数组字符串"""
+        return self.template.render_json(self.statuses(now))
+
+
+    @staticmethod
+    def _load_db_state(spot_ids=None):
+        """
+        从数据库读取车位状态
+
+        返回:
+            (有车停放的车位号集合, {有未过期预订的车位号: 最晚过期时间})
+        """
+        from django.db.models import Max
+        from django.utils import timezone
+        from .models import Vehicle
+
+        sessions = Vehicle.objects.filter(exit_time__isnull=True, reserved=False)
+        reservations = Vehicle.objects.filter(
+            reserved=True,
+            exit_time__isnull=True,
+            reservation_expiry_time__gt=timezone.now()
+        )
+        if spot_ids is not None:
+            sessions = sessions.filter(spot_number__in=spot_ids)
+            reservations = reservations.filter(spot_number__in=spot_ids)
+        occupied = set(sessions.values_list('spot_number', flat=True))
+        reserved = dict(reservations.values('spot_number').annotate(
+            latest_expiry=Max('reservation_expiry_time')
+        ).values_list('spot_number', 'latest_expiry'))
+        return occupied, reserved
+
+    def reconcile_spots(self, spot_ids):
+        """从数据库重新读取指定车位的状态(预订取消/过期、离场后调用)"""
+        spot_ids = [spot_id for spot_id in spot_ids if spot_id in self.positions]
+        if not spot_ids:
+            return
+        occupied, reserved = self._load_db_state(spot_ids)
+        for spot_id in spot_ids:
+            if spot_id in occupied:
+                self.set_status(spot_id, OCCUPIED)
+            elif spot_id in reserved:
+                self.set_status(spot_id, RESERVED, reserved[spot_id])
+            else:
+                self.set_status(spot_id, FREE)
+
+    def reconcile(self):
+        """从数据库重建全部车位状态(启动时或状态漂移后调用)"""
+        occupied, reserved = self._load_db_state()
+
+        with self._locked():
+            for position, spot_id in enumerate(self.spot_ids):
+                if spot_id in occupied:
+                    self._set(position, OCCUPIED)
+                elif spot_id in reserved:
+                    self._set(position, RESERVED, reserved[spot_id].timestamp())
+                else:
+                    self._set(position, FREE)
+            self._bump_version(FULL_RESET, initialized=1)
+        return len(occupied), len(reserved)
+
+
+_occupancy_map = None
+_occupancy_lock = threading.Lock()
+
+
+def get_occupancy_map():
+    """
+    返回当前进程的共享位图
+
+    车位模板变化(本进程或其他进程修改了布局)时重新映射；
+    首次使用且尚未初始化时从数据库重建。
+    """
+    global _occupancy_map
+    occupancy_map = _occupancy_map
+    if occupancy_map is not None and occupancy_map.stale:
+        # 其他进程已按新布局重建文件，立即重新加载模板而不是等待版本检查间隔
+        refresh_spot_template()
+    template = get_spot_template()
+    if occupancy_map is None or occupancy_map.template is not template:
+        with _occupancy_lock:
+            occupancy_map = _occupancy_map
+            if occupancy_map is None or occupancy_map.template is not template:
+                path = getattr(settings, 'OCCUPANCY_MAP_PATH', Path(settings.BASE_DIR) / 'run' / 'occupancy.map')
+                occupancy_map = _occupancy_map = OccupancyMap(path, template)
+    if not occupancy_map.initialized:
+        occupancy_map.reconcile()
+    return occupancy_map
+
+
+def make_etag(version, statuses, extra=''):
+    """
+    根据位图版本号与车位状态生成 ETag
+
+    预订过期只改变展示状态、不递增版本号，因此状态码也参与计算；
+    extra 为其他参与展示的数据(如促销活动)。
+    """
+    digest = zlib.crc32(bytes(statuses) + extra.encode('utf-8'))
+    return f'"{version}-{digest:08x}"'
+
+
+def update_spot_on_commit(spot_id, status, expiry_time=None):
+    """在当前数据库事务提交后更新车位状态(没有事务时立即更新)"""
+    if not spot_id:
+        return
+    transaction.on_commit(lambda: get_occupancy_map().set_status(spot_id, status, expiry_time))
+
+
+def refresh_spots_on_commit(spot_ids):
+    """
+    在当前数据库事务提交后按数据库重新计算车位状态
+
+    同一车位可能还有其他预订，释放车位时不能直接标记为空闲。
+    """
+    spot_ids = [spot_id for spot_id in spot_ids if spot_id]
+    if spot_ids:
+        transaction.on_commit(lambda: get_occupancy_map().reconcile_spots(spot_ids))
+
+
+def touch_on_commit():
+    """在当前数据库事务提交后递增位图版本号(促销活动变更等)"""
+    transaction.on_commit(lambda: get_occupancy_map().touch())
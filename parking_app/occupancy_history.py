@@ -0,0 +1,198 @@
+# occupancy_history.py
+"""
+历史车位占用时间序列
+
+把停车记录看成 [入场时间, 出场时间) 区间(在场车辆的出场时间取当前时间)，
+在采样时间点 start + k*step 上统计各分区被占用的车位数：
+每个区间在"入场后的第一个采样点"+1、在"出场后的第一个采样点"-1，
+用 bincount 得到各分区的差分数组后按时间累加(扫描线)，全部计算由 NumPy 完成。
+
+区间来源：
+- 已归档的记录读取列式归档(session_archive)，不访问数据库
+- 归档时间点之后的记录、未支付的记录、在场车辆从数据库读取
+- 尚未过期的预订按 [预定使用时间, 过期时间) 计入(只影响今天及以后)；
+  过期预订会被删除，因此历史数据只包含停车记录
+
+已经结束的整天(且不包含预订)结果永久缓存，缓存键带有车位布局版本。
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .income_rollup import day_start
+from .layout import get_spot_template, LAYOUT_VERSION_NAME
+from .session_archive import SessionArchive
+from .tariff import to_microseconds
+from .versioning import get_version
+
+STEPS = (1, 5, 15, 60)  # 支持的采样间隔(分钟)
+MAX_DAYS = 31
+OTHER_ZONE = ('', '其他')  # 不在当前布局中的车位
+CACHE_KEY_PREFIX = 'parking_app:occupancy:'
+US_PER_MINUTE = 60 * 1000000
+
+
+def zone_index():
+    """
+    当前布局的分区列表与车位到分区下标的映射
+
+    返回:
+        ([(停车场编号, 分区编号), ...], {车位号: 分区下标}, [各分区车位数])
+    """
+    template = get_spot_template()
+    zones, spot_zone, capacity = [], {}, []
+    index = {}
+    for spot_id, lot, zone, *_ in template.spots:
+        key = (lot, zone)
+        if key not in index:
+            index[key] = len(zones)
+            zones.append(key)
+            capacity.append(0)
+        spot_zone[spot_id] = index[key]
+        capacity[index[key]] += 1
+    zones.append(OTHER_ZONE)
+    capacity.append(0)
+    return zones, spot_zone, capacity
+
+
+def _archived_intervals(archive, start, end, spot_zone, other):
+    """已归档记录中与 [start, end) 相交的区间"""
+    archived_until = archive.archived_until()
+    if archived_until is None or archived_until <= start:
+        return archived_until, []
+    data = archive.load(start, end, ['entry_us', 'exit_us', 'spot_code'], overlap=True)
+    codes = np.array([spot_zone.get(spot_id, other) for spot_id in archive.spot_ids()] + [other], dtype=np.int64)
+    # spot_code 为 -1 时取最后一个元素(其他分区)
+    return archived_until, [(data['entry_us'], data['exit_us'], codes[data['spot_code']])]
+
+
+def _database_intervals(start, end, now, archived_until, spot_zone, other, include_reservations):
+    """数据库中与 [start, end) 相交、且不在归档中的区间"""
+    from .models import Vehicle
+
+    sessions = Vehicle.objects.filter(reserved=False, entry_time__isnull=False, entry_time__lt=end) \
+        .filter(Q(exit_time__isnull=True) | Q(exit_time__gt=start))
+    if archived_until is not None:
+        # 已归档的是出场时间早于归档时间点的已支付记录
+        sessions = sessions.exclude(paid=True, exit_time__lt=archived_until)
+    rows = list(sessions.values_list('entry_time', 'exit_time', 'spot_number'))
+
+    if include_reservations:
+        today = day_start(now)
+        rows += [
+            (max(use_time, today), expiry, spot_number)
+            for use_time, expiry, spot_number in Vehicle.objects.filter(
+                reserved=True, exit_time__isnull=True, reservation_use_time__isnull=False,
+                reservation_use_time__lt=end, reservation_expiry_time__gt=max(start, today)
+            ).values_list('reservation_use_time', 'reservation_expiry_time', 'spot_number')
+        ]
+
+    now_us = to_microseconds(now)
+    return [(
+        np.array([to_microseconds(entry) for entry, _, _ in rows], dtype=np.int64),
+        np.array([to_microseconds(exit_time) if exit_time else now_us for _, exit_time, _ in rows], dtype=np.int64),
+        np.array([spot_zone.get(spot_number, other) for _, _, spot_number in rows], dtype=np.int64),
+    )]
+
+
+def sweep(entry_us, exit_us, zone_codes, start_us, samples, step_us, zone_count):
+    """
+    扫描线统计各采样点的占用数
+
+    参数:
+        entry_us / exit_us / zone_codes: 区间数组(微秒)与分区下标
+        start_us, samples, step_us: 采样点为 start_us + k * step_us，k = 0..samples-1
+
+    返回:
+        形状为 (zone_count, samples) 的占用数数组；采样点 t 上 entry <= t < exit 的区间计入
+    """
+    width = samples + 1
+    # 入场/出场后的第一个采样点下标(向上取整)，范围外的截断到 [0, samples]
+    first_in = np.clip(-((start_us - entry_us) // step_us), 0, samples)
+    first_out = np.clip(-((start_us - exit_us) // step_us), 0, samples)
+    diff = np.bincount(zone_codes * width + first_in, minlength=zone_count * width) \
+        - np.bincount(zone_codes * width + first_out, minlength=zone_count * width)
+    return np.cumsum(diff.reshape(zone_count, width), axis=1)[:, :samples]
+
+
+def _compute(start, end, step, now, zones, spot_zone, include_reservations):
+    """直接计算 [start, end) 的占用序列，返回 (zone_count, samples) 数组"""
+    other = len(zones) - 1
+    archive = SessionArchive()
+    archived_until, intervals = _archived_intervals(archive, start, end, spot_zone, other)
+    intervals += _database_intervals(start, end, now, archived_until, spot_zone, other, include_reservations)
+
+    entry_us = np.concatenate([part[0] for part in intervals])
+    exit_us = np.concatenate([part[1] for part in intervals])
+    zone_codes = np.concatenate([part[2] for part in intervals])
+    step_us = step * US_PER_MINUTE
+    samples = int((to_microseconds(end) - to_microseconds(start)) // step_us)
+    return sweep(entry_us, exit_us, zone_codes, to_microseconds(start), samples, step_us, len(zones))
+
+
+def _day_cache_key(day, step):
+    return f'{CACHE_KEY_PREFIX}{int(day.timestamp())}:{step}:{get_version(LAYOUT_VERSION_NAME) or 0}'
+
+
+def occupancy_series(start, end, step=5, now=None):
+    """
+    [start, end) 内按 step 分钟采样的各分区占用数
+
+    start/end 会对齐到本地日期的零点，最多 MAX_DAYS 天。
+
+    返回:
+        {'start': 开始时间, 'step': 采样间隔(分钟),
+         'zones': [{'lot', 'zone', 'capacity', 'occupied': [...]}, ...],
+         'total': [...]}
+        不在当前布局中的车位归入"其他"分区(没有记录时不返回)
+    """
+    if step not in STEPS:
+        raise ValueError(f"无效的采样间隔: {step}")
+    now = now or timezone.now()
+    start = day_start(start)
+    end = day_start(day_start(end - timedelta(microseconds=1)) + timedelta(hours=36)) if end > start else start
+    days = []
+    moment = start
+    while moment < end:
+        days.append(moment)
+        moment = day_start(moment + timedelta(hours=36))
+    if len(days) > MAX_DAYS:
+        raise ValueError(f"时间范围不能超过 {MAX_DAYS} 天")
+
+    zones, spot_zone, capacity = zone_index()
+    today = day_start(now)
+    pieces = {}
+    missing = []
+    for day in days:
+        cached = cache.get(_day_cache_key(day, step)) if day < today else None
+        if cached is not None and len(cached) == len(zones):
+            pieces[day] = np.array(cached, dtype=np.int64)
+        else:
+            missing.append(day)
+
+    if missing:
+        # 未缓存的日期一次计算，再按天拆分；已结束的整天写入缓存
+        first, last = missing[0], day_start(missing[-1] + timedelta(hours=36))
+        series = _compute(first, last, step, now, zones, spot_zone, include_reservations=last > today)
+        offset = 0
+        moment = first
+        while moment < last:
+            next_day = day_start(moment + timedelta(hours=36))
+            samples = int((next_day - moment).total_seconds() // (step * 60))
+            if moment in missing:
+                pieces[moment] = series[:, offset:offset + samples]
+                if next_day <= today:
+                    cache.set(_day_cache_key(moment, step), pieces[moment].tolist(), None)
+            offset += samples
+            moment = next_day
+
+    occupied = np.concatenate([pieces[day] for day in days], axis=1) if days else np.zeros((len(zones), 0))
+    result = [
+        {'lot': lot, 'zone': zone, 'capacity': capacity[index], 'occupied': occupied[index].tolist()}
+        for index, (lot, zone) in enumerate(zones)
+        if index < len(zones) - 1 or occupied[index].any()
+    ]
+    return {'start': start, 'step': step, 'zones': result, 'total': occupied.sum(axis=0).tolist()}
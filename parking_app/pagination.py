@@ -0,0 +1,162 @@
+# pagination.py
+"""
+停车记录的游标分页(keyset pagination)
+
+默认按 (entry_time, id) 倒序排列，也可以指定其他排序字段(如 '-exit_time'、'license_plate')。
+游标保存上一页边界记录的 (排序字段值, id)，下一页的条件写成
+WHERE 字段 <= 值 AND (字段 < 值 OR id < 边界id) ... LIMIT n，
+数据库可以直接在 (字段, id) 索引上定位到边界(SEARCH)，而不是从头遍历索引，
+因此翻到很深的页面与第 1 页的代价相同，也不再每次请求都 COUNT 全表。
+
+无论升序还是倒序，排序字段为空的记录都排在最后。
+可以为空的字段把一页拆成"非空部分"和"空值部分"两次查询(空值部分按 id 排序)，
+避免在条件中加入 OR 字段 IS NULL 导致无法使用索引定位；不能为空的字段只有一次查询。
+
+游标对客户端是不透明的字符串(base64 编码)，只能原样传回；
+游标中带有排序方式，换了排序后不能继续使用旧游标。
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+NEXT, PREV = 'n', 'p'
+DEFAULT_ORDERING = '-entry_time'
+
+
+def encode_cursor(direction, ordering, value, pk):
+    # 时间类型的字段值单独标记，解析时还原为 datetime
+    value = {'t': value.isoformat()} if isinstance(value, datetime) else value
+    payload = [direction, ordering, value, pk]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering=DEFAULT_ORDERING):
+    """解析游标，返回 (方向, 字段值, id)；格式错误或排序方式不一致时抛出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, cursor_ordering, value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if direction not in (NEXT, PREV) or cursor_ordering != ordering or not isinstance(pk, int):
+            raise ValueError
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value['t'])
+        return direction, value, pk
+    except (TypeError, KeyError, ValueError, json.JSONDecodeError):
+        raise ValueError("无效的分页游标")
+
+
+def parse_limit(value, default=DEFAULT_LIMIT):
+    """解析每页数量(限制在 1~MAX_LIMIT)，格式错误抛出 ValueError"""
+    if value in (None, ''):
+        return default
+    return max(1, min(int(value), MAX_LIMIT))
+
+
+def _beyond(field, value, pk, greater):
+    """
+    (字段, id) 大于(greater 为 True)或小于边界 (value, pk) 的非空记录
+
+    写成 字段 >= 值 AND (字段 > 值 OR id > pk) 的形式，第一个条件可以直接用于索引范围定位。
+    """
+    op = 'gt' if greater else 'lt'
+    return Q(**{f'{field}__{op}e': value}) & (Q(**{f'{field}__{op}': value}) | Q(**{f'id__{op}': pk}))
+
+
+def _is_nullable(queryset, field):
+    try:
+        return queryset.model._meta.get_field(field).null
+    except FieldDoesNotExist:
+        return True
+
+
+def _segments(queryset, field, descending, direction, value, pk):
+    """
+    按读取顺序返回一页所需的查询(每个查询都可以在索引上定位)
+
+    向后翻页依次读取：非空部分(字段, id)、空值部分(id)；
+    向前翻页按相反顺序读取，读取结果再翻转回正常顺序。
+    """
+    nullable = _is_nullable(queryset, field)
+    # forward：与正常顺序相同；backward：与正常顺序相反
+    forward = direction == NEXT
+    greater = descending != forward  # 读取方向上字段值递增
+    values_order = (field, 'id') if greater else (f'-{field}', '-id')
+    nulls_order = ('id',) if greater else ('-id',)
+
+    non_null = queryset.filter(**{f'{field}__isnull': False}) if nullable else queryset
+    non_null = non_null.order_by(*values_order)
+    nulls = queryset.filter(**{f'{field}__isnull': True}).order_by(*nulls_order) if nullable else None
+
+    if pk is None:
+        # 第一页
+        return [non_null] + ([nulls] if nullable else [])
+    if value is None:
+        # 边界在空值部分
+        if not nullable:
+            raise ValueError("无效的分页游标")
+        nulls = nulls.filter(**{f'id__{"gt" if greater else "lt"}': pk})
+        return [nulls] if forward else [nulls, non_null]
+    non_null = non_null.filter(_beyond(field, value, pk, greater))
+    return [non_null] + ([nulls] if nullable and forward else [])
+
+
+def keyset_page(queryset, cursor=None, limit=DEFAULT_LIMIT, with_total=False, ordering=DEFAULT_ORDERING):
+    """
+    读取一页记录
+
+    参数:
+        queryset: 已筛选的查询集(可以是 values() 查询集，但需要包含 id 与排序字段)
+        cursor: 上一次返回的 next_cursor / prev_cursor，为空时读取第一页
+        with_total: 是否额外执行 COUNT 返回总数(默认不统计)
+        ordering: 排序字段，'-' 开头表示倒序，相同值再按 id 同方向排序
+
+    返回:
+        {'items': [...], 'next_cursor': str|None, 'prev_cursor': str|None, 'total': int|None}
+    """
+    direction, value, pk = decode_cursor(cursor, ordering) if cursor else (NEXT, None, None)
+    descending = ordering.startswith('-')
+    field = ordering.lstrip('-')
+
+    items = []
+    for segment in _segments(queryset, field, descending, direction, value, pk):
+        items.extend(segment[:limit + 1 - len(items)])
+        if len(items) > limit:
+            break
+    has_more = len(items) > limit
+    items = items[:limit]
+    if direction == PREV:
+        items.reverse()
+
+    def key(item):
+        return (item[field], item['id']) if isinstance(item, dict) else (getattr(item, field), item.id)
+
+    # 向后翻页时"还有更多"指排序在后面的记录，向前翻页时指排序在前面的记录
+    has_next = has_more if direction == NEXT else pk is not None
+    has_prev = pk is not None if direction == NEXT else has_more
+    return {
+        'items': items,
+        'next_cursor': encode_cursor(NEXT, ordering, *key(items[-1])) if items and has_next else None,
+        'prev_cursor': encode_cursor(PREV, ordering, *key(items[0])) if items and has_prev else None,
+        'total': queryset.count() if with_total else None,
+    }
+
+
+def iter_keyset(queryset, batch_size=MAX_LIMIT):
+    """
+    按 (entry_time, id) 倒序逐条遍历全部记录
+
+    每批用游标条件查询 batch_size 条，相当于各数据库通用的服务端游标：
+    内存占用只与批大小有关(MySQL 驱动不会一次读入整个结果集)。
+    """
+    cursor = None
+    while True:
+        page = keyset_page(queryset, cursor, batch_size)
+        yield from page['items']
+        cursor = page['next_cursor']
+        if cursor is None:
+            return
@@ -0,0 +1,94 @@
+# parking_records.py
+"""
+车辆数据分析页面的停车记录表格
+
+筛选条件(车牌前缀、车位、状态、入场日期范围)与排序字段都有对应的索引，
+分页使用 pagination.keyset_page 游标分页；页面首次渲染与 JSON 接口共用这里的查询。
+"""
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+PAGE_SIZE = 50
+SORT_FIELDS = ('entry_time', 'exit_time', 'license_plate', 'spot_number')
+STATUSES = ('parked', 'exited', 'reserved')
+
+RECORD_FIELDS = ('id', 'license_plate', 'vehicle_type', 'user__username', 'spot_number',
+                 'entry_time', 'exit_time', 'reserved', 'paid', 'fee')
+
+
+def parse_record_query(params):
+    """
+    按请求参数构建查询
+
+    参数:
+        params: 支持 plate(车牌前缀)、spot(车位号)、status(parked/exited/reserved)、
+                start / end(入场日期 YYYY-MM-DD，end 含当天)、sort(排序字段，'-' 开头为倒序)
+
+    返回:
+        (values() 查询集, 排序方式)，参数无效时抛出 ValueError
+    """
+    from .models import Vehicle
+
+    query = Vehicle.objects.all()
+
+    plate = (params.get('plate') or '').strip().upper()
+    if plate:
+        # 用范围条件代替 LIKE 'xx%'，各数据库都能使用车牌索引
+        query = query.filter(license_plate__gte=plate, license_plate__lt=plate + '\uffff')
+
+    spot = (params.get('spot') or '').strip().upper()
+    if spot:
+        query = query.filter(spot_number=spot)
+
+    status = params.get('status') or ''
+    if status == 'parked':
+        query = query.filter(exit_time__isnull=True, reserved=False)
+    elif status == 'exited':
+        query = query.filter(exit_time__isnull=False)
+    elif status == 'reserved':
+        query = query.filter(exit_time__isnull=True, reserved=True)
+    elif status:
+        raise ValueError(f"无效的状态: {status}")
+
+    if params.get('start'):
+        start = timezone.make_aware(datetime.strptime(params['start'], '%Y-%m-%d'))
+        query = query.filter(entry_time__gte=start)
+    if params.get('end'):
+        end = timezone.make_aware(datetime.strptime(params['end'], '%Y-%m-%d')) + timedelta(days=1)
+        query = query.filter(entry_time__lt=end)
+
+    ordering = params.get('sort') or '-entry_time'
+    if ordering.lstrip('-') not in SORT_FIELDS:
+        raise ValueError(f"无效的排序字段: {ordering}")
+    return query.values(*RECORD_FIELDS), ordering
+
+
+def _local_minute(value):
+    return timezone.localtime(value).strftime('%Y-%m-%d %H:%M') if value else None
+
+
+def record_row(row):
+    """表格中的一行(values() 字典)，时间为本地时间"""
+    from .models import Vehicle
+
+    entry_time, exit_time = row['entry_time'], row['exit_time']
+    if exit_time is None:
+        status = '预订中' if row['reserved'] else '未出库'
+        duration = None
+    else:
+        status = '已出库'
+        duration = round((exit_time - entry_time).total_seconds() / 60, 2) if entry_time else 0
+    return {
+        'id': row['id'],
+        'license_plate': row['license_plate'],
+        'vehicle_type': dict(Vehicle.VEHICLE_TYPE_CHOICES).get(row['vehicle_type'], '未知类型'),
+        'username': row['user__username'],
+        'spot_number': row['spot_number'] or '未知',
+        'entry_time': _local_minute(entry_time),
+        'exit_time': _local_minute(exit_time),
+        'duration': duration,
+        'status': status,
+        'paid': row['paid'],
+        'fee': float(row['fee'] or 0)
+    }
@@ -0,0 +1,139 @@
+# promotion_index.py
+"""
+促销活动区间索引
+
+每个 worker 进程只加载一次全部启用的促销活动，按开始时间排序后建立
+"结束时间最大值"线段树，用于在 O(log n) 内回答：
+与停车区间 [entry, exit] 重叠的促销活动中，开始时间最晚的是哪一个
+(与 Promotion.objects.filter(...).first() 的选择规则一致)。
+
+促销活动保存或删除后更新共享版本戳，所有 worker 在下一次检查时重建索引。
+"""
+import bisect
+
+import numpy as np
+
+from .occupancy import touch_on_commit
+from .tariff import to_microseconds
+from .versioning import VersionedCache
+
+PROMOTION_VERSION_NAME = 'promotion_index'
+NOT_FOUND = -1
+
+
+class PromotionIndex:
+    """不可变的促销活动区间索引"""
+
+    def __init__(self, promotions):
+        # 按 (开始时间, -id) 升序排列，越靠右优先级越高
+        self.promotions = sorted(promotions, key=lambda p: (p.start_time, -p.pk))
+        self.starts = [to_microseconds(p.start_time) for p in self.promotions]
+        self.ends = [to_microseconds(p.end_time) for p in self.promotions]
+        self.starts_array = np.array(self.starts, dtype=np.int64)
+        self.ends_array = np.array(self.ends, dtype=np.int64)
+
+        # 线段树：tree[node] 为该节点覆盖区间内的最大结束时间
+        self.size = 1
+        while self.size < max(len(self.promotions), 1):
+            self.size *= 2
+        self.tree = [float('-inf')] * (2 * self.size)
+        for i, end in enumerate(self.ends):
+            self.tree[self.size + i] = end
+        for node in range(self.size - 1, 0, -1):
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+
+    def __len__(self):
+        return len(self.promotions)
+
+    def _rightmost(self, node, lo, hi, last, min_end):
+        """在 [lo, hi) 与 [0, last] 的交集中查找结束时间 >= min_end 的最右位置"""
+        if lo > last or self.tree[node] < min_end:
+            return NOT_FOUND
+        if hi - lo == 1:
+            return lo
+        mid = (lo + hi) // 2
+        found = self._rightmost(2 * node + 1, mid, hi, last, min_end)
+        if found != NOT_FOUND:
+            return found
+        return self._rightmost(2 * node, lo, mid, last, min_end)
+
+    def find_position(self, entry_us, exit_us):
+        """返回适用促销活动在 self.promotions 中的下标，没有则返回 NOT_FOUND"""
+        last = bisect.bisect_right(self.starts, exit_us) - 1
+        if last < 0:
+            return NOT_FOUND
+        if self.ends[last] >= entry_us:
+            return last
+        return self._rightmost(1, 0, self.size, last, entry_us)
+
+    def lookup(self, entry_time, exit_time):
+        """
+        查询与时间窗口 [entry_time, exit_time] 重叠的促销活动
+
+        返回:
+            Promotion 实例，没有则返回 None
+        """
+        position = self.find_position(to_microseconds(entry_time), to_microseconds(exit_time))
+        return self.promotions[position] if position != NOT_FOUND else None
+
+    def active_at(self, moment):
+        """查询指定时刻正在进行的促销活动"""
+        return self.lookup(moment, moment)
+
+    def lookup_many(self, entry_us, exit_us):
+        """
+        批量查询多个停车区间适用的促销活动
+
+        参数:
+            entry_us, exit_us: 入场/出场时间的整数微秒数组
+
+        返回:
+            促销活动下标数组，无促销为 NOT_FOUND
+        """
+        entry_us = np.asarray(entry_us, dtype=np.int64)
+        exit_us = np.asarray(exit_us, dtype=np.int64)
+        positions = np.full(len(entry_us), NOT_FOUND, dtype=np.int64)
+        if not self.promotions:
+            return positions
+
+        last = np.searchsorted(self.starts_array, exit_us, side='right') - 1
+        has_candidate = last >= 0
+        safe_last = np.maximum(last, 0)
+        # 绝大多数记录命中开始时间最晚的候选活动，剩余记录再走线段树
+        direct = has_candidate & (self.ends_array[safe_last] >= entry_us)
+        positions[direct] = last[direct]
+        for i in np.flatnonzero(has_candidate & ~direct):
+            positions[i] = self._rightmost(1, 0, self.size, int(last[i]), int(entry_us[i]))
+        return positions
+
+
+def _load_promotion_index():
+    from .models import Promotion
+
+    return PromotionIndex(list(Promotion.objects.filter(is_active=True)))
+
+
+_promotion_index = VersionedCache(PROMOTION_VERSION_NAME, _load_promotion_index)
+
+
+def promotion_payload(promotion):
+    """促销活动的前端展示数据(车位地图接口与实时推送共用)，没有活动返回 None"""
+    if promotion is None:
+        return None
+    return {
+        "name": promotion.name,
+        "discount": promotion.get_discount_display(),
+        "start_time": promotion.start_time.isoformat(),
+        "end_time": promotion.end_time.isoformat()
+    }
+
+
+def get_promotion_index():
+    """返回当前 worker 的促销活动索引，共享版本戳变化时重建"""
+    return _promotion_index.get()
+
+
+def invalidate_promotion_index():
+    """促销活动变更后调用，通知所有 worker 重建索引，并递增车位地图版本号"""
+    _promotion_index.invalidate()
+    touch_on_commit()
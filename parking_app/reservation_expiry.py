@@ -0,0 +1,99 @@
+# reservation_expiry.py
+"""
+预订过期调度器
+
+由 expire_reservations 管理命令在单独的后台进程中运行，请求处理过程中不再清理过期预订。
+调度器用小顶堆按 reservation_expiry_time 保存即将到期的预订，
+到期时按批次一次性删除并释放车位地图中的车位。
+
+堆中只加载 REFRESH_INTERVAL 内到期的预订，每个周期重新加载一次；
+预订变更时会更新共享版本戳(与 reservation_index 共用)，调度器在一秒内发现并立即重新加载，
+因此"使用时间已过去"这类马上到期的预订也能及时处理。
+已被使用或取消的预订在删除时按条件过滤，不需要从堆中移除。
+"""
+import heapq
+import logging
+import threading
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .reservation_index import RESERVATION_VERSION_NAME
+from .versioning import get_version
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = timedelta(minutes=1)  # 堆中预加载的时间窗口，也是定期全量检查的间隔
+POLL_SECONDS = 1.0  # 检查版本戳的间隔
+
+
+class ReservationExpiryScheduler:
+    """按过期时间排序的预订小顶堆"""
+
+    def __init__(self, refresh_interval=REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.heap = []
+        self.version = None
+        self.loaded_until = None
+
+    def reload(self, now):
+        """加载 refresh_interval 内到期(包括已经过期)的全部预订"""
+        from .models import Vehicle
+
+        self.loaded_until = now + self.refresh_interval
+        rows = Vehicle.objects.filter(
+            reserved=True,
+            exit_time__isnull=True,
+            reservation_expiry_time__lt=self.loaded_until
+        ).values_list('reservation_expiry_time', 'id')
+        self.heap = list(rows)
+        heapq.heapify(self.heap)
+
+    def pop_due(self, now):
+        """弹出所有已到期的预订 id"""
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap)[1])
+        return due
+
+    def next_deadline(self):
+        """堆中最早的过期时间，堆为空时返回 None"""
+        return self.heap[0][0] if self.heap else None
+
+    def run_once(self, now=None):
+        """
+        执行一次调度：必要时重新加载，然后批量删除到期的预订
+
+        返回:
+            本次删除的预订数量
+        """
+        from .models import Vehicle
+
+        now = now or timezone.now()
+        version = get_version(RESERVATION_VERSION_NAME)
+        if self.loaded_until is None or now >= self.loaded_until or version != self.version:
+            self.version = version
+            self.reload(now)
+
+        due = self.pop_due(now)
+        if not due:
+            return 0
+        return Vehicle.clean_expired_reservations(now=now, ids=due)
+
+    def run_forever(self, stop_event=None):
+        """循环调度，直到 stop_event 被设置"""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                expired = self.run_once()
+                if expired:
+                    logger.info(f"已清理 {expired} 条过期预订")
+            except Exception as e:
+                logger.error(f"清理过期预订失败: {str(e)}")
+
+            # 睡到下一个过期时间，但至少每秒检查一次版本戳
+            timeout = POLL_SECONDS
+            deadline = self.next_deadline()
+            if deadline is not None:
+                timeout = min(timeout, max((deadline - timezone.now()).total_seconds(), 0))
+            stop_event.wait(timeout)
@@ -0,0 +1,164 @@
+# reservation_index.py
+"""
+预订时间窗口索引
+
+每个车位的未结束预订按使用时间排序，并保存"结束时间前缀最大值"，
+判断某个时间窗口 [start, end) 是否与已有预订重叠只需一次二分查找：
+开始时间早于 end 的预订中，只要最晚的结束时间晚于 start 即重叠。
+
+在场车辆(结束时间未知)不进入索引，直接读取共享车位位图中的占用状态。
+
+每个 worker 只加载一次索引，预订新增、使用、取消或过期后更新共享版本戳
+(与预订过期调度器共用)，各 worker 在下一次访问时重新加载。
+新增预订和入场在 reservation_lock() 内"强制检查版本 + 判断冲突 + 写入"，
+多个进程同时预订同一车位也不会产生重叠。
+"""
+import bisect
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+try:
+    import fcntl  # 仅 Linux/Unix 可用，用于跨进程加锁
+except ImportError:  # Windows 开发环境退化为进程内锁
+    fcntl = None
+
+from .occupancy import get_occupancy_map, OCCUPIED
+from .tariff import to_microseconds
+from .versioning import VersionedCache
+
+RESERVATION_VERSION_NAME = 'reservations'
+
+
+class ReservationIndex:
+    """不可变的按车位分组的预订区间索引"""
+
+    def __init__(self, rows):
+        """
+        参数:
+            rows: (车位号, 使用时间, 过期时间) 序列
+        """
+        by_spot = {}
+        for spot_number, start, end in rows:
+            by_spot.setdefault(spot_number, []).append((to_microseconds(start), to_microseconds(end)))
+
+        self.spots = {}
+        for spot_number, intervals in by_spot.items():
+            intervals.sort()
+            starts = [start for start, _ in intervals]
+            max_ends = []
+            latest = None
+            for _, end in intervals:
+                latest = end if latest is None else max(latest, end)
+                max_ends.append(latest)
+            self.spots[spot_number] = (starts, max_ends)
+
+    def __len__(self):
+        return sum(len(starts) for starts, _ in self.spots.values())
+
+    def _overlaps_us(self, spot_number, start_us, end_us):
+        entry = self.spots.get(spot_number)
+        if entry is None:
+            return False
+        starts, max_ends = entry
+        count = bisect.bisect_left(starts, end_us)  # 开始时间早于窗口结束的预订
+        return count > 0 and max_ends[count - 1] > start_us
+
+    def overlaps(self, spot_number, start_time, end_time):
+        """车位在 [start_time, end_time) 内是否已有预订"""
+        return self._overlaps_us(spot_number, to_microseconds(start_time), to_microseconds(end_time))
+
+    def has_pending(self, spot_number, now=None):
+        """车位是否还有未过期的预订(包括尚未到使用时间的)"""
+        entry = self.spots.get(spot_number)
+        now_us = to_microseconds(now or timezone.now())
+        return entry is not None and entry[1][-1] > now_us
+
+    def latest_expiry(self, spot_number):
+        """车位所有预订中最晚的过期时间(微秒)，没有预订返回 None"""
+        entry = self.spots.get(spot_number)
+        return entry[1][-1] if entry is not None else None
+
+    def free_spots(self, spot_ids, start_time, end_time):
+        """返回在 [start_time, end_time) 内没有预订的车位号列表(按传入顺序)"""
+        start_us, end_us = to_microseconds(start_time), to_microseconds(end_time)
+        return [spot_id for spot_id in spot_ids if not self._overlaps_us(spot_id, start_us, end_us)]
+
+
+def _load_reservation_index():
+    from .models import Vehicle
+
+    return ReservationIndex(Vehicle.objects.filter(
+        reserved=True,
+        exit_time__isnull=True,
+        reservation_expiry_time__gt=timezone.now(),
+        reservation_use_time__isnull=False
+    ).values_list('spot_number', 'reservation_use_time', 'reservation_expiry_time').iterator())
+
+
+_reservation_index = VersionedCache(RESERVATION_VERSION_NAME, _load_reservation_index)
+
+
+def get_reservation_index(force_check=False):
+    """
+    返回当前 worker 的预订索引
+
+    参数:
+        force_check: 立即检查共享版本戳(在 reservation_lock() 内做冲突判断时使用)
+    """
+    if force_check:
+        _reservation_index.expire_check()
+    return _reservation_index.get()
+
+
+def invalidate_reservation_index():
+    """预订变更后立即调用，通知所有 worker 与过期调度器重新加载"""
+    _reservation_index.invalidate()
+
+
+def notify_reservations_changed():
+    """预订变更后调用(事务提交后生效)"""
+    transaction.on_commit(invalidate_reservation_index)
+
+
+def available_spots(start_time, end_time):
+    """
+    查询 [start_time, end_time) 内可预订的车位
+
+    排除当前有车停放的车位(离场时间未知)以及该时间段内已有预订的车位。
+
+    返回:
+        车位号列表(按车位地图顺序)
+    """
+    occupancy_map = get_occupancy_map()
+    statuses = occupancy_map.raw_statuses()
+    candidates = [spot_id for spot_id, status in zip(occupancy_map.spot_ids, statuses) if status != OCCUPIED]
+    return get_reservation_index().free_spots(candidates, start_time, end_time)
+
+
+_lock_fd = None
+_thread_lock = threading.Lock()
+
+
+@contextmanager
+def reservation_lock():
+    """跨进程的预订写入锁：在锁内判断冲突并写入，保证不会产生重叠预订"""
+    global _lock_fd
+    with _thread_lock:
+        if _lock_fd is None:
+            path = Path(getattr(settings, 'OCCUPANCY_MAP_PATH', Path(settings.BASE_DIR) / 'run' / 'occupancy.map'))
+            path = path.with_name('reservations.lock')
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _lock_fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o664)
+        if fcntl is not None:
+            fcntl.flock(_lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(_lock_fd, fcntl.LOCK_UN)
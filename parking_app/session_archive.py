@@ -0,0 +1,481 @@
+# session_archive.py
+"""
+已结束停车记录的列式归档
+
+每晚由 compact_sessions 命令把已出场、已支付的记录追加到按月分区的列式文件中，
+统计分析直接用 NumPy 读取内存映射文件，不再扫描 parking_app_vehicle 表。
+
+目录结构(SESSION_ARCHIVE_DIR，默认 BASE_DIR/archive/sessions)：
+    state.json          已归档到的时间点(出场时间，本地零点)与未完成的归档日志
+    spots.json          车位编号字典，列 spot_code 保存在这里的下标(-1 表示没有车位号)
+    2024-05/            按出场时间的本地月份分区
+        meta.json       分区的有效行数与 id 范围
+        id.bin、entry_us.bin ...    每列一个原始数组文件(小端，定长)
+
+写入只追加，一次归档结束时才更新各分区的 meta.json 与 state.json，
+读取方只读取 meta.json 记录的行数，看不到未完成的归档。
+归档中途失败时，下一次运行先按日志把各分区截断回开始前的行数(日志中记录为重建的分区重新重建)再重新归档。
+历史记录被修改后用 compact_sessions --rebuild YYYY-MM 重建对应月份。
+
+已归档的记录重复支付时出场时间会改为支付时刻(晚于已归档时间点)，下一次归档会再次读到它：
+归档前先找出这类记录(入场早于已归档时间点)原来所在的分区并按数据库重建，旧的那一行随之移除，不会重复统计。
+只读取 id 范围(meta.json)包含这些记录的分区，不扫描全部归档。
+在下一次归档之前，这条记录在归档(旧出场时间)与数据库(新出场时间)中各出现一次。
+"""
+import calendar
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+try:
+    import fcntl  # 仅 Linux/Unix 可用，用于防止两个归档任务同时运行
+except ImportError:
+    fcntl = None
+
+from .income_rollup import HOUR, hour_start, day_start
+from .layout import get_spot_template, DEFAULT_LOT
+from .tariff import to_microseconds, EPOCH
+
+# 列名 -> 数据类型
+COLUMNS = {
+    'id': np.dtype('<i8'),
+    'entry_us': np.dtype('<i8'),  # 入场时间(Unix 微秒)，没有入场时间时等于出场时间
+    'exit_us': np.dtype('<i8'),  # 出场时间(Unix 微秒)
+    'fee_cents': np.dtype('<i8'),  # 费用(分)
+    'type_code': np.dtype('u1'),  # VEHICLE_TYPES 中的下标
+    'spot_code': np.dtype('<i4'),  # spots.json 中的下标，-1 表示没有车位号
+    'member': np.dtype('?'),  # 出场时是否为有效会员
+}
+VEHICLE_TYPES = ('car', 'truck', 'ev')
+BATCH_SIZE = 50000
+
+_lock = threading.Lock()
+
+
+def archive_root():
+    return Path(getattr(settings, 'SESSION_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'archive' / 'sessions'))
+
+
+def month_key(moment):
+    """出场时间所在的本地月份(分区名)"""
+    return timezone.localtime(moment).strftime('%Y-%m')
+
+
+def month_bounds(month):
+    """分区月份的本地时间范围 [start, end)"""
+    year, month_number = map(int, month.split('-'))
+    start = timezone.make_aware(datetime(year, month_number, 1))
+    days = calendar.monthrange(year, month_number)[1]
+    return start, timezone.make_aware(datetime(year, month_number, 1) + timedelta(days=days))
+
+
+def _read_json(path, default):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def _write_json(path, value):
+    """先写临时文件再替换，读取方不会看到写了一半的文件"""
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(value, f)
+    os.replace(tmp, path)
+
+
+class SessionArchive:
+    """列式归档的读取接口"""
+
+    def __init__(self, root=None):
+        self.root = Path(root) if root else archive_root()
+
+    def state(self):
+        return _read_json(self.root / 'state.json', {'archived_until': None})
+
+    def archived_until(self):
+        """已归档到的时间点(不含)，没有归档时返回 None"""
+        value = self.state().get('archived_until')
+        return EPOCH + timedelta(microseconds=value) if value is not None else None
+
+    def spot_ids(self):
+        return _read_json(self.root / 'spots.json', [])
+
+    def months(self):
+        """已有的分区(按月份排序)"""
+        if not self.root.exists():
+            return []
+        return sorted(path.name for path in self.root.iterdir() if (path / 'meta.json').exists())
+
+    def meta(self, month):
+        return _read_json(self.root / month / 'meta.json', {'rows': 0})
+
+    def rows(self, month):
+        return self.meta(month)['rows']
+
+    def read_partition(self, month, columns=None):
+        """
+        以只读内存映射方式读取一个分区
+
+        返回:
+            {列名: numpy 数组}，长度为分区的有效行数
+        """
+        rows = self.rows(month)
+        result = {}
+        for name in columns or COLUMNS:
+            if rows == 0:
+                result[name] = np.empty(0, dtype=COLUMNS[name])
+            else:
+                result[name] = np.memmap(self.root / month / f'{name}.bin', dtype=COLUMNS[name], mode='r', shape=(rows,))
+        return result
+
+    def load(self, start=None, end=None, columns=None, overlap=False):
+        """
+        读取时间范围内的记录(多个分区合并)
+
+        参数:
+            start / end: 时间范围 [start, end)，为空表示不限
+            overlap: False 按出场时间筛选；True 返回停车区间与范围有交集的记录(占用率统计用)
+
+        返回:
+            {列名: numpy 数组}
+        """
+        columns = list(columns or COLUMNS)
+        needed = set(columns) | {'exit_us'} | ({'entry_us'} if overlap else set())
+        start_us = to_microseconds(start) if start is not None else None
+        end_us = to_microseconds(end) if end is not None else None
+        first = month_key(start) if start is not None else None
+        last = month_key(end - timedelta(microseconds=1)) if end is not None and not overlap else None
+
+        parts = {name: [] for name in columns}
+        for month in self.months():
+            # 分区按出场月份划分；按区间交集筛选时，出场晚于 end 的记录也可能与范围相交
+            if (first and month < first) or (last and month > last):
+                continue
+            data = self.read_partition(month, needed)
+            mask = np.ones(len(data['exit_us']), dtype=bool)
+            if overlap:
+                if start_us is not None:
+                    mask &= data['exit_us'] > start_us
+                if end_us is not None:
+                    mask &= data['entry_us'] < end_us
+            else:
+                if start_us is not None:
+                    mask &= data['exit_us'] >= start_us
+                if end_us is not None:
+                    mask &= data['exit_us'] < end_us
+            for name in columns:
+                parts[name].append(np.asarray(data[name][mask]))
+        return {name: np.concatenate(arrays) if arrays else np.empty(0, dtype=COLUMNS[name])
+                for name, arrays in parts.items()}
+
+    def spot_codes_for_lot(self, lot_code):
+        """停车场包含的车位编码(不在当前布局中的车位归入默认停车场)"""
+        template = get_spot_template()
+        lot_spots = {spot[0] for spot in template.spots if spot[1] == lot_code}
+        codes = [code for code, spot_id in enumerate(self.spot_ids())
+                 if spot_id in lot_spots or (lot_code == DEFAULT_LOT[0] and spot_id not in template.positions)]
+        if lot_code == DEFAULT_LOT[0]:
+            codes.append(-1)
+        return np.array(codes, dtype=COLUMNS['spot_code'])
+
+    def income_series(self, granularity, start, end, lot_code=None):
+        """
+        按小时/天统计 [start, end) 内的收入(与 income_rollup.rollup_series 格式相同)
+
+        返回:
+            按时间排序的 (bucket_start, 收入, 停车次数) 列表，只包含有记录的时间段
+        """
+        data = self.load(start, end, ['exit_us', 'fee_cents', 'spot_code'])
+        if lot_code:
+            mask = np.isin(data['spot_code'], self.spot_codes_for_lot(lot_code))
+            data = {name: values[mask] for name, values in data.items()}
+
+        # 时间段边界在 Python 中按时区生成(夏令时也能正确处理)，再用二分查找归入时间段
+        boundaries = []
+        moment = hour_start(start) if granularity == HOUR else day_start(start)
+        while moment < end:
+            boundaries.append(moment)
+            if granularity == HOUR:
+                moment += timedelta(hours=1)
+            else:
+                moment = day_start(moment + timedelta(hours=36))
+        edges = np.array([to_microseconds(moment) for moment in boundaries], dtype=np.int64)
+        buckets = np.searchsorted(edges, data['exit_us'], side='right') - 1
+
+        revenue = np.bincount(buckets, weights=data['fee_cents'], minlength=len(edges))
+        counts = np.bincount(buckets, minlength=len(edges))
+        return [
+            (boundaries[index], Decimal(int(revenue[index])) / 100, int(counts[index]))
+            for index in np.flatnonzero(counts)
+        ]
+
+
+@contextmanager
+def _compaction_lock(root):
+    root.mkdir(parents=True, exist_ok=True)
+    with _lock:
+        fd = os.open(root / 'compact.lock', os.O_RDWR | os.O_CREAT, 0o664)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+
+def _membership_periods(user_ids):
+    from .models import Membership
+
+    return {user_id: (start, end) for user_id, start, end in Membership.objects.filter(
+        user_id__in=user_ids
+    ).values_list('user_id', 'start_date', 'end_date')}
+
+
+def _rows_to_columns(rows, spot_codes, spot_ids):
+    """把一批数据库记录转换为各列数组，并按出场月份分组"""
+    memberships = _membership_periods({row[1] for row in rows})
+    type_codes = {vehicle_type: code for code, vehicle_type in enumerate(VEHICLE_TYPES)}
+    by_month = {}
+    for pk, user_id, entry_time, exit_time, fee, vehicle_type, spot_number in rows:
+        if spot_number is None:
+            spot_code = -1
+        else:
+            spot_code = spot_codes.get(spot_number)
+            if spot_code is None:
+                spot_code = spot_codes[spot_number] = len(spot_ids)
+                spot_ids.append(spot_number)
+        period = memberships.get(user_id)
+        exit_us = to_microseconds(exit_time)
+        by_month.setdefault(month_key(exit_time), []).append((
+            pk,
+            to_microseconds(entry_time) if entry_time else exit_us,
+            exit_us,
+            int((Decimal(fee or 0) * 100).to_integral_value()),
+            type_codes.get(vehicle_type, 0),
+            spot_code,
+            period is not None and period[0] <= exit_time <= period[1],
+        ))
+    return {
+        month: {name: np.array([row[index] for row in month_rows], dtype=dtype)
+                for index, (name, dtype) in enumerate(COLUMNS.items())}
+        for month, month_rows in by_month.items()
+    }
+
+
+def _iter_batches(start, end, batch_size):
+    """按 id 分批读取出场时间在 [start, end) 内的已支付记录"""
+    from .models import Vehicle
+
+    query = Vehicle.objects.filter(paid=True, exit_time__isnull=False, exit_time__lt=end)
+    if start is not None:
+        query = query.filter(exit_time__gte=start)
+    query = query.order_by('id').values_list(
+        'id', 'user_id', 'entry_time', 'exit_time', 'fee', 'vehicle_type', 'spot_number')
+    last_id = 0
+    while True:
+        rows = list(query.filter(id__gt=last_id)[:batch_size])
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+
+def _truncate_partition(directory, rows):
+    for name, dtype in COLUMNS.items():
+        path = directory / f'{name}.bin'
+        if path.exists():
+            os.truncate(path, rows * dtype.itemsize)
+
+
+def _append(root, month_columns, appended):
+    for month, columns in month_columns.items():
+        directory = root / month
+        directory.mkdir(exist_ok=True)
+        for name, values in columns.items():
+            with open(directory / f'{name}.bin', 'ab') as f:
+                f.write(values.tobytes())
+        appended[month] = appended.get(month, 0) + len(columns['id'])
+
+
+def _write_meta(directory, rows):
+    """提交分区的有效行数，并记录其中 id 的范围"""
+    meta = {'rows': rows}
+    if rows:
+        ids = np.memmap(directory / 'id.bin', dtype=COLUMNS['id'], mode='r', shape=(rows,))
+        meta.update(min_id=int(ids.min()), max_id=int(ids.max()))
+    _write_json(directory / 'meta.json', meta)
+
+
+def _rebuild_partition(archive, month, end, batch_size):
+    """
+    按数据库重建分区中出场时间早于 end 的部分，返回分区的记录数
+
+    重建过程中分区是空的，调用前需先在 state.json 的 pending 日志中记录，中途失败时由 _recover 重新重建。
+    """
+    root = archive.root
+    start, month_end = month_bounds(month)
+    directory = root / month
+    directory.mkdir(exist_ok=True)
+    _write_json(directory / 'meta.json', {'rows': 0})
+    _truncate_partition(directory, 0)
+
+    spot_ids = archive.spot_ids()
+    spot_codes = {spot_id: code for code, spot_id in enumerate(spot_ids)}
+    appended = {}
+    for rows in _iter_batches(start, min(end, month_end), batch_size):
+        _append(root, _rows_to_columns(rows, spot_codes, spot_ids), appended)
+    _write_json(root / 'spots.json', spot_ids)
+    _write_meta(directory, appended.get(month, 0))
+    return appended.get(month, 0)
+
+
+def _moved_months(archive, start, until):
+    """
+    已归档的记录中出场时间后来改到 [start, until) 内的(重复支付)，返回它们原来所在的分区
+
+    这类记录在已归档时间点 start 之前就已出场，入场时间必然早于 start(没有入场时间的也要检查)；
+    只读取 id 范围包含这些记录的分区，每晚的开销不随归档总量增长。
+    """
+    from .models import Vehicle
+
+    ids = np.array(list(Vehicle.objects.filter(
+        Q(entry_time__lt=start) | Q(entry_time__isnull=True),
+        paid=True, exit_time__gte=start, exit_time__lt=until
+    ).values_list('id', flat=True)), dtype=COLUMNS['id'])
+    if len(ids) == 0:
+        return []
+    ids.sort()
+    last_month = month_key(start - timedelta(microseconds=1))
+    moved = []
+    for month in archive.months():
+        if month > last_month:
+            continue
+        meta = archive.meta(month)
+        if meta['rows'] and 'min_id' not in meta:
+            # 早期的分区没有记录 id 范围，补写一次
+            _write_meta(archive.root / month, meta['rows'])
+            meta = archive.meta(month)
+        if not meta['rows'] or np.searchsorted(ids, meta['min_id']) == np.searchsorted(ids, meta['max_id'], 'right'):
+            continue
+        if np.isin(archive.read_partition(month, ['id'])['id'], ids).any():
+            moved.append(month)
+    return moved
+
+
+def _recover(archive, batch_size):
+    """上一次归档或重建未完成时按日志恢复各分区，返回去掉日志后的归档状态"""
+    root = archive.root
+    state = archive.state()
+    pending = state.get('pending')
+    if not pending:
+        return state
+    rebuild = set(pending.get('rebuild', ()))
+    for month in sorted(path.name for path in root.iterdir() if path.is_dir()):
+        if month in rebuild:
+            _rebuild_partition(archive, month, archive.archived_until(), batch_size)
+            continue
+        rows = pending['rows_before'].get(month, 0)
+        _truncate_partition(root / month, rows)
+        if (root / month / 'meta.json').exists():
+            # 截断后原来的 id 范围仍然覆盖剩余的行
+            _write_json(root / month / 'meta.json', {**archive.meta(month), 'rows': rows})
+    state = {'archived_until': state.get('archived_until')}
+    _write_json(root / 'state.json', state)
+    return state
+
+
+def compact(until=None, batch_size=BATCH_SIZE, root=None):
+    """
+    把出场时间早于 until(默认今天本地零点)且尚未归档的已支付记录追加到归档
+
+    until 最晚为今天本地零点：归档时间点若在未来，之后支付(出场时间早于归档时间点)的记录
+    不会再被归档，统计接口又把它们当作已归档而不在数据库中统计。
+
+    返回:
+        本次归档的记录数
+    """
+    archive = SessionArchive(root)
+    root = archive.root
+    today = day_start(timezone.now())
+    until = min(day_start(until), today) if until else today
+    with _compaction_lock(root):
+        state = _recover(archive, batch_size)
+
+        start_us = state.get('archived_until')
+        start = EPOCH + timedelta(microseconds=start_us) if start_us is not None else None
+        if start is not None and start >= until:
+            return 0
+
+        moved = _moved_months(archive, start, until) if start is not None else []
+        rows_before = {month: archive.rows(month) for month in archive.months()}
+        for month, rows in rows_before.items():
+            _truncate_partition(root / month, rows)  # 清除更早的失败归档留下的多余数据
+        _write_json(root / 'state.json', {**state, 'pending': {'rows_before': rows_before, 'rebuild': moved}})
+        for month in moved:
+            # 重复支付的已归档记录：重建原来的分区，去掉旧出场时间的那一行
+            rows_before[month] = _rebuild_partition(archive, month, start, batch_size)
+
+        spot_ids = archive.spot_ids()
+        spot_codes = {spot_id: code for code, spot_id in enumerate(spot_ids)}
+        appended = {}
+        for rows in _iter_batches(start, until, batch_size):
+            _append(root, _rows_to_columns(rows, spot_codes, spot_ids), appended)
+
+        # 先保存车位字典，再提交各分区行数，最后更新归档时间点
+        _write_json(root / 'spots.json', spot_ids)
+        for month, count in appended.items():
+            _write_meta(root / month, rows_before.get(month, 0) + count)
+        _write_json(root / 'state.json', {'archived_until': to_microseconds(until)})
+        return sum(appended.values())
+
+
+def rebuild_month(month, batch_size=BATCH_SIZE, root=None):
+    """
+    按数据库重建一个月份分区(只包含已归档时间点之前的记录)
+
+    返回:
+        分区的记录数
+    """
+    archive = SessionArchive(root)
+    root = archive.root
+    start, _ = month_bounds(month)
+    with _compaction_lock(root):
+        state = _recover(archive, batch_size)
+        archived_until = archive.archived_until()
+        if archived_until is None or archived_until <= start:
+            raise ValueError(f"{month} 尚未归档")
+        rows_before = {name: archive.rows(name) for name in archive.months()}
+        _write_json(root / 'state.json', {**state, 'pending': {'rows_before': rows_before, 'rebuild': [month]}})
+        rows = _rebuild_partition(archive, month, archived_until, batch_size)
+        _write_json(root / 'state.json', state)
+        return rows
+
+
+def archive_series(granularity, start, end, lot_code=None):
+    """
+    收入统计：已归档部分读取列式归档，之后的部分直接在数据库中统计
+
+    返回:
+        与 income_rollup.rollup_series() 相同格式的列表
+    """
+    from .income_rollup import live_series
+
+    archived_until = SessionArchive().archived_until()
+    if archived_until is None or archived_until <= start:
+        return live_series(granularity, start, end, lot_code)
+    split = min(archived_until, end)
+    series = SessionArchive().income_series(granularity, start, split, lot_code)
+    if split < end:
+        series += live_series(granularity, split, end, lot_code)
+    return series
@@ -0,0 +1,151 @@
+# session_export.py
+"""
+停车记录导出(CSV / NDJSON)
+
+后台导出接口与 export_sessions 管理命令共用。
+记录通过 values() 读取(用户名用 JOIN 一次取出，不再逐行查询 vehicle.user)，
+按 id 分批读取，每批用 iterator(chunk_size) 逐行生成输出，
+内存占用只与批大小有关，与导出的总行数无关；
+按 id 分批也避免了 MySQL 驱动一次性把整个结果集读入内存。
+"""
+import csv
+import json
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+CHUNK_SIZE = 2000
+
+# (输出列名, values() 字段)
+EXPORT_FIELDS = [
+    ('id', 'id'),
+    ('order_number', 'order_number'),
+    ('license_plate', 'license_plate'),
+    ('vehicle_type', 'vehicle_type'),
+    ('username', 'user__username'),
+    ('spot_number', 'spot_number'),
+    ('entry_time', 'entry_time'),
+    ('exit_time', 'exit_time'),
+    ('paid', 'paid'),
+    ('fee', 'fee'),
+    ('payment_amount', 'payment_amount'),
+    ('reserved', 'reserved'),
+]
+COLUMNS = [column for column, _ in EXPORT_FIELDS]
+
+
+def _parse_date(value):
+    return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+
+
+def parse_filters(params):
+    """
+    解析导出条件(接口的 GET 参数或命令行参数)
+
+    参数:
+        params: 支持 start / end(入场日期 YYYY-MM-DD，end 含当天)、plate(车牌包含)、
+                paid(1/0、true/false)、type(车辆类型)
+
+    返回:
+        export_queryset() 的关键字参数，格式错误抛出 ValueError
+    """
+    filters = {}
+    if params.get('start'):
+        filters['start'] = _parse_date(params['start'])
+    if params.get('end'):
+        filters['end'] = _parse_date(params['end']) + timedelta(days=1)
+    if params.get('plate'):
+        filters['plate'] = params['plate'].strip()
+    paid = params.get('paid')
+    if paid not in (None, ''):
+        if str(paid).lower() in ('1', 'true', 'yes'):
+            filters['paid'] = True
+        elif str(paid).lower() in ('0', 'false', 'no'):
+            filters['paid'] = False
+        else:
+            raise ValueError(f"无效的支付状态: {paid}")
+    vehicle_type = params.get('type')
+    if vehicle_type:
+        from .models import Vehicle
+
+        if vehicle_type not in dict(Vehicle.VEHICLE_TYPE_CHOICES):
+            raise ValueError(f"无效的车辆类型: {vehicle_type}")
+        filters['vehicle_type'] = vehicle_type
+    return filters
+
+
+def export_queryset(start=None, end=None, plate=None, paid=None, vehicle_type=None):
+    """按条件筛选停车记录，返回 values() 查询集(按 id 排序)"""
+    from .models import Vehicle
+
+    query = Vehicle.objects.all()
+    if start is not None:
+        query = query.filter(entry_time__gte=start)
+    if end is not None:
+        query = query.filter(entry_time__lt=end)
+    if plate:
+        query = query.filter(license_plate__icontains=plate)
+    if paid is not None:
+        query = query.filter(paid=paid)
+    if vehicle_type:
+        query = query.filter(vehicle_type=vehicle_type)
+    return query.order_by('id').values(*[field for _, field in EXPORT_FIELDS])
+
+
+def iter_rows(queryset, chunk_size=CHUNK_SIZE):
+    """按 id 分批逐行读取，每行转换为 {列名: 可序列化的值}"""
+    tz = timezone.get_current_timezone()
+    last_id = 0
+    while True:
+        count = 0
+        for row in queryset.filter(id__gt=last_id)[:chunk_size].iterator(chunk_size=chunk_size):
+            count += 1
+            last_id = row['id']
+            record = {}
+            for column, field in EXPORT_FIELDS:
+                value = row[field]
+                if isinstance(value, datetime):
+                    value = value.astimezone(tz).strftime('%Y-%m-%d %H:%M:%S')
+                elif value is not None and not isinstance(value, (bool, int, str)):
+                    value = str(value)  # Decimal
+                record[column] = value
+            yield record
+        if count < chunk_size:
+            return
+
+
+class _Echo:
+    """csv.writer 的伪文件对象：write() 直接返回写入的内容"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    """逐行生成 CSV 文本(第一行带 BOM，方便 Excel 识别 UTF-8)"""
+    writer = csv.writer(_Echo())
+    yield '\ufeff' + writer.writerow(COLUMNS)
+    for record in rows:
+        # 布尔值输出为 1/0，空值输出为空字符串
+        yield writer.writerow([int(value) if isinstance(value, bool) else value for value in record.values()])
+
+
+def iter_ndjson(rows):
+    """逐行生成 NDJSON 文本"""
+    for record in rows:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def stream_sessions(export_format, filters, chunk_size=CHUNK_SIZE):
+    """
+    按条件导出停车记录
+
+    返回:
+        逐行输出文本的生成器
+    """
+    if export_format not in FORMATS:
+        raise ValueError(f"无效的导出格式: {export_format}")
+    rows = iter_rows(export_queryset(**filters), chunk_size)
+    return iter_csv(rows) if export_format == 'csv' else iter_ndjson(rows)
@@ -0,0 +1,196 @@
+# session_histogram.py
+"""
+停车时长与费用的分布直方图(SessionHistogram)
+
+分桶按对数划分：分桶 0 为 [0, 单位)，分桶 i(i >= 1) 为 [单位 × 2^((i-1)/8), 单位 × 2^(i/8))，
+每翻一倍分 8 个桶，相邻边界相差约 9%，百分位数的相对误差不超过这个范围。
+时长单位为 1 分钟、费用单位为 0.01 元，最多 MAX_BUCKET 个桶(时长约两年、费用约一万元)。
+
+支付时在同一事务中给对应的两个分桶各加 1(重复支付先减去上一次)；
+首次部署或修改历史记录后用 rebuild_income_rollups 命令重建。
+查询任意日期范围的百分位数只需按分桶汇总(每个指标最多 MAX_BUCKET + 1 行)，不扫描停车记录。
+"""
+import math
+from datetime import timedelta
+
+from django.db import transaction, IntegrityError
+from django.db.models import F, Sum
+from django.utils import timezone
+
+DURATION, FEE = 'duration', 'fee'
+UNITS = {DURATION: 1.0, FEE: 0.01}  # 分桶 0 的上界(分钟 / 元)
+SUBDIVISIONS = 8  # 每翻一倍的分桶数
+MAX_BUCKET = SUBDIVISIONS * 20
+PERCENTILES = (50, 90, 99)
+
+
+def bucket_of(value, unit):
+    """数值所在的分桶序号"""
+    if value < unit:
+        return 0
+    return min(MAX_BUCKET, 1 + int(math.floor(SUBDIVISIONS * math.log2(value / unit))))
+
+
+def bucket_bounds(bucket, unit):
+    """分桶的取值范围 [下界, 上界)"""
+    if bucket == 0:
+        return 0.0, unit
+    return unit * 2 ** ((bucket - 1) / SUBDIVISIONS), unit * 2 ** (bucket / SUBDIVISIONS)
+
+
+def _duration_minutes(entry_time, exit_time):
+    return (exit_time - entry_time).total_seconds() / 60 if entry_time else 0.0
+
+
+def _session_buckets(entry_time, exit_time, fee):
+    """一条已支付记录对应的 {指标: 分桶}"""
+    return {
+        DURATION: bucket_of(_duration_minutes(entry_time, exit_time), UNITS[DURATION]),
+        FEE: bucket_of(float(fee or 0), UNITS[FEE]),
+    }
+
+
+def _add(day, vehicle_type, metric, bucket, count):
+    from .models import SessionHistogram
+
+    rows = SessionHistogram.objects.filter(day=day, vehicle_type=vehicle_type, metric=metric, bucket=bucket)
+    if rows.update(count=F('count') + count):
+        return
+    try:
+        with transaction.atomic():
+            SessionHistogram.objects.create(day=day, vehicle_type=vehicle_type, metric=metric,
+                                            bucket=bucket, count=count)
+    except IntegrityError:
+        # 其他请求同时创建了同一个分桶
+        rows.update(count=F('count') + count)
+
+
+def record_session(vehicle, previous=None):
+    """
+    支付成功后累加时长/费用分布(需在支付的事务中调用)
+
+    参数:
+        previous: (可选)重复支付时上一次记录的 (车位号, 出场时间, 费用)，会先扣除
+    """
+    if previous is not None:
+        _, exit_time, fee = previous
+        day = timezone.localdate(exit_time)
+        for metric, bucket in _session_buckets(vehicle.entry_time, exit_time, fee).items():
+            _add(day, vehicle.vehicle_type, metric, bucket, -1)
+    if not vehicle.exit_time:
+        return
+    day = timezone.localdate(vehicle.exit_time)
+    for metric, bucket in _session_buckets(vehicle.entry_time, vehicle.exit_time, vehicle.fee).items():
+        _add(day, vehicle.vehicle_type, metric, bucket, 1)
+
+
+def rebuild_histograms(start=None, end=None, chunk_size=5000):
+    """
+    按停车记录重建 [start, end) 范围内的分布直方图
+
+    start/end 会对齐到本地日期的零点；不指定时重建全部数据。
+    分桶需要取对数，按 id 分批读取记录在 Python 中计算。
+
+    返回:
+        写入的分桶行数
+    """
+    from .income_rollup import day_start
+    from .models import SessionHistogram, Vehicle
+
+    paid = Vehicle.objects.filter(paid=True, exit_time__isnull=False)
+    histograms = SessionHistogram.objects.all()
+    if start is not None:
+        start = day_start(start)
+        paid = paid.filter(exit_time__gte=start)
+        histograms = histograms.filter(day__gte=timezone.localdate(start))
+    if end is not None:
+        end = day_start(end - timedelta(microseconds=1)) + timedelta(days=1)
+        paid = paid.filter(exit_time__lt=end)
+        histograms = histograms.filter(day__lt=timezone.localdate(end))
+
+    paid = paid.order_by('id').values_list('id', 'vehicle_type', 'entry_time', 'exit_time', 'fee')
+    counts = {}
+    last_id = 0
+    while True:
+        rows = list(paid.filter(id__gt=last_id)[:chunk_size])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        for _, vehicle_type, entry_time, exit_time, fee in rows:
+            day = timezone.localdate(exit_time)
+            for metric, bucket in _session_buckets(entry_time, exit_time, fee).items():
+                key = (day, vehicle_type, metric, bucket)
+                counts[key] = counts.get(key, 0) + 1
+
+    with transaction.atomic():
+        histograms.delete()
+        SessionHistogram.objects.bulk_create([
+            SessionHistogram(day=day, vehicle_type=vehicle_type, metric=metric, bucket=bucket, count=count)
+            for (day, vehicle_type, metric, bucket), count in counts.items()
+        ], batch_size=chunk_size)
+    return len(counts)
+
+
+def histogram(start_day, end_day, vehicle_type=None):
+    """
+    合并 [start_day, end_day) 内各天的分布
+
+    返回:
+        {指标: {分桶: 次数}}
+    """
+    from .models import SessionHistogram
+
+    rows = SessionHistogram.objects.filter(day__gte=start_day, day__lt=end_day)
+    if vehicle_type:
+        rows = rows.filter(vehicle_type=vehicle_type)
+    merged = {DURATION: {}, FEE: {}}
+    for metric, bucket, total in rows.values('metric', 'bucket').annotate(total=Sum('count')) \
+            .order_by().values_list('metric', 'bucket', 'total'):
+        if total and metric in merged:
+            merged[metric][bucket] = total
+    return merged
+
+
+def percentile(buckets, unit, q):
+    """
+    由分桶计数估算百分位数(分桶内按对数插值)
+
+    参数:
+        buckets: {分桶: 次数}
+        q: 0~100
+    """
+    total = sum(buckets.values())
+    if total <= 0:
+        return None
+    rank = total * q / 100
+    seen = 0
+    for bucket in sorted(buckets):
+        count = buckets[bucket]
+        if count <= 0:
+            continue
+        if seen + count >= rank:
+            if bucket == 0:
+                return 0.0  # 不足一个单位(免费、不足一分钟)按 0 计
+            lower, upper = bucket_bounds(bucket, unit)
+            return lower * (upper / lower) ** ((rank - seen) / count)
+        seen += count
+    return bucket_bounds(max(buckets), unit)[1]
+
+
+def distribution_summary(start_day, end_day, vehicle_type=None, percentiles=PERCENTILES):
+    """
+    日期范围内停车时长(分钟)与费用(元)的百分位数
+
+    返回:
+        {'count': 记录数, 'free_ratio': 免费记录占比,
+         'duration': {'p50': ..., ...}, 'fee': {'p50': ..., ...}}
+    """
+    merged = histogram(start_day, end_day, vehicle_type)
+    count = sum(merged[DURATION].values())
+    summary = {'count': count, 'free_ratio': round(merged[FEE].get(0, 0) / count, 4) if count else None}
+    for metric, digits in ((DURATION, 1), (FEE, 2)):
+        summary[metric] = {}
+        for q in percentiles:
+            value = percentile(merged[metric], UNITS[metric], q)
+            summary[metric][f'p{q}'] = round(value, digits) if value is not None else None
+    return summary
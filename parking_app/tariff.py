@@ -0,0 +1,156 @@
+# tariff.py
+"""
+批量计费引擎
+
+与 Vehicle.calculate_fee() 的规则完全一致，但一次计算整批停车记录：
+- 停车时长先四舍五入到 0.01 分钟(与 parking_duration_minutes 相同)
+- 免费时长内费用为 0，有效会员费用为 0
+- 与停车区间重叠的促销活动中取开始时间最晚的一个
+- 最终金额按 ROUND_HALF_UP 保留到分
+
+计算全部在整数"分"上用 NumPy 完成，只有恰好落在半分/半个 0.01 分钟上的
+记录才回退到 Decimal 逐条计算，以保证与单条计算的结果逐分一致。
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+from django.utils import timezone
+
+from .membership_status import get_membership_resolver
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+US_PER_CENTIMINUTE = 600000  # 0.01 分钟 = 600000 微秒
+
+
+def to_microseconds(value):
+    """将带时区的 datetime 转换为距 Unix 纪元的整数微秒，None 返回 None"""
+    if value is None:
+        return None
+    if not timezone.is_aware(value):
+        value = timezone.make_aware(value)
+    return (value - EPOCH) // ONE_MICROSECOND
+
+
+def _to_cents(value):
+    """将两位小数的 Decimal 金额转换为整数分"""
+    return int((Decimal(value) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def _scalar_centiminutes(duration_us):
+    """按 parking_duration_minutes 的浮点算法计算 0.01 分钟数(用于边界记录)"""
+    minutes = round(duration_us / 10 ** 6 / 60, 2)
+    return int(Decimal(str(minutes)) * 100)
+
+
+def _scalar_fee(centiminutes, hourly_rate, promotion):
+    """按 Vehicle.calculate_fee() 的 Decimal 算法计算单条费用(用于边界记录)"""
+    minute_rate = hourly_rate / Decimal('60')
+    fee = Decimal(centiminutes) / Decimal('100') * minute_rate
+    if promotion is None:
+        return fee.quantize(Decimal('0.00'), rounding=ROUND_HALF_UP)
+    if promotion.discount_type == 'percent':
+        fee -= fee * (promotion.discount_value / Decimal('100'))
+    elif promotion.discount_type == 'fixed':
+        fee -= promotion.discount_value
+    fee = max(fee, Decimal('0.00'))
+    return fee.quantize(Decimal('0.00'), rounding=ROUND_HALF_UP)
+
+
+def calculate_fees(entry_times, exit_times, member_flags=None, now=None,
+                   hourly_rate=None, free_minutes=None, promotion_index=None):
+    """
+    批量计算停车费用
+
+    参数:
+        entry_times: 入场时间序列(datetime 或 None)
+        exit_times: 出场时间序列(datetime 或 None，None 表示按当前时间计算)
+        member_flags: (可选)是否为有效会员的布尔序列
+        now: (可选)计算未出场记录时使用的当前时间
+        hourly_rate / free_minutes: (可选)费率与免费时长，默认读取系统配置
+        promotion_index: (可选)促销活动索引，默认使用当前 worker 的共享索引
+
+    返回:
+        与输入顺序一致的 Decimal 费用列表
+    """
+    from .models import Vehicle
+    from .promotion_index import get_promotion_index, NOT_FOUND
+
+    count = len(entry_times)
+    if count == 0:
+        return []
+
+    if hourly_rate is None:
+        hourly_rate = Vehicle.get_hourly_rate()
+    hourly_rate = Decimal(hourly_rate)
+    if free_minutes is None:
+        free_minutes = Vehicle.get_free_duration_minutes()
+    if promotion_index is None:
+        promotion_index = get_promotion_index()
+    promotions = promotion_index.promotions
+    now_us = to_microseconds(now or timezone.now())
+
+    entry_us = np.array([to_microseconds(t) if t is not None else 0 for t in entry_times], dtype=np.int64)
+    exit_us = np.array([to_microseconds(t) if t is not None else now_us for t in exit_times], dtype=np.int64)
+    chargeable = np.array([t is not None for t in entry_times], dtype=bool)
+    if member_flags is not None:
+        chargeable &= ~np.asarray(member_flags, dtype=bool)
+
+    # 停车时长(0.01 分钟)，四舍五入；恰好位于 0.005 分钟的记录按浮点算法单独处理
+    duration_us = exit_us - entry_us
+    centiminutes, remainder = np.divmod(duration_us, US_PER_CENTIMINUTE)
+    centiminutes += remainder > US_PER_CENTIMINUTE // 2
+    for i in np.flatnonzero(chargeable & (remainder == US_PER_CENTIMINUTE // 2)):
+        centiminutes[i] = _scalar_centiminutes(int(duration_us[i]))
+
+    chargeable &= centiminutes > int(free_minutes) * 100
+
+    # 以"分"为单位的精确有理数 numerator / denominator
+    rate_cents = _to_cents(hourly_rate)
+    base = centiminutes * rate_cents  # 费用(分) = base / 6000
+    numerator = base * 10000
+    denominator = 6000 * 10000
+
+    matched = promotion_index.lookup_many(entry_us, exit_us)
+    for index in np.unique(matched[chargeable]):
+        if index == NOT_FOUND:
+            continue
+        promotion = promotions[index]
+        rows = matched == index
+        value_cents = _to_cents(promotion.discount_value)  # 百分比折扣的 value_cents 为"万分比"
+        if promotion.discount_type == 'percent':
+            numerator[rows] = base[rows] * (10000 - value_cents)
+        elif promotion.discount_type == 'fixed':
+            numerator[rows] = (base[rows] - value_cents * 6000) * 10000
+
+    numerator = np.maximum(numerator, 0)
+    cents = (2 * numerator + denominator) // (2 * denominator)  # ROUND_HALF_UP
+    ties = chargeable & (numerator % denominator == denominator // 2)
+    cents[~chargeable] = 0
+
+    fees = [Decimal(int(c)).scaleb(-2) for c in cents]
+    for i in np.flatnonzero(ties):
+        index = int(matched[i])
+        promotion = promotions[index] if index != NOT_FOUND else None
+        fees[i] = _scalar_fee(int(centiminutes[i]), hourly_rate, promotion)
+    return fees
+
+
+def calculate_queryset_fees(queryset, now=None):
+    """
+    批量计算查询集中每条停车记录的费用
+
+    返回:
+        {vehicle_id: Decimal 费用} 字典
+    """
+    now = now or timezone.now()
+    rows = list(queryset.values_list('id', 'entry_time', 'exit_time', 'user_id'))
+    if not rows:
+        return {}
+
+    ids, entry_times, exit_times, user_ids = zip(*rows)
+    members = get_membership_resolver().member_user_ids(user_ids)
+    member_flags = [user_id in members for user_id in user_ids]
+    fees = calculate_fees(entry_times, exit_times, member_flags, now=now)
+    return dict(zip(ids, fees))
@@ -1,3 +1,178 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+
+from .models import Membership, ParkingConfig, Promotion, User, Vehicle, _config_cache
+from .pagination import encode_cursor, decode_cursor, keyset_page, NEXT, PREV
+from .promotion_index import _promotion_index
+from .tariff import calculate_queryset_fees
+
+
+class CursorTests(SimpleTestCase):
+    """游标编码与解析"""
+
+    def test_round_trip(self):
+        moment = datetime(2024, 5, 1, 8, 30, 15, 123456, tzinfo=dt_timezone.utc)
+        for ordering, value in (('-entry_time', moment), ('license_plate', '粤A12345'), ('-exit_time', None)):
+            cursor = encode_cursor(NEXT, ordering, value, 42)
+            self.assertEqual(decode_cursor(cursor, ordering), (NEXT, value, 42))
+        cursor = encode_cursor(PREV, '-entry_time', moment, 7)
+        self.assertEqual(decode_cursor(cursor), (PREV, moment, 7))
+
+    def test_ordering_mismatch(self):
+        cursor = encode_cursor(NEXT, '-entry_time', None, 1)
+        with self.assertRaises(ValueError):
+            decode_cursor(cursor, '-exit_time')
+
+    def test_invalid_cursor(self):
+        for cursor in ('', 'not-a-cursor', encode_cursor('x', '-entry_time', None, 1)):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+
+class KeysetPageTests(TestCase):
+    """游标分页：逐页前后翻页的结果与完整排序一致，空值排在最后"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='keyset')
+        base = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        # exit_time 有重复值与空值，用于检查 (字段, id) 的边界与空值部分
+        exits = [2, None, 1, 2, None, 3, 1, None, 2, 3, None, 1]
+        Vehicle.objects.bulk_create([
+            Vehicle(user=user, license_plate=f'TEST{index:02d}', order_number=f'KEYSET{index:02d}',
+                    entry_time=base + timedelta(minutes=index % 4),
+                    exit_time=base + timedelta(hours=exit_hours) if exit_hours is not None else None)
+            for index, exit_hours in enumerate(exits)
+        ])
+
+    def expected(self, ordering):
+        field = ordering.lstrip('-')
+        descending = ordering.startswith('-')
+        rows = list(Vehicle.objects.values('id', field))
+        values = sorted((row for row in rows if row[field] is not None),
+                        key=lambda row: (row[field], row['id']), reverse=descending)
+        nulls = sorted((row for row in rows if row[field] is None), key=lambda row: row['id'], reverse=descending)
+        return [row['id'] for row in values + nulls]
+
+    def walk(self, ordering, limit):
+        queryset = Vehicle.objects.values('id', ordering.lstrip('-'))
+        pages = [keyset_page(queryset, None, limit, ordering=ordering)]
+        while pages[-1]['next_cursor']:
+            pages.append(keyset_page(queryset, pages[-1]['next_cursor'], limit, ordering=ordering))
+        forward = [row['id'] for page in pages for row in page['items']]
+
+        backward = [row['id'] for row in pages[-1]['items']]
+        page = pages[-1]
+        while page['prev_cursor']:
+            page = keyset_page(queryset, page['prev_cursor'], limit, ordering=ordering)
+            backward = [row['id'] for row in page['items']] + backward
+        return forward, backward
+
+    def test_orderings(self):
+        for ordering in ('-exit_time', 'exit_time', '-entry_time', 'entry_time'):
+            for limit in (1, 3, 5, 20):
+                with self.subTest(ordering=ordering, limit=limit):
+                    forward, backward = self.walk(ordering, limit)
+                    self.assertEqual(forward, self.expected(ordering))
+                    self.assertEqual(backward, self.expected(ordering))
+
+    def test_nulls_last(self):
+        for ordering in ('-exit_time', 'exit_time'):
+            forward, _ = self.walk(ordering, 4)
+            exits = dict(Vehicle.objects.values_list('id', 'exit_time'))
+            null_ids = [pk for pk in forward if exits[pk] is None]
+            self.assertEqual(forward[-len(null_ids):], null_ids)
+
+    def test_first_page_has_no_prev(self):
+        page = keyset_page(Vehicle.objects.values('id', 'entry_time'), None, 5)
+        self.assertIsNone(page['prev_cursor'])
+        self.assertIsNotNone(page['next_cursor'])
+        self.assertEqual(len(page['items']), 5)
+
+
+class BatchFeeTests(TestCase):
+    """批量计费引擎与 Vehicle.calculate_fee() 的结果逐分一致"""
+
+    BASE = datetime(2024, 3, 1, 8, tzinfo=dt_timezone.utc)
+    # 停车时长：免费时长边界、恰好半个 0.01 分钟、5 元/小时下恰好半分(60.06 分钟)等
+    DURATIONS = [
+        timedelta(0), timedelta(minutes=4, seconds=59.9), timedelta(minutes=5), timedelta(minutes=5, seconds=0.3),
+        timedelta(minutes=5, seconds=1), timedelta(minutes=10, seconds=0.3), timedelta(minutes=60, seconds=3.6),
+        timedelta(minutes=61, seconds=0.3), timedelta(minutes=95, seconds=17, microseconds=123456),
+        timedelta(days=1, minutes=7), timedelta(days=3),
+    ]
+    # 入场时间：无促销、单个促销内、两个促销重叠(取开始最晚的)、跨越促销边界、已停用的促销
+    ENTRIES = [
+        timedelta(0), timedelta(days=1, hours=1), timedelta(days=1, hours=13), timedelta(days=2, hours=6),
+        timedelta(days=4, hours=23), timedelta(days=5, minutes=30), timedelta(days=7, hours=1), timedelta(days=9),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        base = cls.BASE
+        # 直接批量写入，不触发 save() 中的缓存失效(测试事务中 on_commit 不会执行)，由 setUp 重新加载
+        ParkingConfig.objects.bulk_create([
+            ParkingConfig(config_type='hourly_rate', value=Decimal('5.00')),
+            ParkingConfig(config_type='free_duration', value=Decimal('5')),
+        ])
+        Promotion.objects.bulk_create([
+            Promotion(name='八五折', discount_type='percent', discount_value=Decimal('15.00'),
+                      start_time=base + timedelta(days=1), end_time=base + timedelta(days=2)),
+            Promotion(name='立减3元', discount_type='fixed', discount_value=Decimal('3.00'),
+                      start_time=base + timedelta(days=1, hours=12), end_time=base + timedelta(days=3)),
+            Promotion(name='三分之一', discount_type='percent', discount_value=Decimal('33.33'),
+                      start_time=base + timedelta(days=5), end_time=base + timedelta(days=5, hours=1)),
+            Promotion(name='立减50元', discount_type='fixed', discount_value=Decimal('50.00'),
+                      start_time=base + timedelta(days=7), end_time=base + timedelta(days=8)),
+            Promotion(name='已停用', discount_type='percent', discount_value=Decimal('90.00'), is_active=False,
+                      start_time=base + timedelta(days=9), end_time=base + timedelta(days=10)),
+        ])
+
+        users = [User.objects.create(username=name) for name in ('fee_guest', 'fee_member', 'fee_expired')]
+        Membership.objects.create(user=users[1], membership_type='year', end_date=base + timedelta(days=3650))
+        Membership.objects.create(user=users[2], membership_type='month', end_date=base - timedelta(days=1))
+
+        vehicles = []
+        for entry_offset in cls.ENTRIES:
+            for duration in cls.DURATIONS:
+                for user in users:
+                    index = len(vehicles)
+                    entry_time = base + entry_offset
+                    vehicles.append(Vehicle(
+                        user=user, license_plate=f'FEE{index:03d}', order_number=f'FEE{index:03d}',
+                        vehicle_type=Vehicle.VEHICLE_TYPE_CHOICES[index % 3][0],
+                        entry_time=entry_time, exit_time=entry_time + duration, paid=True))
+        vehicles.append(Vehicle(user=users[0], license_plate='FEE-NOENTRY', order_number='FEE-NOENTRY',
+                                entry_time=None, exit_time=base, paid=True))
+        Vehicle.objects.bulk_create(vehicles)
+
+    def setUp(self):
+        _config_cache.refresh()
+        _promotion_index.refresh()
+        self.addCleanup(_config_cache.refresh)
+        self.addCleanup(_promotion_index.refresh)
+
+    def assert_matches_scalar(self):
+        fees = calculate_queryset_fees(Vehicle.objects.all())
+        vehicles = list(Vehicle.objects.all())
+        self.assertEqual(len(fees), len(vehicles))
+        for vehicle in vehicles:
+            with self.subTest(plate=vehicle.license_plate):
+                self.assertEqual(fees[vehicle.id], vehicle.calculate_fee())
+
+    def test_matches_scalar(self):
+        self.assert_matches_scalar()
+
+    def test_matches_scalar_other_rate(self):
+        ParkingConfig.objects.filter(config_type='hourly_rate').update(value=Decimal('7.50'))
+        ParkingConfig.objects.filter(config_type='free_duration').update(value=Decimal('0'))
+        _config_cache.refresh()
+        self.assert_matches_scalar()
+
+    def test_half_cent_rounds_up(self):
+        vehicle = Vehicle.objects.get(user__username='fee_guest', entry_time=self.BASE,
+                                      exit_time=self.BASE + timedelta(minutes=60, seconds=3.6))
+        # 60.06 分钟 × 5 元/小时 = 5.005 元，ROUND_HALF_UP 为 5.01
+        self.assertEqual(calculate_queryset_fees(Vehicle.objects.filter(id=vehicle.id)), {vehicle.id: Decimal('5.01')})
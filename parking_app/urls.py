@@ -15,6 +15,7 @@ from django.urls import path
 from django.views.generic import TemplateView
 from .views import vehicle_data
 from .admin import custom_admin_site
+from .events import parking_lot_events
 
 urlpatterns = [
     # 首页和静态页面
@@ -23,6 +24,8 @@ urlpatterns = [
     path('parking/', views.parking, name='parking'),  # 停车场概览页面
     path('parking_lot/', views.parking_lot, name='parking_lot'),  # 停车管理系统主页面
     path('parking_lot/data/', views.parking_lot_data, name='parking_lot_data'),  # 停车数据API接口
+    path('parking_lot/recommend/', views.spot_recommendation, name='spot_recommendation'),  # 推荐车位接口
+    path('parking_lot/events/', parking_lot_events, name='parking_lot_events'),  # 车位状态实时推送(SSE)
     path('help/', views.help, name='help'),  # 帮助中心页面
     path('business_cooperation/', views.business_cooperation, name='business_cooperation'),  # 招商合作页面
     path('we/', views.we, name='we'),  # 个人中心页面
@@ -51,6 +54,7 @@ urlpatterns = [
     # 停车场管理相关路由
     path('use_reservation/<int:vehicle_id>/', views.use_reservation, name='use_reservation'),  # 使用预订车位接口
     path('reserve_spot/', views.reserve_spot, name='reserve_spot'),  # 预订车位接口
+    path('reserve_spot/availability/', views.reservation_availability, name='reservation_availability'),  # 可预订车位查询接口
     path('cancel_reservation/<int:vehicle_id>/', views.cancel_reservation, name='cancel_reservation'),  # 取消预订接口
     path('vehicle_history/', vehicle_history, name='vehicle_history'),  # 停车记录页面
     path('validate_license_plate/', views.validate_license_plate, name='validate_license_plate'),  # 验证车牌号接口
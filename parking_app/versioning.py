@@ -0,0 +1,90 @@
+# versioning.py
+"""跨进程共享的版本戳，用于在多个 uWSGI worker 之间通知进程内缓存失效"""
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY_PREFIX = 'parking_app:version:'
+
+
+def get_version(name):
+    """读取指定名称的共享版本戳，尚未设置时返回 None"""
+    return cache.get(VERSION_KEY_PREFIX + name)
+
+
+def current_version(name):
+    """
+    读取共享版本戳，尚未设置或已被缓存淘汰时生成一个新的
+
+    用作缓存键的一部分时使用：版本戳丢失后不会退回到默认值而重新命中失效前写入的旧缓存。
+    """
+    return get_version(name) or bump_version(name)
+
+
+def bump_version(name):
+    """
+    生成新的版本戳并写入共享缓存
+
+    使用随机令牌而不是自增计数，避免并发更新时两个进程写入相同的值。
+    """
+    token = uuid.uuid4().hex
+    cache.set(VERSION_KEY_PREFIX + name, token, None)  # 永不过期
+    return token
+
+
+class VersionedCache:
+    """
+    进程内缓存的值，由共享版本戳控制失效
+
+    首次调用 get() 时通过 loader 加载；之后每隔 check_interval 秒检查一次
+    共享版本戳，发现其他进程调用过 invalidate() 时重新加载。
+    """
+
+    def __init__(self, name, loader, check_interval=1.0):
+        self.name = name
+        self.loader = loader
+        self.check_interval = check_interval
+        self._state = {'version': None, 'value': None, 'loaded': False, 'checked_at': 0.0}
+        self._lock = threading.Lock()
+
+    def get(self):
+        """返回缓存值，必要时重新加载"""
+        now = time.monotonic()
+        state = self._state
+        if state['loaded'] and now - state['checked_at'] < self.check_interval:
+            return state['value']
+
+        with self._lock:
+            state = self._state
+            version = get_version(self.name)
+            if not state['loaded'] or state['version'] != version:
+                # 先读版本再加载数据，加载期间发生的修改会在下一次检查时被发现
+                self._state = {'version': version, 'value': self.loader(), 'loaded': True, 'checked_at': now}
+            else:
+                state['checked_at'] = now
+            return self._state['value']
+
+    def expire_check(self):
+        """下一次 get() 时立即检查共享版本戳，而不是等待 check_interval"""
+        self._state['checked_at'] = float('-inf')
+
+    def refresh(self):
+        """下一次 get() 时强制重新加载，不更新共享版本戳"""
+        self._state['loaded'] = False
+
+    def invalidate(self):
+        """
+        更新共享版本戳，使所有进程的缓存失效
+
+        在数据库事务中调用时，等事务提交后才更新版本戳：否则其他进程可能在提交前
+        看到新版本并重新加载到旧数据，之后一直保留旧数据直到下一次修改。
+        没有事务时立即生效。
+        """
+        def bump():
+            bump_version(self.name)
+            self._state['loaded'] = False
+
+        transaction.on_commit(bump)
@@ -13,20 +13,33 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import PasswordChangeView
 from django.core.serializers.json import DjangoJSONEncoder
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
 from django.shortcuts import redirect, get_object_or_404
 from django.shortcuts import render
 from django.urls import reverse_lazy
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.db import transaction, IntegrityError
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import UpdateView
 from .forms import RegisterForm
-from .models import Membership, ContactMessage, JobPosition, Promotion, \
+from .models import Membership, ContactMessage, JobPosition, \
     calculate_original_fee  # 直接从 models.py 中导入 Membership
 from .models import User
-from .models import Vehicle
+from .models import Vehicle, OpenSessionConflict, SPOT_CONFLICT_MESSAGE, RESERVATION_CONFLICT_MESSAGE
 from django.http import JsonResponse
 from .models import Feedback
+from .promotion_index import get_promotion_index, promotion_payload
+from .occupancy import get_occupancy_map, update_spot_on_commit, refresh_spots_on_commit, make_etag, OCCUPIED
+from .allocator import recommend_spot, claim_spot
+from .income_rollup import record_payment, PERIODS as INCOME_PERIODS
+from .session_histogram import record_session
+from .dashboard import get_dashboard_snapshot
+from .analytics import income_report, parse_reference_date, parse_record_limit
+from .json_stream import streaming_json_response
+from .pagination import keyset_page, decode_cursor, parse_limit
+from .reservation_index import get_reservation_index, invalidate_reservation_index, notify_reservations_changed, \
+    reservation_lock, available_spots
 import json
 from django.core import serializers
 from django.http import JsonResponse
@@ -79,92 +92,20 @@ def submit_feedback(request):
 @user_passes_test(lambda u: u.is_superuser)
 @csrf_exempt
 def income_data(request):
-    """修复后的收入数据API视图"""
+    """收入数据API视图(与后台收入统计共用 analytics 服务)"""
     try:
         period = request.GET.get('period', 'today')
-        tz = timezone.get_current_timezone()
-        now_local = timezone.localtime(timezone.now())
-
-        # 获取时间范围
-        if period == 'today':
-            start_date = now_local.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif period == 'week':
-            start_date = now_local - timedelta(days=now_local.weekday())
-            start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif period == 'month':
-            start_date = now_local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        elif period == 'quarter':
-            current_quarter = (now_local.month - 1) // 3 + 1
-            start_date = now_local.replace(month=(current_quarter - 1) * 3 + 1, day=1,
-                                           hour=0, minute=0, second=0, microsecond=0)
-        elif period == 'year':
-            start_date = now_local.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-        else:
-            start_date = None
-
-        # 查询条件：已支付且已出库的车辆
-        query = Vehicle.objects.filter(paid=True, exit_time__isnull=False)
-        if start_date:
-            start_date_utc = timezone.make_naive(start_date, tz).astimezone(timezone.utc)
-            query = query.filter(exit_time__gte=start_date_utc)
-
-        # 处理记录数据
-        records = []
-        for vehicle in query.order_by('-exit_time')[:20]:
-            local_time = timezone.localtime(vehicle.exit_time)
-            records.append({
-                'date': local_time.strftime('%Y-%m-%d %H:%M'),
-                'license_plate': vehicle.license_plate,
-                'duration': vehicle.parking_duration,
-                'amount': float(vehicle.calculate_fee()),
-                'is_member': hasattr(vehicle.user, 'membership') and vehicle.user.membership.is_active()
-            })
+        if period not in INCOME_PERIODS:
+            return JsonResponse({'success': False, 'error': '无效的时间周期'}, status=400)
+        try:
+            reference = parse_reference_date(request.GET.get('date'))
+            record_limit = parse_record_limit(request.GET.get('records'))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': '无效的查询参数'}, status=400)
 
-        # 修复趋势数据处理
-        trend_data = {'labels': [], 'amounts': []}
-
-        if period == 'today':
-            # 按小时统计（修复后的逻辑）
-            hours = {h: 0.0 for h in range(24)}
-            for v in query:
-                if v.exit_time:  # 确保exit_time不为None
-                    local_hour = timezone.localtime(v.exit_time).hour
-                    hours[local_hour] += float(v.calculate_fee())
-            trend_data['labels'] = [f"{h:02d}:00" for h in range(24)]
-            trend_data['amounts'] = [hours[h] for h in range(24)]
-
-        elif period in ['week', 'month']:
-            # 按天统计
-            days = {}
-            for v in query:
-                if v.exit_time:  # 确保exit_time不为None
-                    local_date = timezone.localtime(v.exit_time).strftime('%m-%d')
-                    days[local_date] = days.get(local_date, 0) + float(v.calculate_fee())
-            trend_data['labels'] = sorted(days.keys())
-            trend_data['amounts'] = [days[k] for k in trend_data['labels']]
-
-        elif period in ['quarter', 'year']:
-            # 按月统计
-            months = {}
-            for v in query:
-                if v.exit_time:  # 确保exit_time不为None
-                    local_month = timezone.localtime(v.exit_time).strftime('%Y-%m')
-                    months[local_month] = months.get(local_month, 0) + float(v.calculate_fee())
-            trend_data['labels'] = sorted(months.keys())
-            trend_data['amounts'] = [months[k] for k in trend_data['labels']]
-
-        # 返回JSON响应
-        return JsonResponse({
-            'success': True,
-            'stats': {
-                'total_income': sum(float(v.calculate_fee()) for v in query),
-                'avg_daily_income': sum(float(v.calculate_fee()) for v in query) / (7 if period == 'week' else 1),
-                'max_daily_income': max(trend_data['amounts']) if trend_data['amounts'] else 0,
-                'parking_count': query.count()
-            },
-            'trend': trend_data,
-            'records': records
-        })
+        report = income_report(period, reference, lot_code=request.GET.get('lot') or None, record_limit=record_limit)
+        head = {'success': True, 'stats': report['stats'], 'trend': report['trend']}
+        return streaming_json_response(head, 'records', report['records'])
 
     except Exception as e:
         logger.error(f"Income data error: {str(e)}", exc_info=True)
@@ -193,21 +134,25 @@ def vehicle_data(request):
                 "login_url": "/admin/"  # 指向admin登录页面
             }, status=401)
 
-        # 获取分页参数
-        limit = int(request.GET.get('limit', 100))  # 每页记录数，默认100
-        offset = int(request.GET.get('offset', 0))  # 偏移量，默认0
+        # 获取分页参数：limit 每页记录数(默认100)，cursor 为上一次返回的 next_cursor/prev_cursor，
+        # total=1 时额外返回总数
+        try:
+            limit = parse_limit(request.GET.get('limit'))
+            cursor = request.GET.get('cursor') or None
+            if cursor:
+                decode_cursor(cursor)
+        except ValueError:
+            return JsonResponse({"success": False, "message": "无效的分页参数"}, status=400)
 
         # 构建查询集
         if request.user.is_superuser:
             # 超级用户可以查看所有车辆
-            queryset = Vehicle.objects.all().order_by('-entry_time')
+            queryset = Vehicle.objects.all()
         else:
             # 普通用户只能查看自己的车辆
-            queryset = Vehicle.objects.filter(user=request.user).order_by('-entry_time')
+            queryset = Vehicle.objects.filter(user=request.user)
 
-        # 获取总数和分页数据
-        total_count = queryset.count()
-        vehicles = list(queryset[offset:offset + limit].values(
+        page = keyset_page(queryset.values(
             'id',
             'license_plate',
             'spot_number',
@@ -215,15 +160,16 @@ def vehicle_data(request):
             'exit_time',
             'vehicle_type',
             'user__username'
-        ))
+        ), cursor, limit, with_total=request.GET.get('total') == '1')
 
-        # 返回JSON响应
-        return JsonResponse({
+        # 流式返回JSON响应
+        return streaming_json_response({
             "success": True,
-            "total": total_count,
-            "count": len(vehicles),
-            "vehicles": vehicles
-        }, encoder=DateTimeEncoder)  # 使用自定义编码器
+            "total": page['total'],
+            "count": len(page['items']),
+            "next_cursor": page['next_cursor'],
+            "prev_cursor": page['prev_cursor']
+        }, "vehicles", page['items'], encoder=DateTimeEncoder)  # 使用自定义编码器
 
     except Exception as e:
         # 异常处理
@@ -358,6 +304,10 @@ def contact_us(request):
     return render(request, 'contact-us.html')
 
 
+# 停车记录页面每页显示的记录数
+HISTORY_PAGE_SIZE = 50
+
+
 # 停车记录视图
 def vehicle_history(request):
     if request.user.is_superuser:
@@ -366,61 +316,27 @@ def vehicle_history(request):
     else:
         # 普通用户查看自己的停车记录
         vehicles = Vehicle.objects.filter(user=request.user)
-    return render(request, "vehicle_history.html", {"vehicles": vehicles})
+
+    # 按入场时间倒序游标分页(?cursor=)
+    try:
+        page = keyset_page(vehicles, request.GET.get('cursor') or None, HISTORY_PAGE_SIZE)
+    except ValueError:
+        page = keyset_page(vehicles, None, HISTORY_PAGE_SIZE)
+    return render(request, "vehicle_history.html", {
+        "vehicles": page['items'],
+        "next_cursor": page['next_cursor'],
+        "prev_cursor": page['prev_cursor']
+    })
 
 
 # 停车管理系统主视图
 @login_required(login_url='/login/')
 def parking_lot(request):
-    # 清理过期的预订记录
-    Vehicle.clean_expired_reservations()
-
     # 获取当前有效的促销活动
-    active_promotion = Promotion.objects.filter(
-        is_active=True,
-        start_time__lte=timezone.now(),
-        end_time__gte=timezone.now()
-    ).first()
-
-    # 查询实际占用的车位（非预订）
-    occupied_spots = Vehicle.objects.filter(
-        exit_time__isnull=True,
-        reserved=False
-    ).values_list('spot_number', flat=True)
-
-    # 查询未过期的预订车位
-    reserved_spots = Vehicle.objects.filter(
-        reserved=True,
-        exit_time__isnull=True,
-        reservation_expiry_time__gt=timezone.now()
-    ).values_list('spot_number', flat=True)
-
-    # 定义所有车位的初始状态
-    spots = []
-    # A区车位(1-15)
-    for num in range(1, 16):
-        spots.append({"id": f"A{num}", "status": "available"})
-    # B区车位(1-24)
-    for num in range(1, 25):
-        spots.append({"id": f"B{num}", "status": "available"})
-    # C区车位(1-23)
-    for num in range(1, 24):
-        spots.append({"id": f"C{num}", "status": "available"})
-    # D区车位(1-12)
-    for num in range(1, 13):
-        spots.append({"id": f"D{num}", "status": "available"})
-    # E区车位(1-11)
-    for num in range(1, 12):
-        spots.append({"id": f"E{num}", "status": "available"})
-
-    # 更新车位状态
-    for spot in spots:
-        if spot["id"] in occupied_spots:
-            spot["status"] = "occupied"  # 已占用
-        elif spot["id"] in reserved_spots:
-            spot["status"] = "reserved"  # 已预订
-        else:
-            spot["status"] = "available"  # 可用
+    active_promotion = get_promotion_index().active_at(timezone.now())
+
+    # 从共享位图读取所有车位状态(过期的预订按可用显示)
+    spots = get_occupancy_map().snapshot()
 
     return render(request, "parking_lot.html", {
         "spots": spots,
@@ -431,68 +347,51 @@ def parking_lot(request):
 # 停车数据API
 @login_required
 def parking_lot_data(request):
-    # 清理过期的预订记录
-    Vehicle.clean_expired_reservations()
+    """
+    车位地图数据接口
+
+    - 响应带 ETag，If-None-Match 与当前数据一致时直接返回 304(不访问数据库)
+    - ?since=<版本号>：只返回该版本之后可能变化的车位(full 为 false)，
+      版本号过旧时返回全量数据(full 为 true)
+    """
+    # 车位状态直接读取共享位图；先读版本号，保证返回的状态不早于该版本
+    occupancy_map = get_occupancy_map()
+    version = occupancy_map.version
+    statuses = occupancy_map.statuses()
 
     # 获取当前有效的促销活动
-    active_promotion = Promotion.objects.filter(
-        is_active=True,
-        start_time__lte=timezone.now(),
-        end_time__gte=timezone.now()
-    ).first()
-
-    # 查询实际占用的车位（非预订）
-    occupied_spots = Vehicle.objects.filter(
-        exit_time__isnull=True,
-        reserved=False
-    ).values_list('spot_number', flat=True)
-
-    # 查询未过期的预订车位
-    reserved_spots = Vehicle.objects.filter(
-        reserved=True,
-        exit_time__isnull=True,
-        reservation_expiry_time__gt=timezone.now()
-    ).values_list('spot_number', flat=True)
-
-    # 定义所有车位的初始状态
-    spots = []
-    # 同上，初始化所有车位
-    for num in range(1, 16):
-        spots.append({"id": f"A{num}", "status": "available"})
-    for num in range(1, 25):
-        spots.append({"id": f"B{num}", "status": "available"})
-    for num in range(1, 24):
-        spots.append({"id": f"C{num}", "status": "available"})
-    for num in range(1, 13):
-        spots.append({"id": f"D{num}", "status": "available"})
-    for num in range(1, 12):
-        spots.append({"id": f"E{num}", "status": "available"})
-
-    # 更新车位状态
-    for spot in spots:
-        if spot["id"] in occupied_spots:
-            spot["status"] = "occupied"
-        elif spot["id"] in reserved_spots:
-            spot["status"] = "reserved"
-        else:
-            spot["status"] = "available"
+    active_promotion = get_promotion_index().active_at(timezone.now())
 
-    # 构建返回数据
-    response_data = {
-        "spots": spots,
-        "active_promotion": None
-    }
+    # 促销信息
+    promotion_json = json.dumps(promotion_payload(active_promotion))
 
-    # 如果有促销活动，添加促销信息
-    if active_promotion:
-        response_data["active_promotion"] = {
-            "name": active_promotion.name,
-            "discount": active_promotion.get_discount_display(),
-            "start_time": active_promotion.start_time.isoformat(),
-            "end_time": active_promotion.end_time.isoformat()
-        }
+    since = request.GET.get('since', '')
+    etag = make_etag(version, statuses, promotion_json + since)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
 
-    return JsonResponse(response_data)
+    positions = None
+    if since:
+        try:
+            positions = occupancy_map.delta_since(int(since))
+        except ValueError:
+            return JsonResponse({"success": False, "message": "无效的版本号"}, status=400)
+
+    template = occupancy_map.template
+    if positions is None:
+        # 拼接车位模板中预先生成的 JSON 片段
+        spots_json = template.render_json(statuses)
+    else:
+        spots_json = json.dumps(template.render_positions(statuses, positions), ensure_ascii=False)
+    content = (
+        '{"version": ' + str(version) + ', "full": ' + ('true' if positions is None else 'false') +
+        ', "spots": ' + spots_json + ', "active_promotion": ' + promotion_json + '}'
+    )
+    response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'  # 浏览器每次都带 If-None-Match 重新验证
+    return response
 
 
 # 帮助中心视图
@@ -506,9 +405,6 @@ def we(request):
     user = request.user
     current_time = timezone.now()
 
-    # 清理过期的预订记录
-    Vehicle.clean_expired_reservations()
-
     if user.is_superuser:
         # 超级用户查看所有车辆
         all_vehicles = Vehicle.objects.filter(reserved=False, exit_time__isnull=True)
@@ -701,29 +597,16 @@ def logout_view(request):
 # 管理员仪表盘视图
 @staff_member_required  # 仅限管理员访问
 def admin_dashboard(request):
-    # 获取最近的10条车辆记录
-    vehicles = Vehicle.objects.all().order_by('-entry_time')[:10]
-    return render(request, 'admin/index.html', {'vehicles': vehicles})
+    # 首页数据读取共享缓存中的快照(含最近的10条车辆记录)，不直接查询数据库
+    dashboard = get_dashboard_snapshot()
+    return render(request, 'admin/index.html', {'dashboard': dashboard, 'vehicles': dashboard['recent_sessions']})
 
 
 # 车辆入场API
 @csrf_exempt
 def entry(request):
     if request.method == 'POST':
-        # 清理所有过期的预订记录
-        current_time = timezone.now()
-        expired_reservations = Vehicle.objects.filter(
-            reserved=True,
-            reservation_expiry_time__lt=current_time
-        )
-
-        # 将过期的预订记录的车位状态更新为"可用"
-        for reservation in expired_reservations:
-            reservation.reserved = False
-            reservation.reservation_expiry_time = None
-            reservation.reservation_use_time = None
-            reservation.save()
-
+        # 过期预订由后台调度器(expire_reservations 命令)清理，这里不再处理
         # 获取表单数据
         license_plate = request.POST.get('license_plate', '').strip()
         spot_number = request.POST.get('spot_number', '').strip()
@@ -734,31 +617,83 @@ def entry(request):
         if not is_license_plate_valid(license_plate):
             return JsonResponse({"success": False, "message": "车牌号格式不规范"})
 
-        # 检查车牌号是否已经在未出库的车辆中
-        if Vehicle.objects.filter(license_plate=license_plate, exit_time__isnull=True).exists():
-            return JsonResponse({"success": False, "message": "该车辆已在停车场内"})
-
-        # 检查车位是否已经被占用或预订
-        if Vehicle.objects.filter(spot_number=spot_number, exit_time__isnull=True).exists():
-            return JsonResponse({"success": False, "message": "该车位已被占用或预订"})
+        # 未指定车位时由服务端分配最优车位，并在共享位图上原子占用
+        auto_assign = not spot_number
+        if auto_assign:
+            spot_number = claim_spot(vehicle_type)
+            if spot_number is None:
+                return JsonResponse({"success": False, "message": "暂无可用车位"})
 
         try:
             # 创建车辆记录并关联车位号 - 使用本地时间
-            vehicle = Vehicle(
-                license_plate=license_plate,
-                vehicle_type=vehicle_type,
-                user=user,
-                spot_number=spot_number,
-                entry_time=timezone.localtime(timezone.now())  # 使用本地时间
-            )
-            vehicle.save()
-            return JsonResponse({"success": True, "message": "车辆入场成功"})
+            # 车牌在场、车位被占用由数据库唯一约束判定，只需一次 INSERT；
+            # 车位是否有未过期的预订读取预订索引，与预订写入共用同一把锁
+            with reservation_lock():
+                if get_reservation_index(force_check=True).has_pending(spot_number):
+                    raise OpenSessionConflict(SPOT_CONFLICT_MESSAGE)
+                Vehicle.create_open_session(
+                    license_plate=license_plate,
+                    vehicle_type=vehicle_type,
+                    user=user,
+                    spot_number=spot_number,
+                    entry_time=timezone.localtime(timezone.now())  # 使用本地时间
+                )
+            update_spot_on_commit(spot_number, OCCUPIED)
+            return JsonResponse({"success": True, "message": "车辆入场成功", "spot_number": spot_number})
+        except OpenSessionConflict as e:
+            if auto_assign:
+                # 按数据库恢复自动分配时占用的车位状态
+                refresh_spots_on_commit([spot_number])
+            return JsonResponse({"success": False, "message": e.message})
         except Exception as e:
+            if auto_assign:
+                refresh_spots_on_commit([spot_number])
             return JsonResponse({"success": False, "message": f"发生错误：{str(e)}"})
 
     return JsonResponse({"success": False, "message": "无效的请求方法"})
 
 
+# 推荐车位API
+@login_required
+def spot_recommendation(request):
+    """按车型推荐当前最优的空闲车位(只推荐不占用，入场时不传车位号即自动分配)"""
+    vehicle_type = request.GET.get('vehicle_type', 'car').strip()
+    spot_number = recommend_spot(vehicle_type)
+    if spot_number is None:
+        return JsonResponse({"success": False, "message": "暂无可用车位"})
+    return JsonResponse({"success": True, "spot_number": spot_number})
+
+
+# 可预订车位查询API
+@login_required
+def reservation_availability(request):
+    """
+    查询指定时间段内可预订的车位
+
+    参数(GET):
+        start: 预订使用时间(YYYY-MM-DDTHH:MM)
+        end: (可选)结束时间，默认为使用时间加预订过期时长(与 reserve_spot 一致)
+    """
+    try:
+        start = timezone.make_aware(datetime.strptime(request.GET.get('start', '').strip(), '%Y-%m-%dT%H:%M'))
+        end_param = request.GET.get('end', '').strip()
+        if end_param:
+            end = timezone.make_aware(datetime.strptime(end_param, '%Y-%m-%dT%H:%M'))
+        else:
+            end = start + timedelta(minutes=Vehicle.get_reservation_expiry_minutes())
+    except ValueError:
+        return JsonResponse({"success": False, "message": "时间格式无效"})
+    if end <= start:
+        return JsonResponse({"success": False, "message": "结束时间必须晚于开始时间"})
+
+    return JsonResponse({
+        "success": True,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "spots": available_spots(start, end)
+    })
+
+
 # 预订车位API
 @csrf_exempt
 def reserve_spot(request):
@@ -780,23 +715,33 @@ def reserve_spot(request):
         # 计算过期时间(使用时间 + 过期分钟数)
         expiry_time = use_time + timezone.timedelta(minutes=expiry_minutes)
 
-        # 创建预订记录
+        # 创建预订记录：车位有车停放或时间段与已有预订重叠时拒绝(读取位图与预订索引，不扫描车辆表)，
+        # 车牌冲突由数据库唯一约束判定
         try:
-            vehicle = Vehicle.objects.create(
-                user=request.user,
-                license_plate=license_plate,
-                vehicle_type=vehicle_type,
-                spot_number=spot_number,
-                reserved=True,
-                reservation_time=timezone.now(),  # 当前时间
-                reservation_use_time=use_time,  # 预订使用时间
-                reservation_expiry_time=expiry_time  # 过期时间
-            )
+            with reservation_lock():
+                if get_occupancy_map().raw_status_of(spot_number) == OCCUPIED:
+                    raise OpenSessionConflict(SPOT_CONFLICT_MESSAGE)
+                if get_reservation_index(force_check=True).overlaps(spot_number, use_time, expiry_time):
+                    raise OpenSessionConflict(RESERVATION_CONFLICT_MESSAGE)
+                Vehicle.create_open_session(
+                    user=request.user,
+                    license_plate=license_plate,
+                    vehicle_type=vehicle_type,
+                    spot_number=spot_number,
+                    reserved=True,
+                    reservation_time=timezone.now(),  # 当前时间
+                    reservation_use_time=use_time,  # 预订使用时间
+                    reservation_expiry_time=expiry_time  # 过期时间
+                )
+                invalidate_reservation_index()
+            refresh_spots_on_commit([spot_number])
             return JsonResponse({
                 "success": True,
                 "message": "预订成功",
                 "redirect_url": "/we/"
             })
+        except OpenSessionConflict as e:
+            return JsonResponse({"success": False, "message": e.message})
         except Exception as e:
             return JsonResponse({"success": False, "message": f"发生错误：{str(e)}"})
     return JsonResponse({"success": False, "message": "无效的请求方法"})
@@ -822,7 +767,13 @@ def use_reservation(request, vehicle_id):
                 # 更新车辆状态为已使用
                 vehicle.reserved = False
                 vehicle.entry_time = current_time
-                vehicle.save()
+                try:
+                    with transaction.atomic():
+                        vehicle.save()
+                except IntegrityError:
+                    return JsonResponse({"success": False, "message": SPOT_CONFLICT_MESSAGE})
+                update_spot_on_commit(vehicle.spot_number, OCCUPIED)
+                notify_reservations_changed()
                 return JsonResponse({
                     "success": True,
                     "message": "车位已使用",
@@ -844,6 +795,8 @@ def cancel_reservation(request, vehicle_id):
             if vehicle.reserved:
                 # 删除预订记录
                 vehicle.delete()
+                refresh_spots_on_commit([vehicle.spot_number])  # 同一车位可能还有其他预订
+                notify_reservations_changed()
                 return JsonResponse({
                     "success": True,
                     "message": "预订已取消，记录已删除",
@@ -875,11 +828,7 @@ def exit_vehicle(request, vehicle_id):
     fee = vehicle.calculate_fee()
 
     # 检查是否有有效的促销活动
-    has_promotion = Promotion.objects.filter(
-        is_active=True,
-        start_time__lte=now,
-        end_time__gte=now
-    ).exists()
+    has_promotion = get_promotion_index().active_at(now) is not None
 
     # 构建上下文
     context = {
@@ -900,14 +849,20 @@ def exit_vehicle(request, vehicle_id):
 @csrf_protect
 def payment(request, vehicle_id):
     try:
-        vehicle = Vehicle.objects.get(id=vehicle_id)
-        vehicle.exit_time = timezone.now()  # 必须设置出库时间
-        vehicle.paid = True
-        vehicle.payment_amount = vehicle.calculate_fee()  # 确保计算并保存实际费用
-        vehicle.save()
-
-        # 打印日志确认更新
-        print(f"支付成功 - 车辆ID: {vehicle_id}, 车牌: {vehicle.license_plate}, 金额: {vehicle.payment_amount}")
+        with transaction.atomic():
+            vehicle = Vehicle.objects.select_for_update().get(id=vehicle_id)
+            # 重复支付时先从收入汇总中扣除上一次的记录
+            previous = (vehicle.spot_number, vehicle.exit_time, vehicle.fee) \
+                if vehicle.paid and vehicle.exit_time is not None else None
+            vehicle.exit_time = timezone.now()  # 必须设置出库时间
+            vehicle.paid = True
+            vehicle.payment_amount = vehicle.calculate_fee()  # 确保计算并保存实际费用
+            vehicle.save()
+            record_payment(vehicle, previous)  # 与支付在同一事务中累加收入汇总
+            record_session(vehicle, previous)  # 以及时长/费用分布
+            refresh_spots_on_commit([vehicle.spot_number])  # 同一车位可能还有后续预订
+
+        logger.info(f"支付成功 - 车辆ID: {vehicle_id}, 车牌: {vehicle.license_plate}, 金额: {vehicle.payment_amount}")
 
         return JsonResponse({"success": True, "amount": float(vehicle.payment_amount)})
     except Exception as e:
@@ -3,6 +3,10 @@ ASGI config for parking_system project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+车位状态实时推送(/parking_lot/events/)是长连接，需要通过 ASGI 服务运行，例如：
+    uvicorn parking_system.asgi:application --host 0.0.0.0 --port 8001
+其余页面仍可由 uWSGI 提供，Nginx 将 /parking_lot/events/ 转发到 ASGI 服务即可。
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
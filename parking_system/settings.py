@@ -85,6 +85,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'parking_app.middleware.MembershipResolverMiddleware',  # 请求级会员状态缓存
 
 
 ]
@@ -133,6 +134,28 @@ DATABASES = {
 }
 
 
+# 缓存配置
+# 使用文件缓存，uWSGI 的多个 worker 进程共享同一份缓存数据(配置版本号等)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {
+            # 默认 300 条，写满后随机淘汰：统计缓存与共享版本戳较多，避免频繁淘汰
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+# 车位占用共享位图文件(所有 uWSGI worker 映射同一个文件)
+OCCUPANCY_MAP_PATH = BASE_DIR / 'run' / 'occupancy.map'
+
+# 已结束停车记录的列式归档目录(compact_sessions 每晚写入，统计分析读取)
+SESSION_ARCHIVE_DIR = BASE_DIR / 'archive' / 'sessions'
+
+# 管理员日志由后台线程批量写入(uWSGI 需要 enable-threads)；设为 False 时在请求中同步写入
+ADMIN_LOG_ASYNC = True
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
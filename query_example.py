@@ -11,9 +11,11 @@ from parking_app.models import Vehicle, User, Membership
 def query_vehicles():
     """
     查询 Vehicle 表的所有数据
+
+    导出完整的停车记录请使用 python manage.py export_sessions(支持 CSV/NDJSON 与筛选条件)
     """
     print("查询 Vehicle 表：")
-    vehicles = Vehicle.objects.all()
+    vehicles = Vehicle.objects.select_related('user').iterator(chunk_size=2000)
     for vehicle in vehicles:
         print(
             f"车牌号: {vehicle.license_plate}, "
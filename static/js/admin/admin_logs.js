@@ -1,46 +1,85 @@
- document.addEventListener('DOMContentLoaded', function() {
-        fetch('/admin/admin_logs/data/', {  // 修改为正确的API端点
-            headers: {
-                'X-Requested-With': 'XMLHttpRequest',
-                'Accept': 'application/json'  // 明确声明期望JSON响应
-            }
-        })
-        .then(response => {
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            return response.json();
-        })
-        .then(data => {
-            if (data.success) {
-                const tableBody = document.querySelector('#admin-logs-table tbody');
-                const loadingIndicator = document.getElementById('loading-indicator');
-
-                if (data.logs.length === 0) {
-                    loadingIndicator.innerHTML = '<p>暂无日志记录</p>';
-                    return;
-                }
-
-                data.logs.forEach(log => {
-                    const row = document.createElement('tr');
-                    row.innerHTML = `
-                        <td>${log.timestamp}</td>
-                        <td>${log.username}</td>
-                        <td>${log.action}</td>
-                        <td>${log.content_type || '-'}</td>
-                        <td>${log.object_id || '-'}</td>
-                        <td>${log.message}</td>
-                    `;
-                    tableBody.appendChild(row);
-                });
-
-                loadingIndicator.style.display = 'none';
-            } else {
-                alert('加载日志失败: ' + (data.error || '未知错误'));
-            }
+// 管理员日志：筛选条件与游标翻页
+const logState = {
+    filters: {},
+    nextCursor: null,
+    prevCursor: null
+};
+
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.getElementById('logFilters');
+    if (!form) return;
+
+    form.addEventListener('submit', e => {
+        e.preventDefault();
+        logState.filters = Object.fromEntries(new FormData(form).entries());
+        fetchLogs(null);
+    });
+    form.addEventListener('reset', () => {
+        logState.filters = {};
+        fetchLogs(null);
+    });
+    document.getElementById('logNext').addEventListener('click', () => fetchLogs(logState.nextCursor));
+    document.getElementById('logPrev').addEventListener('click', () => fetchLogs(logState.prevCursor));
+
+    fetchLogs(null);
+});
+
+function fetchLogs(cursor) {
+    const params = new URLSearchParams();
+    Object.entries(logState.filters).forEach(([key, value]) => {
+        if (value) params.set(key, value);
+    });
+    if (cursor) params.set('cursor', cursor);
+
+    const loadingIndicator = document.getElementById('loading-indicator');
+    loadingIndicator.style.display = 'block';
+    loadingIndicator.innerHTML = '<p>加载中...</p>';
+
+    fetch(`/admin/admin_logs/data/?${params}`, {
+        headers: {
+            'X-Requested-With': 'XMLHttpRequest',
+            'Accept': 'application/json'
+        }
+    })
+        .then(response => response.json().then(data => ({ ok: response.ok, data })))
+        .then(({ ok, data }) => {
+            if (!ok || !data.success) throw new Error(data.error || '未知错误');
+            renderLogs(data.logs);
+            logState.nextCursor = data.next_cursor;
+            logState.prevCursor = data.prev_cursor;
+            document.getElementById('logNext').disabled = !data.next_cursor;
+            document.getElementById('logPrev').disabled = !data.prev_cursor;
         })
         .catch(error => {
             console.error('Error:', error);
-            alert('加载日志时发生错误');
+            loadingIndicator.innerHTML = '';
+            alert('加载日志失败: ' + error.message);
+        });
+}
+
+// 时间已由服务端转换为本地时间(settings.TIME_ZONE)
+function renderLogs(logs) {
+    const tableBody = document.querySelector('#admin-logs-table tbody');
+    const loadingIndicator = document.getElementById('loading-indicator');
+    tableBody.innerHTML = '';
+
+    if (logs.length === 0) {
+        loadingIndicator.innerHTML = '<p>暂无日志记录</p>';
+        return;
+    }
+    loadingIndicator.style.display = 'none';
+
+    logs.forEach(log => {
+        const row = tableBody.insertRow();
+        [
+            log.timestamp,
+            log.username,
+            log.action,
+            log.content_type || '-',
+            log.object_id || '-',
+            log.message
+        ].forEach(value => {
+            row.insertCell().textContent = value;
         });
-    });
\ No newline at end of file
+    });
+}
@@ -25,13 +25,52 @@ document.addEventListener('DOMContentLoaded', function() {
             this.classList.add('active');
             incomeConfig.currentPeriod = this.dataset.period;
             fetchIncomeData();
+            fetchDistribution();
         });
     });
 
     // 初始加载数据
     fetchIncomeData();
+    fetchDistribution();
 });
 
+// 停车时长/费用的百分位数(读取分布直方图)
+function fetchDistribution() {
+    fetch(`/admin/income_analysis/distribution/?period=${incomeConfig.currentPeriod}`)
+        .then(handleResponse)
+        .then(data => {
+            if (!data.success) throw new Error(data.error || '加载分布数据失败');
+            renderDistribution(data);
+        })
+        .catch(error => console.error('获取时长/费用分布错误:', error));
+}
+
+function renderDistribution(data) {
+    const tbody = document.querySelector('#distributionTable tbody');
+    tbody.innerHTML = '';
+    const rows = Object.entries(data.types).map(([type, summary]) => [data.type_names[type] || type, summary]);
+    rows.push(['全部', data.all]);
+
+    const minutes = value => value === null ? '-' : `${Math.round(value)} 分钟`;
+    const money = value => value === null ? '-' : `${formatMoney(value)} 元`;
+    rows.forEach(([name, summary]) => {
+        const row = tbody.insertRow();
+        [
+            name,
+            summary.count,
+            summary.free_ratio === null ? '-' : `${(summary.free_ratio * 100).toFixed(1)}%`,
+            minutes(summary.duration.p50),
+            minutes(summary.duration.p90),
+            minutes(summary.duration.p99),
+            money(summary.fee.p50),
+            money(summary.fee.p90),
+            money(summary.fee.p99)
+        ].forEach(value => {
+            row.insertCell().textContent = value;
+        });
+    });
+}
+
 function fetchIncomeData() {
     const ctx = document.getElementById('incomeTrendChart');
     ctx.style.display = 'none';
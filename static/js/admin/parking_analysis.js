@@ -2,6 +2,7 @@
 const config = {
     areaChart: null,
     durationChart: null,
+    occupancyChart: null,
     currentRange: 'today' // 默认显示今天的数据
 };
 
@@ -44,24 +45,43 @@ function initTimeRangeButtons() {
     });
 }
 
-// 从API获取停车数据
-function fetchParkingData() {
-    showLoadingState(true);
-
-    fetch(`/admin/parking_analysis/data/?period=${config.currentRange}`)
+// 读取一页停车数据(接口按游标分页)
+function fetchParkingPage(cursor) {
+    const params = new URLSearchParams({ period: config.currentRange });
+    if (cursor) params.set('cursor', cursor);
+    return fetch(`/admin/parking_analysis/data/?${params}`)
         .then(response => {
             if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
             return response.json();
         })
         .then(data => {
-            if (data?.success) {
-                if (data.vehicles?.length > 0) {
-                    processData(data.vehicles);
-                } else {
-                    showNoDataMessage();
-                }
+            if (!data?.success) throw new Error('Invalid data format');
+            return data;
+        });
+}
+
+// 从API获取停车数据(沿 next_cursor 读取所选时间范围内的全部记录)
+async function fetchAllParkingData() {
+    const vehicles = [];
+    let cursor = null;
+    do {
+        const data = await fetchParkingPage(cursor);
+        vehicles.push(...(data.vehicles || []));
+        cursor = data.next_cursor;
+    } while (cursor);
+    return vehicles;
+}
+
+// 从API获取停车数据
+function fetchParkingData() {
+    showLoadingState(true);
+
+    fetchAllParkingData()
+        .then(vehicles => {
+            if (vehicles.length > 0) {
+                processData(vehicles);
             } else {
-                throw new Error('Invalid data format');
+                showNoDataMessage();
             }
         })
         .catch(error => {
@@ -408,4 +428,186 @@ function generateSampleData() {
     }
 
     return sampleVehicles;
-}
\ No newline at end of file
+}
+
+// ===== 停车记录表格(服务端分页、排序与筛选) =====
+const recordState = {
+    sort: '-entry_time',
+    filters: {},
+    nextCursor: null,
+    prevCursor: null
+};
+
+document.addEventListener('DOMContentLoaded', initRecordTable);
+
+// 初始化停车记录表格(第一页由服务端渲染)
+function initRecordTable() {
+    const table = document.getElementById('recordTable');
+    if (!table) return;
+    recordState.nextCursor = table.dataset.nextCursor || null;
+
+    const form = document.getElementById('recordFilters');
+    form.addEventListener('submit', e => {
+        e.preventDefault();
+        recordState.filters = Object.fromEntries(new FormData(form).entries());
+        fetchRecords(null);
+    });
+    form.addEventListener('reset', () => {
+        recordState.filters = {};
+        fetchRecords(null);
+    });
+
+    // 点击表头切换排序：默认倒序，再次点击切换为升序
+    table.querySelectorAll('th.sortable').forEach(th => {
+        th.addEventListener('click', () => {
+            const field = th.dataset.sort;
+            recordState.sort = recordState.sort === `-${field}` ? field : `-${field}`;
+            table.querySelectorAll('th.sortable').forEach(h => h.classList.remove('sorted-asc', 'sorted-desc'));
+            th.classList.add(recordState.sort.startsWith('-') ? 'sorted-desc' : 'sorted-asc');
+            fetchRecords(null);
+        });
+    });
+
+    document.getElementById('recordNext').addEventListener('click', () => fetchRecords(recordState.nextCursor));
+    document.getElementById('recordPrev').addEventListener('click', () => fetchRecords(recordState.prevCursor));
+}
+
+// 按当前筛选与排序读取一页记录
+function fetchRecords(cursor) {
+    const params = new URLSearchParams();
+    Object.entries(recordState.filters).forEach(([key, value]) => {
+        if (value) params.set(key, value);
+    });
+    params.set('sort', recordState.sort);
+    if (cursor) params.set('cursor', cursor);
+
+    fetch(`/admin/parking_analysis/records/?${params}`)
+        .then(response => response.json().then(data => ({ ok: response.ok, data })))
+        .then(({ ok, data }) => {
+            if (!ok || !data.success) throw new Error(data.error || '加载停车记录失败');
+            renderRecords(data.records);
+            recordState.nextCursor = data.next_cursor;
+            recordState.prevCursor = data.prev_cursor;
+            document.getElementById('recordNext').disabled = !data.next_cursor;
+            document.getElementById('recordPrev').disabled = !data.prev_cursor;
+        })
+        .catch(error => {
+            console.error('获取停车记录错误:', error);
+            alert(error.message);
+        });
+}
+
+// 渲染表格内容
+function renderRecords(records) {
+    const tbody = document.querySelector('#recordTable tbody');
+    tbody.innerHTML = '';
+
+    if (records.length === 0) {
+        const row = tbody.insertRow();
+        row.className = 'empty-row';
+        const cell = row.insertCell();
+        cell.colSpan = 9;
+        cell.textContent = '暂无停车记录';
+        return;
+    }
+
+    records.forEach(record => {
+        const row = tbody.insertRow();
+        [
+            record.license_plate,
+            record.vehicle_type,
+            record.username,
+            record.spot_number,
+            record.entry_time || '-',
+            record.exit_time || '-',
+            record.duration !== null ? `${Math.round(record.duration)} 分钟` : '-',
+            record.status,
+            record.fee.toFixed(2)
+        ].forEach(value => {
+            row.insertCell().textContent = value;
+        });
+    });
+}
+
+// ==================== 车位占用变化 ====================
+
+document.addEventListener('DOMContentLoaded', initOccupancyChart);
+
+function initOccupancyChart() {
+    const form = document.getElementById('occupancyFilters');
+    if (!form) return;
+    form.addEventListener('submit', e => {
+        e.preventDefault();
+        fetchOccupancy(new URLSearchParams(new FormData(form)));
+    });
+    fetchOccupancy(new URLSearchParams({ step: 5 }));
+}
+
+// 读取各分区占用序列(默认今天，每5分钟一个点)
+function fetchOccupancy(params) {
+    [...params.keys()].forEach(key => {
+        if (!params.get(key)) params.delete(key);
+    });
+    fetch(`/admin/parking_analysis/occupancy/?${params}`)
+        .then(response => response.json().then(data => ({ ok: response.ok, data })))
+        .then(({ ok, data }) => {
+            if (!ok || !data.success) throw new Error(data.error || '加载车位占用数据失败');
+            renderOccupancyChart(data);
+        })
+        .catch(error => {
+            console.error('获取车位占用数据错误:', error);
+            alert(error.message);
+        });
+}
+
+function renderOccupancyChart(data) {
+    const ctx = document.getElementById('occupancyChart');
+    const noDataDiv = document.getElementById('noOccupancyData');
+
+    if (config.occupancyChart) {
+        config.occupancyChart.destroy();
+        config.occupancyChart = null;
+    }
+    if (!data.total.some(value => value > 0)) {
+        ctx.style.display = 'none';
+        noDataDiv.style.display = 'block';
+        return;
+    }
+    ctx.style.display = 'block';
+    noDataDiv.style.display = 'none';
+
+    // 采样时间 = start + k * step 分钟
+    const start = new Date(data.start.replace(' ', 'T'));
+    const labels = data.total.map((_, index) => {
+        const moment = new Date(start.getTime() + index * data.step * 60000);
+        const pad = value => String(value).padStart(2, '0');
+        return `${pad(moment.getMonth() + 1)}-${pad(moment.getDate())} ${pad(moment.getHours())}:${pad(moment.getMinutes())}`;
+    });
+    const colors = ['255, 99, 132', '54, 162, 235', '255, 206, 86', '75, 192, 192', '153, 102, 255', '255, 159, 64'];
+    const datasets = data.zones.map((zone, index) => ({
+        label: zone.lot ? `${zone.zone}区 (${zone.capacity}个车位)` : zone.zone,
+        data: zone.occupied,
+        borderColor: `rgba(${colors[index % colors.length]}, 1)`,
+        backgroundColor: `rgba(${colors[index % colors.length]}, 0.2)`,
+        borderWidth: 1,
+        pointRadius: 0,
+        fill: false
+    }));
+
+    config.occupancyChart = new Chart(ctx.getContext('2d'), {
+        type: 'line',
+        data: { labels, datasets },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            interaction: { mode: 'index', intersect: false },
+            scales: {
+                y: { beginAtZero: true, title: { display: true, text: '占用车位数' } },
+                x: { ticks: { maxTicksLimit: 12 } }
+            },
+            plugins: {
+                title: { display: true, text: '各分区车位占用变化', font: { size: 16 } }
+            }
+        }
+    });
+}
@@ -4,7 +4,8 @@ document.addEventListener('DOMContentLoaded', function () {
     const state = {
         currentSpotNumber: null,
         currentLicensePlate: null,
-        currentVehicleType: null
+        currentVehicleType: null,
+        version: null // 当前已显示的车位数据版本号
     };
 
     // DOM元素
@@ -20,7 +21,48 @@ document.addEventListener('DOMContentLoaded', function () {
     function init() {
         bindEvents();
         refreshSpots();
-        setInterval(refreshSpots, 60000); // 每分钟自动刷新
+        if (!connectEvents()) {
+            startPolling();
+        }
+    }
+
+    // 定时轮询(不支持实时推送时的后备方案)
+    let pollingTimer = null;
+    function startPolling() {
+        if (pollingTimer === null) {
+            pollingTimer = setInterval(refreshSpots, 60000); // 每分钟自动刷新
+        }
+    }
+
+    // 订阅车位状态实时推送，浏览器不支持时返回 false
+    function connectEvents() {
+        if (!window.EventSource) return false;
+
+        const source = new EventSource('/parking_lot/events/');
+        source.addEventListener('snapshot', event => {
+            const data = JSON.parse(event.data);
+            updateSpotStatus(data.spots);
+            state.version = data.version;
+        });
+        source.addEventListener('spots', event => {
+            const data = JSON.parse(event.data);
+            updateSpots(data.spots);
+            state.version = data.version;
+        });
+        source.addEventListener('promotion', event => {
+            updatePromotionBanner(JSON.parse(event.data).active_promotion);
+        });
+        source.addEventListener('open', () => {
+            if (pollingTimer !== null) {
+                clearInterval(pollingTimer);
+                pollingTimer = null;
+            }
+        });
+        source.addEventListener('error', () => {
+            // 连接中断期间先轮询；服务端不支持推送(返回 204)时连接会被关闭，一直轮询
+            startPolling();
+        });
+        return true;
     }
 
     // 绑定事件
@@ -48,10 +90,17 @@ document.addEventListener('DOMContentLoaded', function () {
     function refreshSpots() {
         showLoading(true);
 
-        fetch('/parking_lot/data/')
+        // 已有数据时只请求变化的车位；数据未变化时服务端返回 304，浏览器使用缓存
+        const url = state.version === null ? '/parking_lot/data/' : `/parking_lot/data/?since=${state.version}`;
+        fetch(url)
             .then(handleResponse)
             .then(data => {
-                updateSpotStatus(data.spots);
+                if (data.full) {
+                    updateSpotStatus(data.spots);
+                } else {
+                    updateSpots(data.spots);
+                }
+                state.version = data.version;
                 updatePromotionBanner(data.active_promotion);
             })
             .catch(error => {
@@ -69,31 +118,43 @@ document.addEventListener('DOMContentLoaded', function () {
         return response.json();
     }
 
-    // 更新车位状态
+    // 更新车位状态(全量)
     function updateSpotStatus(spotsData) {
         document.querySelectorAll('.spot').forEach(spot => {
             const spotId = spot.getAttribute('data-spot-id');
             const spotData = spotsData.find(s => s.id === spotId);
-            const status = spotData?.status || 'available';
-
-            // 更新类名
-            spot.className = `spot ${spotId} ${status} S`;
-
-            // 更新状态文本
-            const statusText = spot.querySelector('.status-text') ||
-                spot.appendChild(document.createElement('span'));
-            statusText.className = 'status-text';
+            renderSpot(spot, spotData?.status || 'available');
+        });
+    }
 
-            if (status === "reserved") {
-                statusText.textContent = '已预订';
-            } else if (status === "occupied") {
-                statusText.textContent = '占用';
-            } else {
-                statusText.textContent = '可用';
-            }
+    // 只更新推送中变化的车位
+    function updateSpots(spotsData) {
+        spotsData.forEach(spotData => {
+            const spot = document.querySelector(`.spot[data-spot-id="${spotData.id}"]`);
+            if (spot) renderSpot(spot, spotData.status);
         });
     }
 
+    // 渲染单个车位
+    function renderSpot(spot, status) {
+        const spotId = spot.getAttribute('data-spot-id');
+        // 更新类名
+        spot.className = `spot ${spotId} ${status} S`;
+
+        // 更新状态文本
+        const statusText = spot.querySelector('.status-text') ||
+            spot.appendChild(document.createElement('span'));
+        statusText.className = 'status-text';
+
+        if (status === "reserved") {
+            statusText.textContent = '已预订';
+        } else if (status === "occupied") {
+            statusText.textContent = '占用';
+        } else {
+            statusText.textContent = '可用';
+        }
+    }
+
 // 更新促销信息
 function updatePromotionBanner(promotion) {
     if (promotion?.name) {
@@ -127,7 +188,7 @@ function updatePromotionBanner(promotion) {
     // 车位点击处理
     function handleSpotClick() {
         state.currentSpotNumber = this.getAttribute('data-spot-id');
-        const action = toHalfWidth(prompt(`请选择操作：\n1. 预订车位\n2. 使用车位\n\n输入 1 或 2：`));
+        const action = toHalfWidth(prompt(`请选择操作：\n1. 预订车位\n2. 使用车位\n3. 自动分配最优车位\n\n输入 1、2 或 3：`));
 
         if (action === null || action.trim() === '') return;
 
@@ -135,8 +196,10 @@ function updatePromotionBanner(promotion) {
             handleReservation();
         } else if (action === "2") {
             handleParking();
+        } else if (action === "3") {
+            handleAutoParking();
         } else {
-            showError('无效的选择，请输入1或2');
+            showError('无效的选择，请输入1、2或3');
         }
     }
 
@@ -170,6 +233,21 @@ function updatePromotionBanner(promotion) {
             .catch(error => showError(error));
     }
 
+    // 自动分配车位停车(由服务端选择并占用最优车位)
+    function handleAutoParking() {
+        const licensePlate = prompt(`请输入车牌号，系统将自动分配车位:
+        例如：京A12345`);
+        if (!licensePlate) return;
+
+        validateLicensePlate(licensePlate)
+            .then(() => selectVehicleType())
+            .then(type => {
+                state.currentSpotNumber = '';
+                parkVehicle(licensePlate, type);
+            })
+            .catch(error => showError(error));
+    }
+
     // 车牌验证
     function validateLicensePlate(licensePlate) {
         return new Promise((resolve, reject) => {
@@ -274,7 +352,7 @@ function updatePromotionBanner(promotion) {
         .then(handleResponse)
         .then(data => {
             if (data.success) {
-                alert('车辆入场成功！');
+                alert(data.spot_number ? `车辆入场成功！车位：${data.spot_number}` : '车辆入场成功！');
                 refreshSpots();
                 setTimeout(() => window.location.href = "/we/", 1500);
             } else {